@@ -2,7 +2,7 @@ import asyncio
 import sys
 import json
 import websockets as Server
-from src.logger import logger
+from src.logger import logger, lazy_debug
 from src.recv_handler.message_handler import message_handler
 from src.recv_handler.meta_event_handler import meta_event_handler
 from src.recv_handler.notice_handler import notice_handler
@@ -15,6 +15,10 @@ from src.mmc_com_layer import mmc_start_com, mmc_stop_com, router
 from src.response_pool import put_response, check_timeout_response
 from src.websocket_manager import websocket_manager
 from src.message_chunker import chunker, reassembler
+from src.message_dispatcher import message_dispatcher
+from src.http_client import http_client
+from src.database import ban_record_writer
+from src.notice_delivery import notice_delivery
 
 # UI日志适配器 - 最小侵入式集成
 try:
@@ -22,15 +26,13 @@ try:
 except ImportError:
     pass
 
-message_queue = asyncio.Queue()
-
 
 async def message_recv(server_connection: Server.ServerConnection):
     await message_handler.set_server_connection(server_connection)
     asyncio.create_task(notice_handler.set_server_connection(server_connection))
     await send_handler.set_server_connection(server_connection)
     async for raw_message in server_connection:
-        logger.debug(f"{raw_message[:1500]}..." if (len(raw_message) > 1500) else raw_message)
+        lazy_debug("{}", lambda m=raw_message: f"{m[:1500]}..." if len(m) > 1500 else m)
         
         try:
             # 首先尝试解析原始消息
@@ -53,7 +55,7 @@ async def message_recv(server_connection: Server.ServerConnection):
             # 处理完整消息（可能是重组后的，也可能是原本就完整的）
             post_type = decoded_raw_message.get("post_type")
             if post_type in ["meta_event", "message", "notice"]:
-                await message_queue.put(decoded_raw_message)
+                message_dispatcher.put(decoded_raw_message)
             elif post_type is None:
                 await put_response(decoded_raw_message)
                 
@@ -65,43 +67,25 @@ async def message_recv(server_connection: Server.ServerConnection):
             logger.debug(f"原始消息: {raw_message[:500]}...")
 
 
+async def handle_event(message: dict) -> None:
+    """按post_type分发单个事件"""
+    post_type = message.get("post_type")
+    if post_type == "message":
+        await message_handler.handle_raw_message(message)
+    elif post_type == "meta_event":
+        await meta_event_handler.handle_meta_event(message)
+    elif post_type == "notice":
+        await notice_handler.handle_notice(message)
+    else:
+        logger.warning(f"未知的post_type: {post_type}")
+
+
 async def message_process():
     """消息处理主循环"""
     logger.info("消息处理器已启动")
     try:
-        while True:
-            try:
-                # 使用超时等待，以便能够响应取消请求
-                message = await asyncio.wait_for(message_queue.get(), timeout=1.0)
-                
-                post_type = message.get("post_type")
-                if post_type == "message":
-                    await message_handler.handle_raw_message(message)
-                elif post_type == "meta_event":
-                    await meta_event_handler.handle_meta_event(message)
-                elif post_type == "notice":
-                    await notice_handler.handle_notice(message)
-                else:
-                    logger.warning(f"未知的post_type: {post_type}")
-                
-                message_queue.task_done()
-                await asyncio.sleep(0.05)
-                
-            except asyncio.TimeoutError:
-                # 超时是正常的，继续循环
-                continue
-            except asyncio.CancelledError:
-                logger.info("消息处理器收到取消信号")
-                break
-            except Exception as e:
-                logger.error(f"处理消息时出错: {e}")
-                # 即使出错也标记任务完成，避免队列阻塞
-                try:
-                    message_queue.task_done()
-                except ValueError:
-                    pass
-                await asyncio.sleep(0.1)
-                
+        await message_dispatcher.start(handle_event)
+        await message_dispatcher.wait_closed()
     except asyncio.CancelledError:
         logger.info("消息处理器已停止")
         raise
@@ -110,14 +94,8 @@ async def message_process():
         raise
     finally:
         logger.info("消息处理器正在清理...")
-        # 清空剩余的队列项目
         try:
-            while not message_queue.empty():
-                try:
-                    message_queue.get_nowait()
-                    message_queue.task_done()
-                except asyncio.QueueEmpty:
-                    break
+            await message_dispatcher.stop()
         except Exception as e:
             logger.debug(f"清理消息队列时出错: {e}")
 
@@ -176,12 +154,30 @@ async def graceful_shutdown():
         except Exception as e:
             logger.warning(f"关闭消息处理器时出错: {e}")
         
+        # 停止通知投递，未送达的通知写入死信文件
+        try:
+            await notice_delivery.stop()
+        except Exception as e:
+            logger.warning(f"停止通知投递时出错: {e}")
+        
+        # 写入尚未提交的禁言记录
+        try:
+            await ban_record_writer.close()
+        except Exception as e:
+            logger.warning(f"写入禁言记录时出错: {e}")
+        
         # 关闭 WebSocket 连接
         try:
             await websocket_manager.stop_connection()
         except Exception as e:
             logger.warning(f"关闭WebSocket连接时出错: {e}")
         
+        # 关闭共享HTTP连接池
+        try:
+            await http_client.close()
+        except Exception as e:
+            logger.warning(f"关闭HTTP连接池时出错: {e}")
+        
         # 关闭 MaiBot 连接
         try:
             await mmc_stop_com()
@@ -215,12 +211,7 @@ async def graceful_shutdown():
     finally:
         # 确保消息队列被清空
         try:
-            while not message_queue.empty():
-                try:
-                    message_queue.get_nowait()
-                    message_queue.task_done()
-                except asyncio.QueueEmpty:
-                    break
+            await message_dispatcher.stop()
         except Exception:
             pass
 
@@ -0,0 +1,99 @@
+"""
+消息切片基准测试
+构造约8MB的消息（Base64图片 + 中文文本），比较旧的切片方式（多次json.dumps、按固定字节数切片）
+与当前的 MessageChunker（只序列化一次、按UTF-8字符边界切片）的吞吐量与峰值内存，并检查重组结果
+用法: python scripts/bench_chunker.py
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.json_codec import ENCODERS, JsonEncoder  # noqa: E402
+from src.message_chunker import MessageReassembler, chunker  # noqa: E402
+
+REPEAT = 5
+
+
+def build_message(image_bytes: int, cjk_chars: int) -> dict:
+    return {
+        "message_info": {"platform": "qq", "message_id": "1"},
+        "message_segment": {
+            "type": "seglist",
+            "data": [
+                {"type": "image", "data": base64.b64encode(os.urandom(image_bytes)).decode("ascii")},
+                {"type": "text", "data": "测试中文消息切片" * (cjk_chars // 8)},
+            ],
+        },
+    }
+
+
+def legacy_chunk(message: dict, max_chunk_size: int) -> list:
+    """旧实现：大小判断与切片各自json.dumps，按固定字节数切片并忽略被切断的字符"""
+    if len(json.dumps(message, ensure_ascii=False).encode("utf-8")) <= max_chunk_size:
+        return [message]
+    message_str = json.dumps(message, ensure_ascii=False)
+    if len(message_str.encode("utf-8")) <= max_chunk_size:
+        return [message]
+    message_bytes = message_str.encode("utf-8")
+    chunks = []
+    for start_pos in range(0, len(message_bytes), max_chunk_size):
+        chunk_data = message_bytes[start_pos:start_pos + max_chunk_size]
+        chunks.append({"__mmc_chunk_data__": chunk_data.decode("utf-8", errors="ignore")})
+    return chunks
+
+
+def current_chunk(message: dict, encoder: JsonEncoder = None) -> list:
+    message_bytes = encoder.dumps(message) if encoder else chunker.serialize(message)
+    if not chunker.should_chunk_message(message_bytes):
+        return [message]
+    return chunker.chunk_message(message_bytes)
+
+
+def measure(name: str, func, message: dict, total_bytes: int) -> None:
+    func(message)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func(message)
+    elapsed = (time.perf_counter() - start) / REPEAT
+    tracemalloc.start()
+    func(message)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name}: {total_bytes / elapsed / (1024 * 1024):7.1f} MB/s  峰值 {peak / (1024 * 1024):.1f} MB")
+
+
+async def roundtrip(message: dict) -> bool:
+    reassembler = MessageReassembler()
+    result = None
+    for chunk in current_chunk(message):
+        result = await reassembler.add_chunk(chunk)
+    return result == message
+
+
+def main() -> None:
+    message = build_message(6 * 1024 * 1024, 100_000)
+    total_bytes = len(chunker.serialize(message))
+    print(f"消息大小: {total_bytes / (1024 * 1024):.1f} MB，切片大小: {chunker.max_chunk_size // 1024} KB")
+    measure("旧实现", lambda m: legacy_chunk(m, chunker.max_chunk_size), message, total_bytes)
+    for name in ENCODERS:
+        encoder = JsonEncoder(name)
+        measure(f"当前实现/{name}", lambda m, e=encoder: current_chunk(m, e), message, total_bytes)
+
+    cjk_message = build_message(0, 400 * 1024 // 3)
+    legacy_data = "".join(c["__mmc_chunk_data__"] for c in legacy_chunk(cjk_message, chunker.max_chunk_size))
+    try:
+        legacy_ok = json.loads(legacy_data) == cjk_message
+    except json.JSONDecodeError:
+        legacy_ok = False
+    print(f"400KB中文文本重组: 旧实现 {'正确' if legacy_ok else '损坏'}，"
+          f"当前实现 {'正确' if asyncio.run(roundtrip(cjk_message)) else '损坏'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+ConfigBase.diff 基准测试
+用大列表构造两份功能配置，测量各种变化情况下 diff 的耗时
+用法: python scripts/bench_config_diff.py [列表长度]
+"""
+import os
+import random
+import sys
+import time
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.features_config import FeaturesConfig  # noqa: E402
+
+REPEAT = 20
+
+
+def measure(old: FeaturesConfig, new: FeaturesConfig) -> tuple:
+    """返回 (单次diff耗时ms, 变化的字段)"""
+    changed = old.diff(new)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        old.diff(new)
+    return (time.perf_counter() - start) / REPEAT * 1000, sorted(changed)
+
+
+def main() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    group_list = list(range(size))
+    private_list = list(range(size, 2 * size))
+    old = FeaturesConfig(group_list=group_list, private_list=private_list)
+
+    shuffled = group_list[:]
+    random.Random(0).shuffle(shuffled)
+    cases = {
+        # 重新生成列表，模拟重新解析配置文件得到的新对象
+        "内容相同的新列表": replace(old, group_list=list(range(size)), private_list=list(range(size, 2 * size))),
+        "group_list 重新排序": replace(old, group_list=shuffled),
+        "group_list 末尾修改": replace(old, group_list=group_list[:-1] + [-1]),
+        "修改一个标量字段": replace(old, enable_poke=not old.enable_poke),
+    }
+    print(f"列表长度: {size}，每项取 {REPEAT} 次平均")
+    for name, new in cases.items():
+        elapsed_ms, changed = measure(old, new)
+        print(f"  {elapsed_ms:8.2f} ms  {name}  变化: {changed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+发送前序列化基准测试
+文本消息：比较用各编码器完整编码来判断大小与不编码的大小上界估计（之后由maim_message完成唯一一次序列化）；
+2MB图片消息：上界估计无法排除切片，需要用各编码器编码一次再切片，测量该次编码的耗时
+用法: python scripts/bench_json_encoder.py
+"""
+import base64
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from maim_message import BaseMessageInfo, GroupInfo, MessageBase, Seg, UserInfo  # noqa: E402
+
+from src.json_codec import ENCODERS, JsonEncoder  # noqa: E402
+from src.message_chunker import chunker  # noqa: E402
+
+
+def build_message(segments: list) -> MessageBase:
+    return MessageBase(
+        message_info=BaseMessageInfo(
+            platform="qq",
+            message_id="123456",
+            time=1700000000.0,
+            user_info=UserInfo(platform="qq", user_id=10001, user_nickname="测试用户"),
+            group_info=GroupInfo(platform="qq", group_id=20001, group_name="测试群"),
+        ),
+        message_segment=Seg(type="seglist", data=segments),
+        raw_message="你好，这是一条测试消息",
+    )
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main() -> None:
+    messages = {
+        "文本消息": (build_message([Seg(type="text", data="你好，这是一条测试消息")]), 5000),
+        "8000字文本": (build_message([Seg(type="text", data="测试中文消息切片" * 1000)]), 2000),
+        "2MB图片": (
+            build_message([Seg(type="image", data=base64.b64encode(os.urandom(2 * 1024 * 1024)).decode("ascii"))]),
+            20,
+        ),
+    }
+    print("每条消息 to_dict 之后的大小判断/序列化耗时")
+    for name, (message, number) in messages.items():
+        message_dict = message.to_dict()
+        results = [
+            f"上界估计 {per_call_us(lambda d=message_dict: chunker.fits_in_one_frame(d), number):9.1f} us"
+            f"（{'无需切片' if chunker.fits_in_one_frame(message_dict) else '需要编码'}）"
+        ]
+        for encoder_name in ENCODERS:
+            encoder = JsonEncoder(encoder_name)
+            results.append(
+                f"{encoder_name}编码 {per_call_us(lambda e=encoder, d=message_dict: e.dumps(d), number):9.1f} us"
+            )
+        print(f"  {name}: " + "  ".join(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+INFO级别下调试日志的开销基准测试
+比较热路径上原先直接构造字符串的logger.debug与lazy_debug/debug_enabled写法，只计日志语句本身的耗时
+用法: python scripts/bench_lazy_logging.py
+"""
+import base64
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from maim_message import Seg  # noqa: E402
+
+import src.logger as logger_module  # noqa: E402
+from src.logger import debug_enabled, lazy_debug, logger  # noqa: E402
+
+NUMBER = 2000
+
+# 模拟生产环境的INFO级别：DEBUG日志不输出
+logger.remove()
+logger.add(lambda _: None, level="INFO")
+logger_module._DEBUG_ENABLED = False
+
+
+def build_forward_response() -> dict:
+    nodes = [
+        {
+            "type": "node",
+            "data": {
+                "user_id": 10000 + i,
+                "nickname": f"用户{i}",
+                "content": [{"type": "text", "data": {"text": "转发消息内容" * 20}}],
+            },
+        }
+        for i in range(30)
+    ]
+    return {"status": "ok", "retcode": 0, "data": {"messages": nodes}}
+
+
+def build_inputs() -> dict:
+    image_base64 = base64.b64encode(os.urandom(200 * 1024)).decode("ascii")
+    forward = build_forward_response()
+    raw_frame = json.dumps(
+        {
+            "post_type": "message",
+            "message_type": "group",
+            "group_id": 20001,
+            "user_id": 10001,
+            "message": [
+                {"type": "text", "data": {"text": "你好" * 50}},
+                {"type": "image", "data": {"url": "https://multimedia.nt.qq.com.cn/download?fileid=abc&rkey=xyz"}},
+                {"type": "forward", "data": {"id": "7350000000000000000"}},
+            ],
+        },
+        ensure_ascii=False,
+    )
+    seg_message = [
+        Seg(type="text", data="你好" * 50),
+        Seg(type="image", data=image_base64),
+        Seg(type="seglist", data=[Seg(type="text", data=node["data"]["content"][0]["data"]["text"]) for node in forward["data"]["messages"]]),
+    ]
+    video_raw = {
+        "type": "video",
+        "data": {"file": "video.mp4", "url": "https://example.com/video.mp4?" + "x" * 500, "file_size": "1048576"},
+    }
+    return {
+        "raw_frame": raw_frame,
+        "seg_message": seg_message,
+        "image_base64": image_base64,
+        "image_url": "https://multimedia.nt.qq.com.cn/download?fileid=abc&rkey=xyz",
+        "forward": forward,
+        "video_raw": video_raw,
+    }
+
+
+def message_eager(raw_message: str, seg_message: list, image_url: str, image_base64: str) -> None:
+    start_time = time.perf_counter()
+    logger.debug(f"{raw_message[:1500]}..." if (len(raw_message) > 1500) else raw_message)
+    logger.debug(f"群聊id: {20001}, 用户id: {10001}")
+    logger.debug("开始检查聊天白名单/黑名单")
+    logger.debug(f"尝试缓冲消息，消息类型: {'group'}, 用户: {10001}")
+    logger.debug("开始处理图片消息段")
+    logger.debug(f"开始下载图片: {image_url}")
+    logger.debug(f"图片下载成功，大小: {len(image_base64)} 字符")
+    logger.debug("图片处理成功，添加到消息段")
+    logger.debug(f"准备发送消息到MaiBot，消息段数量: {len(seg_message)}")
+    for i, seg in enumerate(seg_message):
+        logger.debug(f"消息段 {i}: type={seg.type}, data={str(seg.data)[:100]}...")
+    logger.debug(
+        f"handle_real_message完成，处理了{3}个消息段，生成了{len(seg_message)}个seg，"
+        f"并发解析耗时 {(time.perf_counter() - start_time) * 1000:.1f}ms"
+    )
+
+
+def message_lazy(raw_message: str, seg_message: list, image_url: str, image_base64: str) -> None:
+    start_time = time.perf_counter()
+    lazy_debug("{}", lambda m=raw_message: f"{m[:1500]}..." if len(m) > 1500 else m)
+    lazy_debug("群聊id: {}, 用户id: {}，开始检查聊天白名单/黑名单", 20001, 10001)
+    lazy_debug("尝试缓冲消息，消息类型: {}, 用户: {}", "group", 10001)
+    lazy_debug("开始下载图片: {}", lambda: image_url)
+    lazy_debug("图片下载成功，大小: {} 字符", lambda: len(image_base64))
+    if debug_enabled():
+        logger.debug(f"准备发送消息到MaiBot，消息段数量: {len(seg_message)}")
+        for i, seg in enumerate(seg_message):
+            preview = seg.data[:100] if isinstance(seg.data, str) else f"<{type(seg.data).__name__}>"
+            logger.debug(f"消息段 {i}: type={seg.type}, data={preview}...")
+    lazy_debug(
+        "handle_real_message完成，处理了{}个消息段，生成了{}个seg，并发解析耗时 {:.1f}ms",
+        3,
+        len(seg_message),
+        lambda: (time.perf_counter() - start_time) * 1000,
+    )
+
+
+def forward_eager(response: dict) -> None:
+    logger.debug(
+        f"转发消息原始格式：{json.dumps(response)[:80]}..."
+        if len(json.dumps(response)) > 80
+        else json.dumps(response)
+    )
+
+
+def forward_lazy(response: dict) -> None:
+    if debug_enabled():
+        response_json = json.dumps(response, ensure_ascii=False)
+        logger.debug(f"转发消息原始格式：{response_json[:80]}..." if len(response_json) > 80 else response_json)
+
+
+def video_eager(raw_message: dict) -> None:
+    logger.debug(f"视频消息原始数据: {raw_message}")
+    logger.debug(f"视频消息数据: {raw_message['data']}")
+
+
+def video_lazy(raw_message: dict) -> None:
+    lazy_debug("视频消息原始数据: {}", lambda: raw_message)
+
+
+def per_call_us(func) -> float:
+    return min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER * 1e6
+
+
+def main() -> None:
+    inputs = build_inputs()
+    message_args = (inputs["raw_frame"], inputs["seg_message"], inputs["image_url"], inputs["image_base64"])
+    cases = [
+        ("文本+图片+转发消息", lambda: message_eager(*message_args), lambda: message_lazy(*message_args)),
+        ("获取转发消息", lambda: forward_eager(inputs["forward"]), lambda: forward_lazy(inputs["forward"])),
+        ("视频消息", lambda: video_eager(inputs["video_raw"]), lambda: video_lazy(inputs["video_raw"])),
+    ]
+    print("INFO级别下每条消息调试日志语句的耗时")
+    for name, eager, lazy in cases:
+        print(f"  {name:<12} 直接构造 {per_call_us(eager):8.1f} us  按需构造 {per_call_us(lazy):6.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+消息缓冲器基准测试
+大量会话同时向 SimpleMessageBuffer 写入消息，测量每条消息的添加耗时、运行中的任务数量，
+以及从最后一条消息到所有会话合并完成的时间
+用法: python scripts/bench_message_buffer.py [会话数] [每个会话的消息数]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.features_config import FeaturesConfig, FeaturesSnapshot, features_manager  # noqa: E402
+from src.message_buffer import SimpleMessageBuffer  # noqa: E402
+
+INITIAL_DELAY = 0.5
+INTERVAL = 0.5
+
+
+async def run(sessions: int, per_session: int) -> None:
+    features_manager.snapshot = FeaturesSnapshot.from_config(
+        FeaturesConfig(message_buffer_initial_delay=INITIAL_DELAY, message_buffer_interval=INTERVAL)
+    )
+    merged = 0
+    all_merged = asyncio.Event()
+
+    async def on_merge(session_id, merged_segments, original_event) -> None:
+        nonlocal merged
+        merged += 1
+        if merged == sessions:
+            all_merged.set()
+
+    buffer = SimpleMessageBuffer(on_merge)
+    message = [{"type": "text", "data": {"text": "你好"}}]
+    events = [{"message_type": "group", "group_id": i % 1000, "user_id": i} for i in range(sessions)]
+
+    start = time.perf_counter()
+    for _ in range(per_session):
+        for event in events:
+            await buffer.add_message(event, message)
+    add_seconds = time.perf_counter() - start
+    running_tasks = len(asyncio.all_tasks()) - 1
+
+    await asyncio.wait_for(all_merged.wait(), INITIAL_DELAY + INTERVAL + 120)
+    total_seconds = time.perf_counter() - start
+    await buffer.shutdown()
+
+    print(f"{sessions} 个会话 x {per_session} 条消息，延迟 {INITIAL_DELAY}s + {INTERVAL}s")
+    print(f"  添加耗时: {add_seconds / (sessions * per_session) * 1e6:.1f} us/条，添加后运行中的任务: {running_tasks}")
+    print(f"  全部合并完成: {total_seconds:.1f}s（其中等待延迟 {INITIAL_DELAY + INTERVAL:.1f}s）")
+
+
+def main() -> None:
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    per_session = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    asyncio.run(run(sessions, per_session))
+
+
+if __name__ == "__main__":
+    main()
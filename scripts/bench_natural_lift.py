@@ -0,0 +1,84 @@
+"""
+自然解除禁言调度基准测试
+向禁言表放入大量在几秒内陆续到期的禁言，在调度器休眠期间再追加一条，
+测量每条解除通知交给投递队列的时间相对解除时间的延迟
+通知的构建与投递被替换为空操作，数据库写入被屏蔽，只测量调度本身
+用法: python scripts/bench_natural_lift.py [禁言数量] [到期时间跨度秒]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database import BanUser  # noqa: E402
+from src.recv_handler import notice_handler as notice_module  # noqa: E402
+
+# 旧实现的轮询间隔与逐条发送间隔（秒），用于估算旧实现的耗时
+LEGACY_POLL_INTERVAL = 5.0
+LEGACY_PER_ITEM_SLEEP = 0.5
+
+
+class NullWriter:
+    def upsert(self, ban_record: BanUser) -> None:
+        pass
+
+    def delete(self, group_id: int, user_id: int) -> None:
+        pass
+
+
+async def run(count: int, span: float) -> None:
+    notice_module.ban_record_writer = NullWriter()
+    handler = notice_module.NoticeHandler()
+    delivered: dict = {}
+    done = asyncio.Event()
+
+    async def build(lift_record: BanUser):
+        return lift_record
+
+    async def put_notice(lift_record: BanUser, priority: int = 0) -> None:
+        delivered[(lift_record.group_id, lift_record.user_id)] = time.time() - lift_record.lift_time
+        if len(delivered) == count + 1:
+            done.set()
+
+    handler._build_natural_lift_notice = build
+    handler.put_notice = put_notice
+
+    start = int(time.time()) + 1
+    for i in range(count):
+        lift_time = start + int(span * i / count)
+        handler._ban_operation(group_id=1 + i % 100, user_id=10_000 + i, lift_time=lift_time)
+    tasks = [asyncio.create_task(handler.auto_lift_detect()), asyncio.create_task(handler.handle_natural_lift())]
+
+    # 调度器休眠期间追加一条更早到期的禁言
+    await asyncio.sleep(0.2)
+    handler._ban_operation(group_id=999, user_id=1, lift_time=int(time.time()) + 1)
+
+    try:
+        await asyncio.wait_for(done.wait(), span + 60)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    lateness = sorted(delivered.values())
+    print(f"{count} 条禁言（+1 条休眠期间追加），到期跨度 {span:.0f}s，全部送达: {len(delivered) == count + 1}")
+    print(
+        f"  送达延迟（相对解除时间）: p50 {statistics.median(lateness) * 1000:.0f} ms, "
+        f"p99 {lateness[int(len(lateness) * 0.99)] * 1000:.0f} ms, max {lateness[-1] * 1000:.0f} ms"
+    )
+    print(
+        f"  旧实现估算: 检测延迟最多 {LEGACY_POLL_INTERVAL:.0f}s，逐条间隔 {LEGACY_PER_ITEM_SLEEP}s，"
+        f"发送完毕约需 {count * LEGACY_PER_ITEM_SLEEP / 60:.0f} 分钟"
+    )
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    span = float(sys.argv[2]) if len(sys.argv) > 2 else 4.0
+    asyncio.run(run(count, span))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+权限检查基准测试
+每条消息做一次群聊名单检查与一次全局禁止名单检查，被检查的群位于名单末尾，
+比较直接在配置列表中查找（旧实现）、PermissionIndex 的 frozenset 查找与带缓存的 check
+用法: python scripts/bench_permissions.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config.features_config import FeaturesConfig, PermissionIndex  # noqa: E402
+
+SIZES = (10, 1000, 10000)
+NUMBER = 20000
+
+
+def legacy_check(config: FeaturesConfig, group_id: int, user_id: int) -> bool:
+    """旧实现：每次在配置列表中线性查找"""
+    in_list = group_id in config.group_list
+    group_allowed = in_list if config.group_list_type == "whitelist" else not in_list
+    return group_allowed and user_id not in config.ban_user_id
+
+
+def index_check(index: PermissionIndex, group_id: int, user_id: int) -> bool:
+    return index.is_group_allowed(group_id) and not index.is_user_banned(user_id)
+
+
+def per_call_ns(func) -> float:
+    return min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER * 1e9
+
+
+def main() -> None:
+    print("每条消息的检查耗时（群聊名单 + 全局禁止名单，群位于名单末尾）")
+    for size in SIZES:
+        config = FeaturesConfig(group_list=list(range(size)), ban_user_id=list(range(10**6, 10**6 + size)))
+        index = PermissionIndex.from_config(config)
+        group_id, user_id = size - 1, 42
+        legacy = per_call_ns(lambda c=config, g=group_id, u=user_id: legacy_check(c, g, u))
+        indexed = per_call_ns(lambda i=index, g=group_id, u=user_id: index_check(i, g, u))
+        cached = per_call_ns(lambda i=index, g=group_id, u=user_id: i.check(u, g, False))
+        print(f"  名单长度 {size:>6}: 列表 {legacy:9.0f} ns  frozenset {indexed:6.0f} ns  缓存 {cached:6.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
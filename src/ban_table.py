@@ -0,0 +1,86 @@
+"""
+禁言表模块
+以 (group_id, user_id) 为键保存当前仍在禁言中的记录，并按解除时间维护最小堆，
+用于O(1)查找/更新与按时间顺序取出到期的禁言
+"""
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .database import BanUser
+
+
+class BanTable:
+    """当前禁言记录表，堆中的过期条目采用惰性删除"""
+
+    def __init__(self):
+        self._records: Dict[Tuple[int, int], BanUser] = {}
+        self._heap: List[Tuple[int, int, int]] = []  # (lift_time, group_id, user_id)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[BanUser]:
+        return iter(list(self._records.values()))
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        return key in self._records
+
+    def get(self, group_id: int, user_id: int) -> Optional[BanUser]:
+        return self._records.get((group_id, user_id))
+
+    def load(self, records: Iterable[BanUser]) -> None:
+        """用给定记录替换整个表"""
+        self._records = {(record.group_id, record.user_id): record for record in records}
+        self._heap = [
+            (record.lift_time, record.group_id, record.user_id)
+            for record in self._records.values()
+            if self._has_deadline(record)
+        ]
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    def _has_deadline(record: BanUser) -> bool:
+        """全体禁言与没有解除时间的禁言不会自然解除"""
+        return record.user_id != 0 and record.lift_time is not None and record.lift_time != -1
+
+    def set(self, record: BanUser) -> None:
+        """添加或更新一条禁言记录"""
+        self._records[(record.group_id, record.user_id)] = record
+        if self._has_deadline(record):
+            heapq.heappush(self._heap, (record.lift_time, record.group_id, record.user_id))
+        self._maybe_compact()
+
+    def remove(self, group_id: int, user_id: int) -> Optional[BanUser]:
+        """移除一条禁言记录，堆中对应条目在出堆时丢弃"""
+        return self._records.pop((group_id, user_id), None)
+
+    def _is_live(self, entry: Tuple[int, int, int]) -> bool:
+        lift_time, group_id, user_id = entry
+        record = self._records.get((group_id, user_id))
+        return record is not None and record.lift_time == lift_time
+
+    def next_lift_time(self) -> Optional[int]:
+        """最早的解除时间，没有可自然解除的禁言时返回None"""
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[BanUser]:
+        """
+        取出并移除所有解除时间不晚于now的禁言记录
+        Parameters:
+            now: float: 当前时间戳
+        Returns:
+            List[BanUser]: 按解除时间排序的到期记录
+        """
+        due: List[BanUser] = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_live(entry):
+                due.append(self._records.pop((entry[1], entry[2])))
+        return due
+
+    def _maybe_compact(self) -> None:
+        """频繁更新同一条记录会在堆中留下大量过期条目，超过一定比例时重建"""
+        if len(self._heap) > 2 * len(self._records) + 64:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
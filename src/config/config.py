@@ -12,10 +12,13 @@ from rich.traceback import install
 
 from src.config.config_base import ConfigBase
 from src.config.official_configs import (
+    CacheConfig,
     DebugConfig,
+    HttpConfig,
     MaiBotServerConfig,
     NapcatServerConfig,
     NicknameConfig,
+    ProcessingConfig,
     SlicingConfig,
     VoiceConfig,
 )
@@ -120,6 +123,9 @@ class Config(ConfigBase):
     maibot_server: MaiBotServerConfig
     voice: VoiceConfig
     slicing: SlicingConfig
+    processing: ProcessingConfig
+    cache: CacheConfig
+    http: HttpConfig
     debug: DebugConfig
 
 
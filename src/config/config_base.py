@@ -1,5 +1,5 @@
 from dataclasses import dataclass, fields, MISSING
-from typing import TypeVar, Type, Any, get_origin, get_args, Literal, Dict, Union
+from typing import TypeVar, Type, Any, get_origin, get_args, Literal, Dict, Set, Union
 
 T = TypeVar("T", bound="ConfigBase")
 
@@ -131,6 +131,30 @@ class ConfigBase:
         except (ValueError, TypeError) as e:
             raise TypeError(f"无法将 {type(value).__name__} 转换为 {field_type.__name__}") from e
 
+    def diff(self, other: "ConfigBase", prefix: str = "") -> Set[str]:
+        """
+        比较两个同类配置，返回发生变化的字段路径
+
+        1. 嵌套的 dataclass 递归比较，路径以 . 连接（如 "slicing.delay_ms"）
+        2. 其他字段按 == 比较，list 的元素顺序与重复元素的变化都视为变化
+        3. 以 _ 开头的字段不参与比较
+        """
+        if type(self) is not type(other):
+            raise TypeError(f"无法比较 {type(self).__name__} 与 {type(other).__name__}")
+
+        changed: Set[str] = set()
+        for f in fields(self):
+            if f.name.startswith("_"):
+                continue
+            path = f"{prefix}{f.name}"
+            old_value = getattr(self, f.name)
+            new_value = getattr(other, f.name)
+            if isinstance(old_value, ConfigBase) and isinstance(new_value, ConfigBase):
+                changed |= old_value.diff(new_value, f"{path}.")
+            elif old_value != new_value:
+                changed.add(path)
+        return changed
+
     def __str__(self):
         """返回配置类的字符串表示"""
         return f"{self.__class__.__name__}({', '.join(f'{f.name}={getattr(self, f.name)}' for f in fields(self))})"
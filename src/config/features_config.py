@@ -1,10 +1,12 @@
 import asyncio
-from dataclasses import dataclass, field
-from typing import Literal, Optional
+import re
+from dataclasses import dataclass, field, fields
+from typing import Callable, Iterable, Literal, Optional
 from pathlib import Path
 import tomlkit
 from src.logger import logger
 from .config_base import ConfigBase
+from .file_watcher import ConfigFileWatcher
 from .config_utils import create_config_from_template, create_default_config_dict
 
 
@@ -49,7 +51,7 @@ class FeaturesConfig(ConfigBase):
     """是否启用视频识别功能"""
     
     max_video_size_mb: int = 100
-    """视频文件最大大小限制（MB）"""
+    """视频文件最大大小限制（MB），Base64编码时的峰值内存约为该值的2.7倍"""
     
     download_timeout: int = 60
     """视频下载超时时间（秒）"""
@@ -57,6 +59,9 @@ class FeaturesConfig(ConfigBase):
     supported_formats: list[str] = field(default_factory=lambda: ["mp4", "avi", "mov", "mkv", "flv", "wmv", "webm"])
     """支持的视频格式"""
     
+    video_share_file_path: bool = False
+    """MaiBot与适配器共享文件系统时，本地视频只传递文件路径而不编码为Base64"""
+    
     # 消息缓冲配置
     enable_message_buffer: bool = True
     """是否启用消息缓冲合并功能"""
@@ -76,37 +81,197 @@ class FeaturesConfig(ConfigBase):
     message_buffer_max_components: int = 50
     """单个会话最大缓冲消息组件数量，超过此数量将强制合并"""
     
+    message_buffer_max_bytes: int = 8192
+    """单个会话缓冲文本的最大字节数（UTF-8），超过此大小将强制合并"""
+    
     message_buffer_block_prefixes: list[str] = field(default_factory=lambda: ["/", "!", "！", ".", "。", "#", "%"])
     """消息缓冲屏蔽前缀，以这些前缀开头的消息不会被缓冲"""
 
 
+# 权限判定缓存的最大条目数，超出后清空重建
+PERMISSION_DECISION_CACHE_SIZE = 65536
+
+# 权限索引依赖的配置项，只有这些配置项变化时才重建权限索引
+PERMISSION_FIELDS = frozenset({"group_list_type", "group_list", "private_list_type", "private_list", "ban_user_id"})
+
+
+@dataclass(frozen=True)
+class PermissionIndex:
+    """由功能配置编译出的只读权限索引，配置重载时整体替换"""
+
+    group_whitelist: bool
+    groups: frozenset
+    private_whitelist: bool
+    privates: frozenset
+    banned_users: frozenset
+    decisions: dict = field(default_factory=dict, compare=False)
+    """(group_id, user_id, ignore_global_list) -> 拒绝原因，None表示允许"""
+
+    @classmethod
+    def from_config(cls, config: FeaturesConfig) -> "PermissionIndex":
+        return cls(
+            group_whitelist=config.group_list_type == "whitelist",
+            groups=frozenset(config.group_list),
+            private_whitelist=config.private_list_type == "whitelist",
+            privates=frozenset(config.private_list),
+            banned_users=frozenset(config.ban_user_id),
+        )
+
+    def is_group_allowed(self, group_id: int) -> bool:
+        return (group_id in self.groups) == self.group_whitelist
+
+    def is_private_allowed(self, user_id: int) -> bool:
+        return (user_id in self.privates) == self.private_whitelist
+
+    def is_user_banned(self, user_id: int) -> bool:
+        return user_id in self.banned_users
+
+    def check(self, user_id: int, group_id: Optional[int], ignore_global_list: bool) -> Optional[str]:
+        """
+        综合判断群聊/私聊名单与全局禁止名单，结果会被缓存
+        Returns:
+            Optional[str]: 拒绝原因（"group"/"private"/"banned"），允许时为None
+        """
+        key = (group_id, user_id, ignore_global_list)
+        try:
+            return self.decisions[key]
+        except KeyError:
+            pass
+        if group_id:
+            reason = None if self.is_group_allowed(group_id) else "group"
+        else:
+            reason = None if self.is_private_allowed(user_id) else "private"
+        if reason is None and not ignore_global_list and self.is_user_banned(user_id):
+            reason = "banned"
+        if len(self.decisions) >= PERMISSION_DECISION_CACHE_SIZE:
+            self.decisions.clear()
+        self.decisions[key] = reason
+        return reason
+
+
+def compile_prefix_pattern(prefixes: Iterable[str]) -> Optional[re.Pattern]:
+    """
+    将前缀列表编译为一个正则，match 一次即可判断是否以任一前缀开头
+    Parameters:
+        prefixes: Iterable[str]: 前缀列表
+    Returns:
+        Optional[re.Pattern]: 编译后的正则，前缀为空时返回None
+    """
+    # 长前缀优先，避免短前缀先匹配
+    unique_prefixes = sorted(set(prefixes), key=len, reverse=True)
+    if not unique_prefixes:
+        return None
+    return re.compile("|".join(map(re.escape, unique_prefixes)))
+
+
+@dataclass(frozen=True)
+class FeaturesSnapshot:
+    """
+    功能配置的只读快照，由配置预先计算得到，配置重载时整体替换
+    热路径先取一次 features_manager.snapshot 再读取属性，不会触发文件读取，也不会看到新旧混合的配置
+    """
+
+    config: FeaturesConfig
+    permissions: PermissionIndex
+    ban_qq_bot: bool
+    poke_enabled: bool
+    non_self_poke_ignored: bool
+    poke_debounce_seconds: int
+    reply_at_enabled: bool
+    reply_at_rate: float
+    video_analysis_enabled: bool
+    max_video_size_mb: int
+    download_timeout: int
+    video_share_file_path: bool
+    message_buffer_enabled: bool
+    message_buffer_group_enabled: bool
+    """已与总开关合并：总开关关闭时为False"""
+    message_buffer_private_enabled: bool
+    """已与总开关合并：总开关关闭时为False"""
+    message_buffer_interval: float
+    message_buffer_initial_delay: float
+    message_buffer_max_components: int
+    message_buffer_max_bytes: int
+    message_buffer_block_prefixes: tuple[str, ...]
+    message_buffer_block_pattern: Optional[re.Pattern]
+    """由屏蔽前缀编译出的正则，没有屏蔽前缀时为None"""
+
+    @classmethod
+    def from_config(cls, config: FeaturesConfig, permissions: Optional[PermissionIndex] = None) -> "FeaturesSnapshot":
+        """
+        Parameters:
+            config: FeaturesConfig: 功能配置
+            permissions: Optional[PermissionIndex]: 可复用的权限索引，为None时由配置重新编译
+        """
+        return cls(
+            config=config,
+            permissions=permissions if permissions is not None else PermissionIndex.from_config(config),
+            ban_qq_bot=config.ban_qq_bot,
+            poke_enabled=config.enable_poke,
+            non_self_poke_ignored=config.ignore_non_self_poke,
+            poke_debounce_seconds=config.poke_debounce_seconds,
+            reply_at_enabled=config.enable_reply_at,
+            reply_at_rate=config.reply_at_rate,
+            video_analysis_enabled=config.enable_video_analysis,
+            max_video_size_mb=config.max_video_size_mb,
+            download_timeout=config.download_timeout,
+            video_share_file_path=config.video_share_file_path,
+            message_buffer_enabled=config.enable_message_buffer,
+            message_buffer_group_enabled=config.enable_message_buffer and config.message_buffer_enable_group,
+            message_buffer_private_enabled=config.enable_message_buffer and config.message_buffer_enable_private,
+            message_buffer_interval=config.message_buffer_interval,
+            message_buffer_initial_delay=config.message_buffer_initial_delay,
+            message_buffer_max_components=config.message_buffer_max_components,
+            message_buffer_max_bytes=config.message_buffer_max_bytes,
+            message_buffer_block_prefixes=tuple(config.message_buffer_block_prefixes),
+            message_buffer_block_pattern=compile_prefix_pattern(config.message_buffer_block_prefixes),
+        )
+
+    def is_message_buffer_enabled_for(self, message_type: str) -> bool:
+        """检查指定消息类型（group/private）是否启用消息缓冲"""
+        if message_type == "group":
+            return self.message_buffer_group_enabled
+        if message_type == "private":
+            return self.message_buffer_private_enabled
+        return False
+
+
 class FeaturesManager:
     """功能管理器，支持热重载"""
     
     def __init__(self, config_path: str = "config/features.toml"):
         self.config_path = Path(config_path)
         self.config: Optional[FeaturesConfig] = None
-        self._file_watcher_task: Optional[asyncio.Task] = None
+        # 加载配置前使用默认值快照，读取快照永远不会触发文件读取
+        self.snapshot: FeaturesSnapshot = FeaturesSnapshot.from_config(FeaturesConfig())
+        self._file_watcher: Optional[ConfigFileWatcher] = None
         self._last_modified: Optional[float] = None
-        self._callbacks: list = []
+        self._callbacks: list[tuple[Callable, Optional[frozenset[str]]]] = []
         
-    def add_reload_callback(self, callback):
-        """添加配置重载回调函数"""
-        self._callbacks.append(callback)
+    def add_reload_callback(self, callback, fields: Optional[Iterable[str]] = None):
+        """
+        添加配置重载回调函数
+        回调参数为 (新配置, 发生变化的配置项名称集合)
+        Parameters:
+            callback: 回调函数，可以是协程函数
+            fields: Optional[Iterable[str]]: 关注的配置项，为None时任何变化都会回调，否则只在这些配置项变化时回调
+        """
+        self._callbacks.append((callback, frozenset(fields) if fields is not None else None))
         
     def remove_reload_callback(self, callback):
         """移除配置重载回调函数"""
-        if callback in self._callbacks:
-            self._callbacks.remove(callback)
+        self._callbacks = [entry for entry in self._callbacks if entry[0] != callback]
     
-    async def _notify_callbacks(self):
-        """通知所有回调函数配置已重载"""
-        for callback in self._callbacks:
+    async def _notify_callbacks(self, changed_keys: set[str]):
+        """通知关注了变化配置项的回调函数"""
+        for callback, watched in self._callbacks:
+            if watched is not None and watched.isdisjoint(changed_keys):
+                continue
             try:
                 if asyncio.iscoroutinefunction(callback):
-                    await callback(self.config)
+                    await callback(self.config, changed_keys)
                 else:
-                    callback(self.config)
+                    callback(self.config, changed_keys)
             except Exception as e:
                 logger.error(f"配置重载回调执行失败: {e}")
     
@@ -121,11 +286,8 @@ class FeaturesManager:
                 logger.info("程序将退出，请检查功能配置文件后重启")
                 quit(0)
             
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                config_data = tomlkit.load(f)
-            
-            self.config = FeaturesConfig.from_dict(config_data)
-            self._last_modified = self.config_path.stat().st_mtime
+            config, modified = self._parse_config_file()
+            self._apply_config(config, modified)
             logger.info(f"功能配置加载成功: {self.config_path}")
             return self.config
             
@@ -134,6 +296,30 @@ class FeaturesManager:
             logger.critical("无法加载功能配置文件，程序退出")
             quit(1)
     
+    def _parse_config_file(self) -> tuple[FeaturesConfig, float]:
+        """
+        读取并解析配置文件（不修改当前配置，可在线程中执行）
+        Returns:
+            tuple: (配置对象, 文件修改时间)
+        """
+        modified = self.config_path.stat().st_mtime
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            config_data = tomlkit.load(f)
+        return FeaturesConfig.from_dict(config_data), modified
+    
+    def _apply_config(self, config: FeaturesConfig, modified: float, changed_keys: Optional[set[str]] = None) -> None:
+        """
+        替换当前配置，快照（含权限索引）整体替换，读取时不会看到新旧混合的状态
+        Parameters:
+            changed_keys: Optional[set[str]]: 变化的配置项，名单类配置项未变化时沿用原权限索引及其判定缓存
+        """
+        permissions = None
+        if changed_keys is not None and PERMISSION_FIELDS.isdisjoint(changed_keys):
+            permissions = self.snapshot.permissions
+        self.snapshot = FeaturesSnapshot.from_config(config, permissions)
+        self.config = config
+        self._last_modified = modified
+    
     def _create_default_config(self):
         """创建默认功能配置文件"""
         template_path = "template/features_template.toml"
@@ -165,6 +351,7 @@ class FeaturesManager:
             "max_video_size_mb": 100,
             "download_timeout": 60,
             "supported_formats": ["mp4", "avi", "mov", "mkv", "flv", "wmv", "webm"],
+            "video_share_file_path": False,
             # 消息缓冲配置
             "enable_message_buffer": True,
             "message_buffer_enable_group": True,
@@ -172,6 +359,7 @@ class FeaturesManager:
             "message_buffer_interval": 3.0,
             "message_buffer_initial_delay": 0.5,
             "message_buffer_max_components": 50,
+            "message_buffer_max_bytes": 8192,
             "message_buffer_block_prefixes": ["/", "!", "！", ".", "。", "#", "%"]
         }
         
@@ -180,178 +368,123 @@ class FeaturesManager:
             quit(1)
     
     async def reload_config(self) -> bool:
-        """重新加载配置文件"""
+        """重新加载配置文件，解析在线程中进行，解析失败时保留当前配置"""
         try:
             if not self.config_path.exists():
                 logger.warning(f"功能配置文件不存在，无法重载: {self.config_path}")
                 return False
             
-            current_modified = self.config_path.stat().st_mtime
-            if self._last_modified and current_modified <= self._last_modified:
-                return False  # 文件未修改
-            
-            old_config = self.config
-            new_config = self.load_config()
-            
-            # 检查配置是否真的发生了变化
-            if old_config and self._configs_equal(old_config, new_config):
-                return False
-            
-            logger.info("功能配置已重载")
-            await self._notify_callbacks()
-            return True
-            
+            new_config, modified = await asyncio.to_thread(self._parse_config_file)
         except Exception as e:
-            logger.error(f"功能配置重载失败: {e}")
+            logger.error(f"功能配置重载失败，继续使用当前配置: {e}")
             return False
-    
-    def _configs_equal(self, config1: FeaturesConfig, config2: FeaturesConfig) -> bool:
-        """比较两个配置是否相等"""
-        return (
-            config1.group_list_type == config2.group_list_type and
-            set(config1.group_list) == set(config2.group_list) and
-            config1.private_list_type == config2.private_list_type and
-            set(config1.private_list) == set(config2.private_list) and
-            set(config1.ban_user_id) == set(config2.ban_user_id) and
-            config1.ban_qq_bot == config2.ban_qq_bot and
-            config1.enable_poke == config2.enable_poke and
-            config1.ignore_non_self_poke == config2.ignore_non_self_poke and
-            config1.poke_debounce_seconds == config2.poke_debounce_seconds and
-            config1.enable_reply_at == config2.enable_reply_at and
-            config1.reply_at_rate == config2.reply_at_rate and
-            config1.enable_video_analysis == config2.enable_video_analysis and
-            config1.max_video_size_mb == config2.max_video_size_mb and
-            config1.download_timeout == config2.download_timeout and
-            set(config1.supported_formats) == set(config2.supported_formats) and
-            # 消息缓冲配置比较
-            config1.enable_message_buffer == config2.enable_message_buffer and
-            config1.message_buffer_enable_group == config2.message_buffer_enable_group and
-            config1.message_buffer_enable_private == config2.message_buffer_enable_private and
-            config1.message_buffer_interval == config2.message_buffer_interval and
-            config1.message_buffer_initial_delay == config2.message_buffer_initial_delay and
-            config1.message_buffer_max_components == config2.message_buffer_max_components and
-            set(config1.message_buffer_block_prefixes) == set(config2.message_buffer_block_prefixes)
-        )
+        
+        # 检查配置是否真的发生了变化（列表类配置项的顺序或重复元素变化也视为变化）
+        changed_keys = self.config.diff(new_config) if self.config else {f.name for f in fields(FeaturesConfig)}
+        if not changed_keys:
+            self._last_modified = modified
+            return False
+        
+        self._apply_config(new_config, modified, changed_keys)
+        logger.info(f"功能配置已重载，变化的配置项: {', '.join(sorted(changed_keys))}")
+        await self._notify_callbacks(changed_keys)
+        return True
     
     async def start_file_watcher(self, check_interval: float = 1.0):
-        """启动文件监控，定期检查配置文件变化"""
-        if self._file_watcher_task and not self._file_watcher_task.done():
+        """
+        启动文件监控，优先使用inotify，不可用时按check_interval轮询
+        """
+        if self._file_watcher is not None:
             logger.warning("文件监控已在运行")
             return
         
-        self._file_watcher_task = asyncio.create_task(
-            self._file_watcher_loop(check_interval)
-        )
-        logger.info(f"功能配置文件监控已启动，检查间隔: {check_interval}秒")
+        self._file_watcher = ConfigFileWatcher(self.config_path, self.reload_config, poll_interval=check_interval)
+        self._file_watcher.start()
+        if self._file_watcher.mode == "inotify":
+            logger.info("功能配置文件监控已启动（inotify）")
+        else:
+            logger.info(f"功能配置文件监控已启动，检查间隔: {check_interval}秒")
     
     async def stop_file_watcher(self):
         """停止文件监控"""
-        if self._file_watcher_task and not self._file_watcher_task.done():
-            self._file_watcher_task.cancel()
-            try:
-                await self._file_watcher_task
-            except asyncio.CancelledError:
-                pass
+        if self._file_watcher is not None:
+            await self._file_watcher.stop()
+            self._file_watcher = None
             logger.info("功能配置文件监控已停止")
     
-    async def _file_watcher_loop(self, check_interval: float):
-        """文件监控循环"""
-        while True:
-            try:
-                await asyncio.sleep(check_interval)
-                await self.reload_config()
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"文件监控循环出错: {e}")
-                await asyncio.sleep(check_interval)
-    
     def get_config(self) -> FeaturesConfig:
-        """获取当前功能配置"""
-        if self.config is None:
-            return self.load_config()
-        return self.config
+        """获取当前功能配置（尚未加载时为默认配置）"""
+        return self.snapshot.config
+    
+    def get_snapshot(self) -> FeaturesSnapshot:
+        """获取当前的功能配置快照"""
+        return self.snapshot
+    
+    def get_permission_index(self) -> PermissionIndex:
+        """获取当前的权限索引"""
+        return self.snapshot.permissions
     
     def is_group_allowed(self, group_id: int) -> bool:
         """检查群聊是否被允许"""
-        config = self.get_config()
-        if config.group_list_type == "whitelist":
-            return group_id in config.group_list
-        else:  # blacklist
-            return group_id not in config.group_list
+        return self.snapshot.permissions.is_group_allowed(group_id)
     
     def is_private_allowed(self, user_id: int) -> bool:
         """检查私聊是否被允许"""
-        config = self.get_config()
-        if config.private_list_type == "whitelist":
-            return user_id in config.private_list
-        else:  # blacklist
-            return user_id not in config.private_list
+        return self.snapshot.permissions.is_private_allowed(user_id)
     
     def is_user_banned(self, user_id: int) -> bool:
         """检查用户是否被全局禁止"""
-        config = self.get_config()
-        return user_id in config.ban_user_id
+        return self.snapshot.permissions.is_user_banned(user_id)
+    
+    def check_chat_permission(
+        self, user_id: int, group_id: Optional[int] = None, ignore_global_list: bool = False
+    ) -> Optional[str]:
+        """
+        检查群聊/私聊名单与全局禁止名单
+        Returns:
+            Optional[str]: 拒绝原因（"group"/"private"/"banned"），允许时为None
+        """
+        return self.snapshot.permissions.check(user_id, group_id, ignore_global_list)
     
     def is_qq_bot_banned(self) -> bool:
         """检查是否禁止QQ官方机器人"""
-        config = self.get_config()
-        return config.ban_qq_bot
+        return self.snapshot.ban_qq_bot
     
     def is_poke_enabled(self) -> bool:
         """检查戳一戳功能是否启用"""
-        config = self.get_config()
-        return config.enable_poke
+        return self.snapshot.poke_enabled
     
     def is_non_self_poke_ignored(self) -> bool:
         """检查是否忽略非自己戳一戳"""
-        config = self.get_config()
-        return config.ignore_non_self_poke
+        return self.snapshot.non_self_poke_ignored
     
     def is_message_buffer_enabled(self) -> bool:
         """检查消息缓冲功能是否启用"""
-        config = self.get_config()
-        return config.enable_message_buffer
+        return self.snapshot.message_buffer_enabled
     
     def is_message_buffer_group_enabled(self) -> bool:
-        """检查群消息缓冲是否启用"""
-        config = self.get_config()
-        return config.message_buffer_enable_group
+        """检查群消息缓冲是否启用（总开关关闭时为False）"""
+        return self.snapshot.message_buffer_group_enabled
     
     def is_message_buffer_private_enabled(self) -> bool:
-        """检查私聊消息缓冲是否启用"""
-        config = self.get_config()
-        return config.message_buffer_enable_private
+        """检查私聊消息缓冲是否启用（总开关关闭时为False）"""
+        return self.snapshot.message_buffer_private_enabled
     
     def get_message_buffer_interval(self) -> float:
         """获取消息缓冲间隔时间"""
-        config = self.get_config()
-        return config.message_buffer_interval
+        return self.snapshot.message_buffer_interval
     
     def get_message_buffer_initial_delay(self) -> float:
         """获取消息缓冲初始延迟"""
-        config = self.get_config()
-        return config.message_buffer_initial_delay
+        return self.snapshot.message_buffer_initial_delay
     
     def get_message_buffer_max_components(self) -> int:
         """获取消息缓冲最大组件数量"""
-        config = self.get_config()
-        return config.message_buffer_max_components
-    
-    def is_message_buffer_group_enabled(self) -> bool:
-        """检查是否启用群聊消息缓冲"""
-        config = self.get_config()
-        return config.message_buffer_enable_group
-    
-    def is_message_buffer_private_enabled(self) -> bool:
-        """检查是否启用私聊消息缓冲"""
-        config = self.get_config()
-        return config.message_buffer_enable_private
+        return self.snapshot.message_buffer_max_components
     
     def get_message_buffer_block_prefixes(self) -> list[str]:
         """获取消息缓冲屏蔽前缀列表"""
-        config = self.get_config()
-        return config.message_buffer_block_prefixes
+        return list(self.snapshot.message_buffer_block_prefixes)
 
 
 # 全局功能管理器实例
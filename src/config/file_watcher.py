@@ -0,0 +1,170 @@
+"""
+配置文件监控模块
+Linux下通过inotify监听配置文件所在目录，文件变化后毫秒级触发且空闲时不会唤醒；
+inotify不可用时退回到定期检查修改时间
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from ..logger import logger
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# 监听目录而不是文件本身：编辑器常用"写临时文件再重命名"的方式保存，文件的inode会变化
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class ConfigFileWatcher:
+    """监控单个配置文件，连续的写入会被合并为一次回调"""
+
+    def __init__(
+        self,
+        file_path: Path,
+        on_change: Callable[[], Awaitable[None]],
+        debounce: float = 0.2,
+        poll_interval: float = 2.0,
+    ):
+        """
+        Args:
+            file_path: 被监控的文件
+            on_change: 文件变化后调用的协程函数
+            debounce: 最后一次变化后等待的时间（秒），期间的变化会被合并
+            poll_interval: inotify不可用时的轮询间隔（秒）
+        """
+        self.file_path = Path(file_path).resolve()
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.mode: Optional[str] = None
+        self._inotify_fd: Optional[int] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._debounce_handle: Optional[asyncio.TimerHandle] = None
+        self._callback_task: Optional[asyncio.Task] = None
+        self._rerun = False
+
+    def start(self) -> None:
+        """启动监控，优先使用inotify"""
+        if self.mode is not None:
+            return
+        if self._start_inotify():
+            self.mode = "inotify"
+        else:
+            # 在启动时记录基准状态，避免任务开始运行前的修改被当作基准而漏掉
+            self._poll_task = asyncio.create_task(self._poll_loop(self._stat_signature()))
+            self.mode = "polling"
+
+    async def stop(self) -> None:
+        """停止监控"""
+        if self._debounce_handle:
+            self._debounce_handle.cancel()
+            self._debounce_handle = None
+        if self._inotify_fd is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify_fd)
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        for task in (self._poll_task, self._callback_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._poll_task = None
+        self._callback_task = None
+        self.mode = None
+
+    def _start_inotify(self) -> bool:
+        try:
+            libc_name = ctypes.util.find_library("c")
+            if libc_name is None:
+                return False
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            if not hasattr(libc, "inotify_init1"):
+                return False
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+            watch_dir = str(self.file_path.parent).encode()
+            if libc.inotify_add_watch(fd, watch_dir, WATCH_MASK) < 0:
+                errno = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(errno, "inotify_add_watch 失败")
+            asyncio.get_running_loop().add_reader(fd, self._on_inotify_readable)
+            self._inotify_fd = fd
+            return True
+        except Exception as e:
+            logger.debug(f"inotify不可用，使用轮询监控配置文件: {e}")
+            return False
+
+    def _on_inotify_readable(self) -> None:
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.error(f"读取inotify事件失败: {e}")
+            return
+        target_name = self.file_path.name.encode()
+        offset = 0
+        changed = False
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if name == target_name:
+                changed = True
+        if changed:
+            self._schedule_callback()
+
+    async def _poll_loop(self, last_signature: Optional[tuple]) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            signature = self._stat_signature()
+            if signature != last_signature:
+                last_signature = signature
+                self._schedule_callback()
+
+    def _stat_signature(self) -> Optional[tuple]:
+        try:
+            stat = self.file_path.stat()
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _schedule_callback(self) -> None:
+        """重新开始防抖计时"""
+        if self._debounce_handle:
+            self._debounce_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._debounce_handle = loop.call_later(self.debounce, self._fire)
+
+    def _fire(self) -> None:
+        self._debounce_handle = None
+        if self._callback_task and not self._callback_task.done():
+            # 上一次回调尚未结束，结束后再执行一次
+            self._rerun = True
+            return
+        self._callback_task = asyncio.create_task(self._run_callback())
+
+    async def _run_callback(self) -> None:
+        while True:
+            self._rerun = False
+            try:
+                await self.on_change()
+            except Exception as e:
+                logger.error(f"配置文件变化回调执行失败: {e}")
+            if not self._rerun:
+                return
@@ -69,6 +69,63 @@ class SlicingConfig(ConfigBase):
     delay_ms: int = 10
     """切片发送间隔时间，单位为毫秒"""
 
+    max_concurrent_sends: int = 2
+    """同一平台同时进行切片发送的大消息数量"""
+
+    reassembly_max_mb: float = 64.0
+    """重组中的切片最多占用的内存，单位为MB，超出后淘汰最久未更新的切片组"""
+
+    reassembly_max_groups: int = 32
+    """同时重组的切片组最大数量，超出后淘汰最久未更新的切片组"""
+
+
+@dataclass
+class ProcessingConfig(ConfigBase):
+    max_concurrency: int = 8
+    """同时处理事件的最大数量，同一群聊/私聊的事件始终按顺序处理"""
+
+    segment_concurrency: int = 4
+    """单条消息内并发解析的消息段数量（图片下载、@成员查询、引用消息获取等）"""
+
+    forward_image_max_kb: int = 4096
+    """转发消息中图片的总大小预算（Base64后，单位KB），超出部分使用占位符"""
+
+    forward_image_time_budget: float = 10.0
+    """转发消息中图片的下载时间预算，单位为秒，超时未完成的图片使用占位符"""
+
+    json_encoder: Literal["auto", "json", "orjson"] = "auto"
+    """发往MaiBot的消息使用的JSON编码器，auto表示安装了orjson时使用orjson，否则使用标准库json"""
+
+
+@dataclass
+class HttpConfig(ConfigBase):
+    max_connections: int = 64
+    """共享HTTP连接池的最大连接数"""
+
+    max_connections_per_host: int = 16
+    """对单个主机（如QQ多媒体服务器）的最大并发连接数"""
+
+    keepalive_timeout: float = 30.0
+    """空闲长连接的保持时间，单位为秒"""
+
+
+@dataclass
+class CacheConfig(ConfigBase):
+    info_ttl: float = 300.0
+    """群信息/群成员信息/自身信息/陌生人信息的缓存时间，单位为秒，0表示不缓存"""
+
+    info_negative_ttl: float = 30.0
+    """查询失败结果的缓存时间，单位为秒，0表示不缓存失败结果"""
+
+    info_max_entries: int = 4096
+    """信息缓存的最大条目数"""
+
+    media_memory_mb: float = 64.0
+    """图片/表情包内存缓存大小上限，单位为MB"""
+
+    media_disk_mb: float = 512.0
+    """图片/表情包磁盘缓存大小上限，单位为MB，0表示不使用磁盘缓存"""
+
 
 @dataclass
 class DebugConfig(ConfigBase):
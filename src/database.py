@@ -1,6 +1,9 @@
 import os
-from typing import Optional, List
+import asyncio
+from typing import Dict, Iterable, Optional, List, Tuple
 from dataclasses import dataclass
+from sqlalchemy import bindparam, delete, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import Field, Session, SQLModel, create_engine, select
 
 from src.logger import logger
@@ -36,11 +39,14 @@ class DB_BanUser(SQLModel, table=True):
     lift_time: Optional[int]  # 禁言解除的时间（时间戳）
 
 
-def is_identical(obj1: BanUser, obj2: BanUser) -> bool:
+def _set_sqlite_pragma(dbapi_connection, connection_record) -> None:
     """
-    检查两个 BanUser 对象是否相同。
+    每个新连接启用WAL模式，读写互不阻塞，提交时也无需每次完整同步到磁盘。
     """
-    return obj1.user_id == obj2.user_id and obj1.group_id == obj2.group_id
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 
 
 class DatabaseManager:
@@ -53,6 +59,7 @@ class DatabaseManager:
         DATABASE_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "NapcatAdapter.db")
         self.sqlite_url = f"sqlite:///{DATABASE_FILE}"  # SQLite 数据库 URL
         self.engine = create_engine(self.sqlite_url, echo=False)  # 创建数据库引擎
+        event.listen(self.engine, "connect", _set_sqlite_pragma)
         self._ensure_database()  # 确保数据库和表已创建
 
     def _ensure_database(self) -> None:
@@ -63,49 +70,35 @@ class DatabaseManager:
         SQLModel.metadata.create_all(self.engine)
         logger.success("数据库和表已创建或已存在")
 
-    def update_ban_record(self, ban_list: List[BanUser]) -> None:
-        # sourcery skip: class-extract-method
+    def apply_ban_changes(self, upserts: Iterable[BanUser], deletes: Iterable[Tuple[int, int]]) -> None:
         """
-        更新禁言列表到数据库。
-        支持在不存在时创建新记录，对于多余的项目自动删除。
+        在同一个事务中批量写入与删除禁言记录。
+        Parameters:
+            upserts: Iterable[BanUser]: 需要创建或更新的记录
+            deletes: Iterable[Tuple[int, int]]: 需要删除的记录，元素为 (group_id, user_id)
         """
+        upsert_rows = [
+            {"user_id": item.user_id, "group_id": item.group_id, "lift_time": item.lift_time} for item in upserts
+        ]
+        delete_rows = [{"b_group_id": group_id, "b_user_id": user_id} for group_id, user_id in deletes]
+        if not upsert_rows and not delete_rows:
+            return
+        table = DB_BanUser.__table__
         with Session(self.engine) as session:
-            all_records = session.exec(select(DB_BanUser)).all()
-            for ban_user in ban_list:
-                statement = select(DB_BanUser).where(
-                    DB_BanUser.user_id == ban_user.user_id, DB_BanUser.group_id == ban_user.group_id
+            if upsert_rows:
+                statement = sqlite_insert(table)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[table.c.user_id, table.c.group_id],
+                    set_={"lift_time": statement.excluded.lift_time},
                 )
-                if existing_record := session.exec(statement).first():
-                    if existing_record.lift_time == ban_user.lift_time:
-                        logger.debug(f"禁言记录未变更: {existing_record}")
-                        continue
-                    # 更新现有记录的 lift_time
-                    existing_record.lift_time = ban_user.lift_time
-                    session.add(existing_record)
-                    logger.debug(f"更新禁言记录: {existing_record}")
-                else:
-                    # 创建新记录
-                    db_record = DB_BanUser(
-                        user_id=ban_user.user_id, group_id=ban_user.group_id, lift_time=ban_user.lift_time
-                    )
-                    session.add(db_record)
-                    logger.debug(f"创建新禁言记录: {ban_user}")
-            # 删除不在 ban_list 中的记录
-            for db_record in all_records:
-                record = BanUser(user_id=db_record.user_id, group_id=db_record.group_id, lift_time=db_record.lift_time)
-                if not any(is_identical(record, ban_user) for ban_user in ban_list):
-                    statement = select(DB_BanUser).where(
-                        DB_BanUser.user_id == record.user_id, DB_BanUser.group_id == record.group_id
-                    )
-                    if ban_record := session.exec(statement).first():
-                        session.delete(ban_record)
-                        
-                        logger.debug(f"删除禁言记录: {ban_record}")
-                    else:
-                        logger.info(f"未找到禁言记录: {ban_record}")
-
-            
-            logger.info("禁言记录已更新")
+                session.connection().execute(statement, upsert_rows)
+            if delete_rows:
+                statement = delete(table).where(
+                    table.c.group_id == bindparam("b_group_id"), table.c.user_id == bindparam("b_user_id")
+                )
+                session.connection().execute(statement, delete_rows)
+            session.commit()
+        logger.debug(f"禁言记录批量写入完成: 写入 {len(upsert_rows)} 条，删除 {len(delete_rows)} 条")
 
     def get_ban_records(self) -> List[BanUser]:
         """
@@ -116,47 +109,83 @@ class DatabaseManager:
             records = session.exec(statement).all()
             return [BanUser(user_id=item.user_id, group_id=item.group_id, lift_time=item.lift_time) for item in records]
 
-    def create_ban_record(self, ban_record: BanUser) -> None:
-        """
-        为特定群组中的用户创建禁言记录。
-        一个简化版本的添加方式，防止 update_ban_record 方法的复杂性。
-        其同时还是简化版的更新方式。
-        """
-        with Session(self.engine) as session:
-            # 检查记录是否已存在
-            statement = select(DB_BanUser).where(
-                DB_BanUser.user_id == ban_record.user_id, DB_BanUser.group_id == ban_record.group_id
-            )
-            existing_record = session.exec(statement).first()
-            if existing_record:
-                # 如果记录已存在，更新 lift_time
-                existing_record.lift_time = ban_record.lift_time
-                session.add(existing_record)
-                logger.debug(f"更新禁言记录: {ban_record}")
-            else:
-                # 如果记录不存在，创建新记录
-                db_record = DB_BanUser(
-                    user_id=ban_record.user_id, group_id=ban_record.group_id, lift_time=ban_record.lift_time
-                )
-                session.add(db_record)
-                logger.debug(f"创建新禁言记录: {ban_record}")
-            
 
-    def delete_ban_record(self, ban_record: BanUser):
-        """
-        删除特定用户在特定群组中的禁言记录。
-        一个简化版本的删除方式，防止 update_ban_record 方法的复杂性。
-        """
-        user_id = ban_record.user_id
-        group_id = ban_record.group_id
-        with Session(self.engine) as session:
-            statement = select(DB_BanUser).where(DB_BanUser.user_id == user_id, DB_BanUser.group_id == group_id)
-            if ban_record := session.exec(statement).first():
-                session.delete(ban_record)
-                
-                logger.debug(f"删除禁言记录: {ban_record}")
-            else:
-                logger.info(f"未找到禁言记录: user_id: {user_id}, group_id: {group_id}")
+class BanRecordWriter:
+    """
+    禁言记录的延迟批量写入器。
+    事件循环中只记录变更，同一条记录的多次变更会合并，
+    到达刷新间隔后在线程中用一个事务提交。
+    """
+
+    def __init__(self, manager: DatabaseManager, flush_interval: float = 1.0):
+        self.manager = manager
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[int, int], Optional[BanUser]] = {}  # 值为None表示删除
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushed_count = 0
+        self.failed_flushes = 0
+
+    def upsert(self, ban_record: BanUser) -> None:
+        """记录一次创建或更新"""
+        self._pending[(ban_record.group_id, ban_record.user_id)] = ban_record
+        self._schedule_flush()
+
+    def delete(self, group_id: int, user_id: int) -> None:
+        """记录一次删除"""
+        self._pending[(group_id, user_id)] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        # 刷新期间产生的新变更（或失败的变更）在下一个间隔继续提交
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if not self._pending:
+                return
+
+    async def flush(self) -> None:
+        """立即提交所有待写入的变更"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            upserts = [record for record in batch.values() if record is not None]
+            deletes = [key for key, record in batch.items() if record is None]
+            try:
+                await asyncio.to_thread(self.manager.apply_ban_changes, upserts, deletes)
+                self.flushed_count += len(batch)
+            except asyncio.CancelledError:
+                # 写入是幂等的，放回队列由后续的刷新重新提交
+                self._requeue(batch)
+                raise
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"禁言记录写入数据库失败，将在下次写入时重试: {e}")
+                self._requeue(batch)
+
+    def _requeue(self, batch: Dict[Tuple[int, int], Optional[BanUser]]) -> None:
+        """未提交的变更放回队列，期间产生的更新的变更优先"""
+        batch.update(self._pending)
+        self._pending = batch
+
+    async def close(self) -> None:
+        """关闭前写入所有剩余变更"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+        if self._pending:
+            logger.warning(f"仍有 {len(self._pending)} 条禁言记录未能写入数据库")
 
 
 db_manager = DatabaseManager()
+ban_record_writer = BanRecordWriter(db_manager)
@@ -0,0 +1,66 @@
+"""
+共享HTTP客户端模块
+全进程复用同一个连接池与SSL上下文，用于下载图片、表情包与视频
+"""
+import ssl
+import aiohttp
+from typing import Optional
+from .logger import logger
+from .config import global_config
+
+
+def create_ssl_context() -> ssl.SSLContext:
+    """创建兼容QQ多媒体服务器的SSL上下文"""
+    context = ssl.create_default_context()
+    context.set_ciphers("DEFAULT@SECLEVEL=1")
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    return context
+
+
+class HttpClient:
+    """进程级共享的异步HTTP客户端，保持长连接"""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ssl_context: Optional[ssl.SSLContext] = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """获取共享的ClientSession，首次调用时创建（需在事件循环内调用）"""
+        if self._session is None or self._session.closed:
+            if self._ssl_context is None:
+                self._ssl_context = create_ssl_context()
+            connector = aiohttp.TCPConnector(
+                limit=global_config.http.max_connections,
+                limit_per_host=global_config.http.max_connections_per_host,
+                keepalive_timeout=global_config.http.keepalive_timeout,
+                ssl=self._ssl_context,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            logger.debug("共享HTTP客户端已创建")
+        return self._session
+
+    async def fetch_bytes(self, url: str, timeout: float = 10) -> bytes:
+        """
+        下载URL内容
+        Parameters:
+            url: str: 资源地址
+            timeout: float: 总超时时间（秒）
+        Returns:
+            bytes: 响应内容
+        """
+        session = self.get_session()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP Error: {response.status}")
+            return await response.read()
+
+    async def close(self) -> None:
+        """关闭连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.info("共享HTTP客户端已关闭")
+        self._session = None
+
+
+http_client = HttpClient()
@@ -0,0 +1,130 @@
+"""
+异步TTL缓存模块
+用于缓存群信息、群成员信息等Napcat查询结果，支持并发请求合并与失败结果的短期缓存
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from .logger import logger
+
+
+class LoaderCancelled(Exception):
+    """负责加载的调用方被取消，等待同一加载的其他调用方应重新发起加载"""
+
+
+class AsyncTTLCache:
+    """带过期时间的异步LRU缓存"""
+
+    def __init__(self, name: str, ttl: float, negative_ttl: float, max_entries: int):
+        """
+        Args:
+            name: 缓存名称，用于日志
+            ttl: 成功结果的过期时间（秒）
+            negative_ttl: 失败结果（None）的过期时间（秒）
+            max_entries: 最大条目数，超出后淘汰最久未使用的条目
+        """
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """
+        读取缓存，不存在或过期时调用loader加载
+        同一个key同时只会有一个loader在执行，其余调用方等待同一结果
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                if value is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return value
+            del self._entries[key]
+
+        while (inflight := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except LoaderCancelled:
+                self.coalesced -= 1
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        value = None
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # 被取消的加载既不缓存也不把None交给等待者，由等待者重新加载
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            future.set_exception(LoaderCancelled(key))
+            future.exception()
+            raise
+        except Exception as e:
+            logger.debug(f"{self.name} 缓存加载失败: {e}")
+            value = None
+        finally:
+            # 加载期间被失效的key不写入缓存
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                self._store(key, value)
+            if not future.done():
+                future.set_result(value)
+        return value
+
+    def _store(self, key: Hashable, value: Optional[Any]) -> None:
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """使指定key失效"""
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+        self._inflight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """使所有满足条件的key失效"""
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+            self.invalidations += 1
+        for key in [k for k in self._inflight if predicate(k)]:
+            del self._inflight[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._inflight.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        lookups = self.hits + self.negative_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits + self.negative_hits + self.coalesced) / lookups if lookups else 0.0,
+        }
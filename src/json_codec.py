@@ -0,0 +1,60 @@
+"""
+JSON编码模块
+发往MaiBot的消息统一在这里编码为UTF-8字节，编码器可配置：安装了orjson时默认使用orjson，否则使用标准库json
+"""
+import json
+from typing import Any, Callable, Dict
+from .logger import logger
+from .config import global_config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _orjson_dumps(obj: Any) -> bytes:
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # orjson不支持的值（如超过64位的整数）退回标准库
+        return _json_dumps(obj)
+
+
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {"json": _json_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = _orjson_dumps
+
+
+class JsonEncoder:
+    """可替换实现的JSON编码器"""
+
+    def __init__(self, name: str = "auto"):
+        """
+        Parameters:
+            name: str: 编码器名称，"auto" 表示优先使用orjson
+        """
+        if name == "auto":
+            name = "orjson" if "orjson" in ENCODERS else "json"
+        if name not in ENCODERS:
+            logger.warning(f"JSON编码器 {name} 不可用（未安装？），使用标准库json")
+            name = "json"
+        self.name = name
+        self._dumps = ENCODERS[name]
+
+    def dumps(self, obj: Any) -> bytes:
+        """
+        将对象编码为UTF-8 JSON字节
+        Parameters:
+            obj: Any: 待编码的对象
+        Returns:
+            bytes: 紧凑格式的UTF-8 JSON
+        """
+        return self._dumps(obj)
+
+
+json_encoder = JsonEncoder(global_config.processing.json_encoder)
@@ -1,6 +1,8 @@
 from loguru import logger
 from .config import global_config
+from typing import Any, Dict, Optional
 import sys
+import time
 
 # 默认 logger
 logger.remove()
@@ -19,3 +21,66 @@ logger.add(
 # 创建样式不同的 logger
 custom_logger = logger.bind(name="maim_message")
 logger = logger.bind(name="MaiBot-Napcat-Adapter")
+
+# 主日志是否输出DEBUG级别，热路径据此跳过调试信息的构造
+_DEBUG_ENABLED = logger.level(global_config.debug.level).no <= logger.level("DEBUG").no
+
+
+def debug_enabled() -> bool:
+    """是否输出DEBUG日志，构造调试信息代价较大（循环、序列化）时先检查"""
+    return _DEBUG_ENABLED
+
+
+def lazy_debug(message: str, *args: Any) -> None:
+    """
+    按需格式化的DEBUG日志，未启用DEBUG时不做任何格式化
+    Parameters:
+        message: str: 日志模板，使用 {} 占位
+        args: Any: 模板参数，可调用对象（如lambda）仅在输出时才调用
+    """
+    if _DEBUG_ENABLED:
+        logger.opt(depth=1).debug(message, *(arg() if callable(arg) else arg for arg in args))
+
+
+class LogSampler:
+    """高频日志采样：同一key在interval秒内只输出第一条，下一次输出时附带期间跳过的条数"""
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self._last_logged: Dict[str, float] = {}
+        self._skipped: Dict[str, int] = {}
+
+    def sample(self, key: str) -> Optional[int]:
+        """
+        判断本条日志是否输出
+        Returns:
+            Optional[int]: 输出时返回此前被跳过的条数，不输出时返回None
+        """
+        now = time.monotonic()
+        if now - self._last_logged.get(key, -self.interval) < self.interval:
+            self._skipped[key] = self._skipped.get(key, 0) + 1
+            return None
+        self._last_logged[key] = now
+        return self._skipped.pop(key, 0)
+
+
+log_sampler = LogSampler()
+
+
+def sampled_debug(key: str, message: str, *args: Any) -> None:
+    """
+    采样输出的DEBUG日志，用于每个切片、每个消息段级别的高频日志
+    Parameters:
+        key: str: 采样键，同一key共享采样间隔
+        message: str: 日志模板，使用 {} 占位
+        args: Any: 模板参数，可调用对象仅在输出时才调用
+    """
+    if not _DEBUG_ENABLED:
+        return
+    skipped = log_sampler.sample(key)
+    if skipped is None:
+        return
+    rendered = message.format(*(arg() if callable(arg) else arg for arg in args))
+    if skipped:
+        rendered += f"（期间省略 {skipped} 条同类日志）"
+    logger.opt(depth=1).debug(rendered)
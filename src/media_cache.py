@@ -0,0 +1,217 @@
+"""
+媒体缓存模块
+按QQ文件ID/文件名或URL为图片与表情包的Base64建立内存+磁盘两级LRU缓存，重复的表情包无需再次下载与编码
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+from .logger import logger
+from .info_cache import LoaderCancelled
+from .config import global_config
+
+# URL中每次都会变化的鉴权参数，不参与缓存键计算
+VOLATILE_QUERY_KEYS = {"rkey", "term", "is_origin"}
+
+MEDIA_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "media_cache")
+
+
+def make_media_key(url: str, file: Optional[str] = None) -> str:
+    """
+    计算媒体缓存键
+    Parameters:
+        url: str: 媒体URL
+        file: str: QQ上报的文件名（通常包含文件md5），优先使用
+    Returns:
+        str: 缓存键（sha1十六进制）
+    """
+    if file:
+        source = f"file:{file}"
+    else:
+        parsed = urlparse(url or "")
+        query = dict(parse_qsl(parsed.query))
+        if "fileid" in query:
+            source = f"fileid:{query['fileid']}"
+        else:
+            stable_query = urlencode(sorted((k, v) for k, v in query.items() if k not in VOLATILE_QUERY_KEYS))
+            source = f"url:{parsed.netloc}{parsed.path}?{stable_query}"
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+class MediaCache:
+    """内存+磁盘两级媒体Base64缓存"""
+
+    def __init__(self, cache_dir: str, memory_max_bytes: int, disk_max_bytes: int):
+        self.cache_dir = cache_dir
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_index: Optional["OrderedDict[str, int]"] = None
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()  # 磁盘索引只在工作线程中修改
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _load_disk_index(self) -> None:
+        """扫描磁盘缓存目录，按修改时间重建LRU索引（在线程中执行）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        entries.sort()
+        self._disk_index = OrderedDict((name, size) for _, name, size in entries)
+        self._disk_bytes = sum(size for _, _, size in entries)
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        with self._disk_lock:
+            return self._read_disk_locked(key)
+
+    def _write_disk(self, key: str, data: str) -> None:
+        with self._disk_lock:
+            self._write_disk_locked(key, data)
+
+    def _read_disk_locked(self, key: str) -> Optional[str]:
+        if self._disk_index is None:
+            self._load_disk_index()
+        if key not in self._disk_index:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="ascii") as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            self._disk_bytes -= self._disk_index.pop(key, 0)
+            return None
+        self._disk_index.move_to_end(key)
+        return data
+
+    def _write_disk_locked(self, key: str, data: str) -> None:
+        if self._disk_index is None:
+            self._load_disk_index()
+        size = len(data)
+        if size > self.disk_max_bytes:
+            return
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="ascii") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._disk_bytes += size - self._disk_index.pop(key, 0)
+        self._disk_index[key] = size
+        while self._disk_bytes > self.disk_max_bytes and self._disk_index:
+            old_key, old_size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= old_size
+            self.disk_evictions += 1
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _put_memory(self, key: str, data: str) -> None:
+        size = len(data)
+        if size > self.memory_max_bytes:
+            return
+        self._memory_bytes += size - len(self._memory.pop(key, ""))
+        self._memory[key] = data
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, old_data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_data)
+            self.memory_evictions += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        """读取缓存的Base64，依次查找内存与磁盘"""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return data
+        if self.disk_max_bytes <= 0:
+            return None
+        data = await asyncio.to_thread(self._read_disk, key)
+        if data is not None:
+            self.disk_hits += 1
+            self._put_memory(key, data)
+        return data
+
+    async def put(self, key: str, raw_data: bytes) -> str:
+        """编码并写入缓存，返回Base64"""
+        data = base64.b64encode(raw_data).decode("ascii")
+        self._put_memory(key, data)
+        if self.disk_max_bytes > 0:
+            try:
+                await asyncio.to_thread(self._write_disk, key, data)
+            except OSError as e:
+                logger.warning(f"写入媒体磁盘缓存失败: {e}")
+        return data
+
+    async def get_or_fetch(self, key: str, fetcher: Callable[[], Awaitable[bytes]]) -> str:
+        """
+        读取缓存，未命中时调用fetcher下载并写入缓存
+        同一个key同时只会下载一次；负责下载的调用方被取消时，其余等待者之一会接手重新下载
+        """
+        data = await self.get(key)
+        if data is not None:
+            return data
+        while (inflight := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except LoaderCancelled:
+                self.coalesced -= 1
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await self.put(key, await fetcher())
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            # 不能取消共享的future，否则所有等待者都会收到与自己无关的CancelledError
+            future.set_exception(LoaderCancelled(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现"exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        lookups = self.memory_hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk_index) if self._disk_index is not None else None,
+            "disk_bytes": self._disk_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": (self.memory_hits + self.disk_hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+media_cache = MediaCache(
+    MEDIA_CACHE_DIR,
+    memory_max_bytes=int(global_config.cache.media_memory_mb * 1024 * 1024),
+    disk_max_bytes=int(global_config.cache.media_disk_mb * 1024 * 1024),
+)
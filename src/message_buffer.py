@@ -1,43 +1,64 @@
 import asyncio
+import heapq
+import itertools
 import time
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass, field
-from src.logger import logger
+from src.logger import logger, lazy_debug
 from src.config.features_config import features_manager
 from src.recv_handler import RealMessageType
 
+# 合并锁的分片数量，同一会话的合并总是落在同一分片上，保证按顺序执行
+MERGE_LOCK_SHARDS = 64
 
-@dataclass
-class TextMessage:
-    """文本消息"""
-    text: str
-    timestamp: float = field(default_factory=time.time)
+# 合并时相邻两条消息的文本之间的分隔符
+MERGE_SEPARATOR = "，"
+MERGE_SEPARATOR_BYTES = len(MERGE_SEPARATOR.encode("utf-8"))
+
+# 可以缓冲合并的消息段类型，图片等媒体只保存原始消息段，合并时才下载解析
+BUFFERABLE_SEGMENT_TYPES = frozenset(
+    {RealMessageType.text, RealMessageType.face, RealMessageType.image, RealMessageType.at}
+)
 
 
 @dataclass
 class BufferedSession:
     """缓冲会话数据"""
     session_id: str
-    messages: List[TextMessage] = field(default_factory=list)
-    timer_task: Optional[asyncio.Task] = None
-    delay_task: Optional[asyncio.Task] = None
+    messages: List[List[Dict[str, Any]]] = field(default_factory=list)
+    """每条消息整理后的原始消息段，合并时才拼接"""
+    byte_count: int = 0
+    """合并后文本的UTF-8字节数（含分隔符，近似值），随消息追加累计"""
+    deadline: float = 0.0
+    """合并时间（time.monotonic），每收到一条消息向后推迟"""
     original_event: Any = None
     created_at: float = field(default_factory=time.time)
 
 
 class SimpleMessageBuffer:
+    """
+    消息缓冲器
+    所有会话的合并时间由一个截止时间堆和一个调度任务驱动，每个会话在堆中只有一个条目：
+    新消息只推迟会话的deadline，条目出堆时发现deadline已推迟则按新时间重新入堆
+    """
     
     def __init__(self, merge_callback=None):
         """
         初始化消息缓冲器
         
         Args:
-            merge_callback: 消息合并后的回调函数，接收(session_id, merged_text, original_event)参数
+            merge_callback: 消息合并后的回调函数，接收(session_id, merged_segments, original_event)参数，
+                merged_segments 为合并后尚未解析的OneBot消息段列表
         """
         self.buffer_pool: Dict[str, BufferedSession] = {}
-        self.lock = asyncio.Lock()
         self.merge_callback = merge_callback
         self._shutdown = False
+        self._deadlines: List[Tuple[float, int, BufferedSession]] = []  # (deadline, seq, session)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._scheduler: Optional[asyncio.Task] = None
+        self._merge_locks = [asyncio.Lock() for _ in range(MERGE_LOCK_SHARDS)]
+        self._merge_tasks: Set[asyncio.Task] = set()
         
     def get_session_id(self, event_data: Dict[str, Any]) -> str:
         """根据事件数据生成会话ID"""
@@ -52,60 +73,76 @@ class SimpleMessageBuffer:
         else:
             return f"{message_type}_{user_id}"
     
-    def extract_text_from_message(self, message: List[Dict[str, Any]]) -> Optional[str]:
-        """从OneBot消息中提取纯文本，如果包含非文本内容则返回None"""
-        text_parts = []
-        has_non_text = False
-        
-        logger.debug(f"正在提取消息文本，消息段数量: {len(message)}")
-        
+    def normalize_segments(self, message: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        整理可缓冲的OneBot消息段：文本去除首尾空白，同一条消息中相邻的文本以空格连接
+        Returns:
+            Optional[List[Dict[str, Any]]]: 整理后的消息段，包含不可缓冲的消息段或没有有效内容时为None
+        """
+        segments: List[Dict[str, Any]] = []
         for msg_seg in message:
-            msg_type = msg_seg.get("type", "")
-            logger.debug(f"处理消息段类型: {msg_type}")
-            
-            if msg_type == RealMessageType.text:
-                text = msg_seg.get("data", {}).get("text", "").strip()
-                if text:
-                    text_parts.append(text)
-                    logger.debug(f"提取到文本: {text[:50]}...")
+            seg_type = msg_seg.get("type")
+            if seg_type not in BUFFERABLE_SEGMENT_TYPES:
+                logger.debug(f"消息包含不可缓冲的消息段 {seg_type}，不进行缓冲")
+                return None
+            if seg_type != RealMessageType.text:
+                segments.append(msg_seg)
+                continue
+            text = msg_seg.get("data", {}).get("text", "").strip()
+            if not text:
+                continue
+            if segments and segments[-1].get("type") == RealMessageType.text:
+                segments[-1] = {"type": RealMessageType.text, "data": {"text": f"{segments[-1]['data']['text']} {text}"}}
             else:
-                # 发现非文本消息段，标记为包含非文本内容
-                has_non_text = True
-                logger.debug(f"发现非文本消息段: {msg_type}，跳过缓冲")
-        
-        # 如果包含非文本内容，则不进行缓冲
-        if has_non_text:
-            logger.debug("消息包含非文本内容，不进行缓冲")
-            return None
-            
-        if text_parts:
-            combined_text = " ".join(text_parts).strip()
-            logger.debug(f"成功提取纯文本: {combined_text[:50]}...")
-            return combined_text
-        
-        logger.debug("没有找到有效的文本内容")
-        return None
+                segments.append({"type": RealMessageType.text, "data": {"text": text}})
+        return segments or None
+    
+    @staticmethod
+    def _text_bytes(segments: List[Dict[str, Any]]) -> int:
+        return sum(
+            len(seg["data"]["text"].encode("utf-8")) for seg in segments if seg.get("type") == RealMessageType.text
+        )
+    
+    @staticmethod
+    def merge_segments(messages: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        按顺序拼接各条消息的消息段，相邻消息的文本以分隔符连接为一个文本段
+        纯文本会话的结果与逐条文本以分隔符拼接相同
+        """
+        merged: List[Dict[str, Any]] = []
+        text_run: List[str] = []
+        for segments in messages:
+            for msg_seg in segments:
+                if msg_seg.get("type") == RealMessageType.text:
+                    if text_run:
+                        text_run.append(MERGE_SEPARATOR)
+                    text_run.append(msg_seg["data"]["text"])
+                    continue
+                if text_run:
+                    merged.append({"type": RealMessageType.text, "data": {"text": "".join(text_run)}})
+                    text_run = []
+                merged.append(msg_seg)
+        if text_run:
+            merged.append({"type": RealMessageType.text, "data": {"text": "".join(text_run)}})
+        return merged
     
     def should_skip_message(self, text: str) -> bool:
-        """判断消息是否应该跳过缓冲"""
-        if not text or not text.strip():
+        """判断消息是否应该跳过缓冲（text 应已去除首尾空白）"""
+        if not text:
             return True
-            
-        # 检查屏蔽前缀
-        config = features_manager.get_config()
-        block_prefixes = tuple(config.message_buffer_block_prefixes)
         
-        text = text.strip()
-        if text.startswith(block_prefixes):
+        # 检查屏蔽前缀，前缀在配置加载时已编译为正则
+        pattern = features_manager.snapshot.message_buffer_block_pattern
+        if pattern is not None and pattern.match(text):
             logger.debug(f"消息以屏蔽前缀开头，跳过缓冲: {text[:20]}...")
             return True
-            
+        
         return False
     
-    async def add_text_message(self, event_data: Dict[str, Any], message: List[Dict[str, Any]], 
-                              original_event: Any = None) -> bool:
+    async def add_message(self, event_data: Dict[str, Any], message: List[Dict[str, Any]], 
+                          original_event: Any = None) -> bool:
         """
-        添加文本消息到缓冲区
+        添加消息到缓冲区，消息段保持原样，图片等媒体在合并时才解析
         
         Args:
             event_data: 事件数据
@@ -118,200 +155,188 @@ class SimpleMessageBuffer:
         if self._shutdown:
             return False
             
-        config = features_manager.get_config()
-        if not config.enable_message_buffer:
-            return False
-        
+        snapshot = features_manager.snapshot
         # 检查是否启用对应类型的缓冲
-        message_type = event_data.get("message_type", "")
-        if message_type == "group" and not config.message_buffer_enable_group:
-            return False
-        elif message_type == "private" and not config.message_buffer_enable_private:
+        if not snapshot.is_message_buffer_enabled_for(event_data.get("message_type", "")):
             return False
         
-        # 提取文本
-        text = self.extract_text_from_message(message)
-        if not text:
+        # 整理消息段
+        segments = self.normalize_segments(message)
+        if not segments:
             return False
             
-        # 检查是否应该跳过
-        if self.should_skip_message(text):
+        # 检查第一个文本段的屏蔽前缀，前面有@、表情等消息段时同样检查（如 "@bot /help"）
+        first_text = next((seg["data"]["text"] for seg in segments if seg.get("type") == RealMessageType.text), None)
+        if first_text is not None and self.should_skip_message(first_text):
             return False
         
         session_id = self.get_session_id(event_data)
         
-        async with self.lock:
-            # 获取或创建会话
-            if session_id not in self.buffer_pool:
-                self.buffer_pool[session_id] = BufferedSession(
-                    session_id=session_id,
-                    original_event=original_event
-                )
-            
-            session = self.buffer_pool[session_id]
-            
-            # 检查是否超过最大组件数量
-            if len(session.messages) >= config.message_buffer_max_components:
-                logger.info(f"会话 {session_id} 消息数量达到上限，强制合并")
-                asyncio.create_task(self._force_merge_session(session_id))
-                self.buffer_pool[session_id] = BufferedSession(
-                    session_id=session_id,
-                    original_event=original_event
-                )
-                session = self.buffer_pool[session_id]
-            
-            # 添加文本消息
-            session.messages.append(TextMessage(text=text))
-            session.original_event = original_event  # 更新事件
-            
-            # 取消之前的定时器
-            await self._cancel_session_timers(session)
-            
-            # 设置新的延迟任务
-            session.delay_task = asyncio.create_task(
-                self._wait_and_start_merge(session_id)
-            )
-            
-            logger.debug(f"文本消息已添加到缓冲器 {session_id}: {text[:50]}...")
-            return True
-    
-    async def _cancel_session_timers(self, session: BufferedSession):
-        """取消会话的所有定时器"""
-        for task_name in ['timer_task', 'delay_task']:
-            task = getattr(session, task_name)
-            if task and not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-                setattr(session, task_name, None)
-    
-    async def _wait_and_start_merge(self, session_id: str):
-        """等待初始延迟后开始合并定时器"""
-        config = features_manager.get_config()
-        await asyncio.sleep(config.message_buffer_initial_delay)
+        # 以下操作中没有await，不需要加锁
+        session = self.buffer_pool.get(session_id)
+        text_bytes = self._text_bytes(segments)
         
-        async with self.lock:
-            session = self.buffer_pool.get(session_id)
-            if session and session.messages:
-                # 取消旧的定时器
-                if session.timer_task and not session.timer_task.done():
-                    session.timer_task.cancel()
-                    try:
-                        await session.timer_task
-                    except asyncio.CancelledError:
-                        pass
-                
-                # 设置合并定时器
-                session.timer_task = asyncio.create_task(
-                    self._wait_and_merge(session_id)
-                )
+        # 追加后超过字节上限时先合并已缓冲的内容
+        if session is not None and session.byte_count + MERGE_SEPARATOR_BYTES + text_bytes > snapshot.message_buffer_max_bytes:
+            logger.info(f"会话 {session_id} 缓冲文本达到 {snapshot.message_buffer_max_bytes} 字节上限，强制合并")
+            self._start_merge(session)
+            session = None
+        
+        # 原实现先等待初始延迟再启动合并定时器，两者之和即为最后一条消息后的等待时间
+        deadline = time.monotonic() + snapshot.message_buffer_initial_delay + snapshot.message_buffer_interval
+        if session is None:
+            session = self.buffer_pool[session_id] = BufferedSession(session_id=session_id, deadline=deadline)
+            self._push_deadline(session)
+        else:
+            session.deadline = deadline
+        
+        # 添加消息
+        if session.messages:
+            session.byte_count += MERGE_SEPARATOR_BYTES
+        session.messages.append(segments)
+        session.byte_count += text_bytes
+        session.original_event = original_event  # 更新事件
+        
+        # 达到组件数量上限或单条消息本身超过字节上限时立即合并
+        if len(session.messages) >= snapshot.message_buffer_max_components:
+            logger.info(f"会话 {session_id} 消息数量达到上限，强制合并")
+            self._start_merge(session)
+        elif session.byte_count >= snapshot.message_buffer_max_bytes:
+            logger.info(f"会话 {session_id} 缓冲文本达到 {snapshot.message_buffer_max_bytes} 字节上限，强制合并")
+            self._start_merge(session)
+        
+        lazy_debug("消息已添加到缓冲器 {}，消息段数量: {}", session_id, len(segments))
+        return True
     
-    async def _wait_and_merge(self, session_id: str):
-        """等待合并间隔后执行合并"""
-        config = features_manager.get_config()
-        await asyncio.sleep(config.message_buffer_interval)
-        await self._merge_session(session_id)
+    def _push_deadline(self, session: BufferedSession):
+        """会话入堆，比当前最早的截止时间更早时唤醒调度任务"""
+        heapq.heappush(self._deadlines, (session.deadline, next(self._seq), session))
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.create_task(self._run_scheduler())
+        elif self._deadlines[0][2] is session:
+            self._wakeup.set()
     
-    async def _force_merge_session(self, session_id: str):
-        """强制合并会话（不等待定时器）"""
-        await self._merge_session(session_id, force=True)
+    async def _run_scheduler(self):
+        """按截止时间依次合并会话"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, _, session = heapq.heappop(self._deadlines)
+                if self.buffer_pool.get(session.session_id) is not session:
+                    # 会话已被强制合并或刷新
+                    continue
+                if session.deadline > now:
+                    # 期间收到了新消息，按推迟后的时间重新入堆
+                    heapq.heappush(self._deadlines, (session.deadline, next(self._seq), session))
+                    continue
+                self._start_merge(session)
+            timeout = self._deadlines[0][0] - now if self._deadlines else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
     
-    async def _merge_session(self, session_id: str, force: bool = False):
-        """合并会话中的消息"""
-        async with self.lock:
-            session = self.buffer_pool.get(session_id)
-            if not session or not session.messages:
-                self.buffer_pool.pop(session_id, None)
-                return
-            
+    def _start_merge(self, session: BufferedSession) -> asyncio.Task:
+        """将会话移出缓冲池并在后台合并，堆中对应条目在出堆时丢弃"""
+        if self.buffer_pool.get(session.session_id) is session:
+            del self.buffer_pool[session.session_id]
+        task = asyncio.create_task(self._merge_session(session))
+        self._merge_tasks.add(task)
+        task.add_done_callback(self._merge_tasks.discard)
+        return task
+    
+    async def _merge_session(self, session: BufferedSession):
+        """合并会话中的消息，同一会话的合并按移出缓冲池的顺序执行"""
+        session_id = session.session_id
+        async with self._merge_locks[hash(session_id) % MERGE_LOCK_SHARDS]:
             try:
-                # 合并文本消息
-                text_parts = []
-                for msg in session.messages:
-                    if msg.text.strip():
-                        text_parts.append(msg.text.strip())
-                
-                if not text_parts:
-                    self.buffer_pool.pop(session_id, None)
+                if not session.messages:
                     return
                 
-                merged_text = "，".join(text_parts)  # 使用中文逗号连接
-                message_count = len(session.messages)
+                # 消息段在缓冲时已整理，这里只拼接一次
+                merged_segments = self.merge_segments(session.messages)
                 
-                logger.info(f"合并会话 {session_id} 的 {message_count} 条文本消息: {merged_text[:100]}...")
+                logger.info(
+                    f"合并会话 {session_id} 的 {len(session.messages)} 条消息（{len(merged_segments)} 个消息段，"
+                    f"{session.byte_count} 字节）"
+                )
                 
                 # 调用回调函数
                 if self.merge_callback:
                     try:
                         if asyncio.iscoroutinefunction(self.merge_callback):
-                            await self.merge_callback(session_id, merged_text, session.original_event)
+                            await self.merge_callback(session_id, merged_segments, session.original_event)
                         else:
-                            self.merge_callback(session_id, merged_text, session.original_event)
+                            self.merge_callback(session_id, merged_segments, session.original_event)
                     except Exception as e:
                         logger.error(f"消息合并回调执行失败: {e}")
                 
             except Exception as e:
                 logger.error(f"合并会话 {session_id} 时出错: {e}")
-            finally:
-                # 清理会话
-                await self._cancel_session_timers(session)
-                self.buffer_pool.pop(session_id, None)
     
     async def flush_session(self, session_id: str):
         """强制刷新指定会话的缓冲区"""
-        await self._force_merge_session(session_id)
+        session = self.buffer_pool.get(session_id)
+        if session:
+            await self._start_merge(session)
     
     async def flush_all(self):
         """强制刷新所有会话的缓冲区"""
-        session_ids = list(self.buffer_pool.keys())
-        for session_id in session_ids:
-            await self._force_merge_session(session_id)
+        tasks = [self._start_merge(session) for session in list(self.buffer_pool.values())]
+        self._deadlines.clear()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
     
     async def get_buffer_stats(self) -> Dict[str, Any]:
         """获取缓冲区统计信息"""
-        async with self.lock:
-            stats = {
-                "total_sessions": len(self.buffer_pool),
-                "sessions": {}
+        now = time.monotonic()
+        stats = {
+            "total_sessions": len(self.buffer_pool),
+            "scheduled_deadlines": len(self._deadlines),
+            "merging": len(self._merge_tasks),
+            "sessions": {}
+        }
+        
+        for session_id, session in self.buffer_pool.items():
+            stats["sessions"][session_id] = {
+                "message_count": len(session.messages),
+                "byte_count": session.byte_count,
+                "created_at": session.created_at,
+                "age": time.time() - session.created_at,
+                "merge_in": max(0.0, session.deadline - now),
             }
-            
-            for session_id, session in self.buffer_pool.items():
-                stats["sessions"][session_id] = {
-                    "message_count": len(session.messages),
-                    "created_at": session.created_at,
-                    "age": time.time() - session.created_at
-                }
-            
-            return stats
+        
+        return stats
     
     async def clear_expired_sessions(self, max_age: float = 300.0):
         """清理过期的会话"""
         current_time = time.time()
-        expired_sessions = []
-        
-        async with self.lock:
-            for session_id, session in self.buffer_pool.items():
-                if current_time - session.created_at > max_age:
-                    expired_sessions.append(session_id)
+        expired_sessions = [
+            session_id for session_id, session in self.buffer_pool.items()
+            if current_time - session.created_at > max_age
+        ]
         
         for session_id in expired_sessions:
             logger.info(f"清理过期会话: {session_id}")
-            await self._force_merge_session(session_id)
+            await self.flush_session(session_id)
     
     async def shutdown(self):
         """关闭消息缓冲器"""
         self._shutdown = True
         logger.info("正在关闭简化消息缓冲器...")
         
-        # 刷新所有缓冲区
-        await self.flush_all()
+        if self._scheduler and not self._scheduler.done():
+            self._scheduler.cancel()
+            try:
+                await self._scheduler
+            except asyncio.CancelledError:
+                pass
+        self._scheduler = None
         
-        # 确保所有任务都被取消
-        async with self.lock:
-            for session in list(self.buffer_pool.values()):
-                await self._cancel_session_timers(session)
-            self.buffer_pool.clear()
+        # 刷新所有缓冲区，并等待已开始的合并完成
+        await self.flush_all()
+        if self._merge_tasks:
+            await asyncio.gather(*self._merge_tasks, return_exceptions=True)
         
         logger.info("简化消息缓冲器已关闭")
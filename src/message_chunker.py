@@ -7,9 +7,11 @@ import json
 import uuid
 import asyncio
 import time
-from typing import List, Dict, Any, Optional, Union
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union
 from .logger import logger
 from .config import global_config
+from .json_codec import json_encoder
 
 
 class MessageChunker:
@@ -18,70 +20,136 @@ class MessageChunker:
     def __init__(self):
         self.max_chunk_size = global_config.slicing.max_frame_size * 1024
 
-    def should_chunk_message(self, message: Union[str, Dict[str, Any]]) -> bool:
-        """判断消息是否需要切片"""
-        try:
-            if isinstance(message, dict):
-                message_str = json.dumps(message, ensure_ascii=False)
+    def serialize(self, message: Union[str, bytes, Dict[str, Any]]) -> bytes:
+        """
+        将消息序列化为UTF-8字节，整个发送流程只序列化这一次
+        Parameters:
+            message: Union[str, bytes, Dict[str, Any]]: 消息
+        Returns:
+            bytes: UTF-8编码的JSON
+        """
+        if isinstance(message, bytes):
+            return message
+        if isinstance(message, dict):
+            return json_encoder.dumps(message)
+        return message.encode('utf-8')
+
+    @staticmethod
+    def max_serialized_size(obj: Any) -> Optional[int]:
+        """
+        不编码而估算对象序列化为UTF-8 JSON后的字节数上界，耗时只与节点数量有关，与字符串长度无关
+        字符串每个字符最多占6字节（控制字符转义为\\uXXXX），其余类型按其最长表示计算
+        Parameters:
+            obj: Any: to_dict 得到的消息
+        Returns:
+            Optional[int]: 字节数上界，包含无法估算的类型时为None
+        """
+        total = 0
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            item_type = type(item)
+            if item_type is str:
+                total += 6 * len(item) + 2
+            elif item_type is dict:
+                total += 2 + 2 * len(item)  # 括号、冒号与逗号
+                for key, value in item.items():
+                    total += 6 * len(key) + 2 if type(key) is str else 32
+                    if type(value) is str:
+                        total += 6 * len(value) + 2
+                    else:
+                        stack.append(value)
+            elif item_type is list or item_type is tuple:
+                total += 2 + len(item)
+                stack.extend(item)
+            elif item is None or item_type is bool:
+                total += 5
+            elif item_type is int:
+                total += item.bit_length() // 3 + 2
+            elif item_type is float:
+                total += 32
             else:
-                message_str = message
-            return len(message_str.encode('utf-8')) > self.max_chunk_size
+                return None
+        return total
+
+    def fits_in_one_frame(self, message: Dict[str, Any]) -> bool:
+        """不编码即可确定消息无需切片时返回True，无法确定时返回False"""
+        size = self.max_serialized_size(message)
+        return size is not None and size <= self.max_chunk_size
+
+    def should_chunk_message(self, message: Union[str, bytes, Dict[str, Any]]) -> bool:
+        """判断消息是否需要切片，传入已序列化的bytes时不会重复编码"""
+        try:
+            return len(self.serialize(message)) > self.max_chunk_size
         except Exception as e:
             logger.error(f"检查消息大小时出错: {e}")
             return False
+
+    def _split_boundaries(self, message_bytes: bytes) -> List[Tuple[int, int]]:
+        """
+        计算切片边界，切点落在UTF-8字符边界上，保证每个切片都能完整解码
+        Parameters:
+            message_bytes: bytes: UTF-8字节
+        Returns:
+            List[Tuple[int, int]]: (起始位置, 结束位置)列表
+        """
+        total_size = len(message_bytes)
+        boundaries = []
+        start_pos = 0
+        while start_pos < total_size:
+            end_pos = min(start_pos + self.max_chunk_size, total_size)
+            # 0b10xxxxxx是多字节字符的后续字节，向前退到字符起始处
+            while end_pos < total_size and end_pos > start_pos and (message_bytes[end_pos] & 0xC0) == 0x80:
+                end_pos -= 1
+            if end_pos == start_pos:
+                end_pos = min(start_pos + self.max_chunk_size, total_size)
+            boundaries.append((start_pos, end_pos))
+            start_pos = end_pos
+        return boundaries
     
-    def chunk_message(self, message: Union[str, Dict[str, Any]], chunk_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    def chunk_message(self, message: Union[str, bytes, Dict[str, Any]], chunk_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         将消息切片
         
         Args:
-            message: 要切片的消息（字符串或字典）
+            message: 要切片的消息（字符串、已序列化的bytes或字典）
             chunk_id: 切片组ID，如果不提供则自动生成
             
         Returns:
             切片后的消息字典列表
         """
         try:
-            # 统一转换为字符串
-            if isinstance(message, dict):
-                message_str = json.dumps(message, ensure_ascii=False)
-            else:
-                message_str = message
+            message_bytes = self.serialize(message)
+            total_size = len(message_bytes)
             
-            if not self.should_chunk_message(message_str):
-                # 不需要切片的情况，如果输入是字典则返回字典，如果是字符串则包装成非切片标记的字典
+            if total_size <= self.max_chunk_size:
+                # 不需要切片的情况，如果输入是字典则返回字典，否则包装成非切片标记的字典
                 if isinstance(message, dict):
                     return [message]
                 else:
-                    return [{"_original_message": message_str}]
+                    return [{"_original_message": message_bytes.decode('utf-8')}]
             
             if chunk_id is None:
                 chunk_id = str(uuid.uuid4())
             
-            message_bytes = message_str.encode('utf-8')
-            total_size = len(message_bytes)
-            
-            # 计算需要多少个切片
-            num_chunks = (total_size + self.max_chunk_size - 1) // self.max_chunk_size
+            boundaries = self._split_boundaries(message_bytes)
+            num_chunks = len(boundaries)
+            # memoryview切片不复制底层数据
+            message_view = memoryview(message_bytes)
             
             chunks = []
-            for i in range(num_chunks):
-                start_pos = i * self.max_chunk_size
-                end_pos = min(start_pos + self.max_chunk_size, total_size)
-                
-                chunk_data = message_bytes[start_pos:end_pos]
-                
+            for i, (start_pos, end_pos) in enumerate(boundaries):
                 # 构建切片消息
                 chunk_message = {
                     "__mmc_chunk_info__": {
                         "chunk_id": chunk_id,
                         "chunk_index": i,
                         "total_chunks": num_chunks,
-                        "chunk_size": len(chunk_data),
+                        "chunk_size": end_pos - start_pos,
                         "total_size": total_size,
                         "timestamp": time.time()
                     },
-                    "__mmc_chunk_data__": chunk_data.decode('utf-8', errors='ignore'),
+                    "__mmc_chunk_data__": str(message_view[start_pos:end_pos], 'utf-8'),
                     "__mmc_is_chunked__": True
                 }
                 
@@ -95,6 +163,8 @@ class MessageChunker:
             # 出错时返回原消息
             if isinstance(message, dict):
                 return [message]
+            elif isinstance(message, bytes):
+                return [{"_original_message": message.decode('utf-8', errors='replace')}]
             else:
                 return [{"_original_message": message}]
     
@@ -121,7 +191,14 @@ class MessageReassembler:
     
     def __init__(self, timeout: int = 30):
         self.timeout = timeout
-        self.chunk_buffers: Dict[str, Dict[str, Any]] = {}
+        self.max_buffered_size = int(global_config.slicing.reassembly_max_mb * 1024 * 1024)
+        self.max_groups = max(1, global_config.slicing.reassembly_max_groups)
+        # 按最近更新时间排序，最久未更新的切片组排在最前面
+        self.chunk_buffers: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.buffered_size = 0
+        self.completed_count = 0
+        self.evicted_count = 0
+        self.expired_count = 0
         self._cleanup_task = None
         
     async def start_cleanup_task(self):
@@ -153,12 +230,33 @@ class MessageReassembler:
                 
                 for chunk_id in expired_chunks:
                     logger.warning(f"清理过期的切片缓冲区: {chunk_id}")
-                    del self.chunk_buffers[chunk_id]
+                    self._drop_buffer(chunk_id)
+                    self.expired_count += 1
                     
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"清理过期切片时出错: {e}")
+
+    def _drop_buffer(self, chunk_id: str) -> None:
+        """移除切片组并扣减占用"""
+        buffer = self.chunk_buffers.pop(chunk_id, None)
+        if buffer is not None:
+            self.buffered_size -= buffer["size"]
+
+    def _evict_if_needed(self, keep_chunk_id: str) -> None:
+        """超出数量或内存上限时，淘汰最久未更新的切片组"""
+        while self.chunk_buffers and (
+            len(self.chunk_buffers) > self.max_groups or self.buffered_size > self.max_buffered_size
+        ):
+            chunk_id = next(iter(self.chunk_buffers))
+            if chunk_id == keep_chunk_id and len(self.chunk_buffers) == 1:
+                # 单个切片组就超过了内存上限，只能丢弃它
+                logger.warning(f"切片组 {chunk_id} 超过重组内存上限，已丢弃")
+            else:
+                logger.warning(f"重组缓冲区已满，淘汰切片组: {chunk_id}")
+            self._drop_buffer(chunk_id)
+            self.evicted_count += 1
     
     async def add_chunk(self, message: Union[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """
@@ -195,43 +293,55 @@ class MessageReassembler:
             chunk_id = chunk_info["chunk_id"]
             chunk_index = chunk_info["chunk_index"]
             total_chunks = chunk_info["total_chunks"]
-            chunk_timestamp = chunk_info.get("timestamp", time.time())
+            
+            if not 0 <= chunk_index < total_chunks:
+                logger.warning(f"切片序号无效: {chunk_id}#{chunk_index} (共{total_chunks}片)")
+                return None
             
             # 初始化缓冲区
-            if chunk_id not in self.chunk_buffers:
-                self.chunk_buffers[chunk_id] = {
+            buffer = self.chunk_buffers.get(chunk_id)
+            if buffer is None:
+                now = time.time()
+                buffer = self.chunk_buffers[chunk_id] = {
                     "chunks": {},
                     "total_chunks": total_chunks,
                     "received_chunks": 0,
-                    "timestamp": chunk_timestamp
+                    "size": 0,
+                    "total_size": chunk_info.get("total_size"),
+                    "out_of_order": 0,
+                    "created_at": now,
+                    "timestamp": now
                 }
-            
-            buffer = self.chunk_buffers[chunk_id]
+            elif buffer["total_chunks"] != total_chunks:
+                logger.warning(f"切片总数不一致: {chunk_id} ({buffer['total_chunks']} != {total_chunks})")
+                return None
             
             # 检查切片是否已经接收过
             if chunk_index in buffer["chunks"]:
                 logger.warning(f"重复接收切片: {chunk_id}#{chunk_index}")
                 return None
             
-            # 添加切片
+            # 添加切片（切片内容基本为ASCII，按字符数估算占用）
+            if chunk_index != buffer["received_chunks"]:
+                buffer["out_of_order"] += 1
             buffer["chunks"][chunk_index] = chunk_content
             buffer["received_chunks"] += 1
+            buffer["size"] += len(chunk_content)
             buffer["timestamp"] = time.time()  # 更新时间戳
+            self.buffered_size += len(chunk_content)
+            self.chunk_buffers.move_to_end(chunk_id)
             
             logger.debug(f"接收切片: {chunk_id}#{chunk_index} ({buffer['received_chunks']}/{total_chunks})")
             
             # 检查是否接收完整
             if buffer["received_chunks"] == total_chunks:
-                # 重组消息
-                reassembled_message = ""
-                for i in range(total_chunks):
-                    if i not in buffer["chunks"]:
-                        logger.error(f"切片 {chunk_id}#{i} 缺失，无法重组")
-                        return None
-                    reassembled_message += buffer["chunks"][i]
+                # 序号已校验且无重复，收齐即表示没有缺失，一次性拼接
+                chunks = buffer["chunks"]
+                reassembled_message = "".join(chunks[i] for i in range(total_chunks))
                 
                 # 清理缓冲区
-                del self.chunk_buffers[chunk_id]
+                self._drop_buffer(chunk_id)
+                self.completed_count += 1
                 
                 logger.debug(f"消息重组完成: {chunk_id} ({len(reassembled_message)} chars)")
                 
@@ -241,7 +351,8 @@ class MessageReassembler:
                 except json.JSONDecodeError:
                     # 如果不能反序列化为JSON，则作为文本消息返回
                     return {"text_message": reassembled_message}
-                
+            
+            self._evict_if_needed(chunk_id)
             return None
             
         except (json.JSONDecodeError, KeyError, TypeError) as e:
@@ -249,17 +360,34 @@ class MessageReassembler:
             return None
     
     def get_pending_chunks_info(self) -> Dict[str, Any]:
-        """获取待处理切片信息"""
+        """获取待处理切片信息及重组缓冲区统计"""
+        current_time = time.time()
         info = {}
         for chunk_id, buffer in self.chunk_buffers.items():
             info[chunk_id] = {
                 "received": buffer["received_chunks"],
                 "total": buffer["total_chunks"],
                 "progress": f"{buffer['received_chunks']}/{buffer['total_chunks']}",
-                "age_seconds": time.time() - buffer["timestamp"]
+                "buffered_size": buffer["size"],
+                "total_size": buffer["total_size"],
+                "out_of_order": buffer["out_of_order"],
+                "age_seconds": current_time - buffer["timestamp"],
+                "elapsed_seconds": current_time - buffer["created_at"]
             }
         return info
 
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重组器整体统计"""
+        return {
+            "pending_groups": len(self.chunk_buffers),
+            "buffered_size": self.buffered_size,
+            "max_buffered_size": self.max_buffered_size,
+            "max_groups": self.max_groups,
+            "completed": self.completed_count,
+            "evicted": self.evicted_count,
+            "expired": self.expired_count,
+        }
+
 
 # 全局实例
 chunker = MessageChunker()
@@ -0,0 +1,132 @@
+"""
+事件分发模块
+同一群聊/私聊的事件按到达顺序串行处理，不同会话之间并发处理
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from .logger import logger
+from .config import global_config
+
+
+class MessageDispatcher:
+    """按会话保序、跨会话并发的事件分发器"""
+
+    def __init__(self):
+        self.handler: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        self.max_concurrency: int = 1
+        self._sessions: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._ready: asyncio.Queue[str] = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._started_at: float = 0.0
+        self.pending_count: int = 0
+        self.processed_count: int = 0
+        self.worker_busy_time: List[float] = []
+        self.worker_processed: List[int] = []
+
+    @staticmethod
+    def get_session_key(event: Dict[str, Any]) -> str:
+        """根据事件计算会话键，相同会话的事件保证顺序"""
+        post_type = event.get("post_type")
+        if post_type == "meta_event":
+            return "meta_event"
+        group_id = event.get("group_id")
+        if post_type == "message" and event.get("message_type") == "private":
+            return f"private_{event.get('user_id')}"
+        if group_id:
+            return f"group_{group_id}"
+        return f"private_{event.get('user_id')}"
+
+    async def start(self, handler: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """启动工作协程"""
+        if self._workers:
+            logger.warning("事件分发器已在运行")
+            return
+        self.handler = handler
+        self.max_concurrency = max(1, global_config.processing.max_concurrency)
+        self.worker_busy_time = [0.0] * self.max_concurrency
+        self.worker_processed = [0] * self.max_concurrency
+        self._started_at = time.monotonic()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_concurrency)]
+        logger.info(f"事件分发器已启动，并发数: {self.max_concurrency}")
+
+    async def wait_closed(self) -> None:
+        """等待所有工作协程结束"""
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def stop(self) -> None:
+        """停止工作协程并丢弃未处理的事件"""
+        for worker in self._workers:
+            worker.cancel()
+        await self.wait_closed()
+        self._workers = []
+        if self.pending_count:
+            logger.info(f"丢弃 {self.pending_count} 条未处理的事件")
+        self._sessions.clear()
+        self._ready = asyncio.Queue()
+        self.pending_count = 0
+
+    def put(self, event: Dict[str, Any]) -> None:
+        """放入一个事件，同一会话正在处理时排在其后"""
+        key = self.get_session_key(event)
+        session_queue = self._sessions.get(key)
+        if session_queue is None:
+            self._sessions[key] = deque([event])
+            self._ready.put_nowait(key)
+        else:
+            session_queue.append(event)
+        self.pending_count += 1
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            key = await self._ready.get()
+            session_queue = self._sessions[key]
+            event = session_queue.popleft()
+            start_time = time.monotonic()
+            try:
+                await self.handler(event)
+            except asyncio.CancelledError:
+                # 只有工作协程本身被取消时才退出；处理函数内部泄漏的CancelledError不应让工作协程永久退出
+                if self._is_cancelling():
+                    raise
+                logger.error("处理事件时出现未预期的CancelledError，已跳过该事件")
+            except Exception as e:
+                logger.error(f"处理事件时出错: {e}")
+            finally:
+                self.worker_busy_time[index] += time.monotonic() - start_time
+                self.worker_processed[index] += 1
+                self.processed_count += 1
+                self.pending_count -= 1
+                # 每次只处理一个事件后重新排队，避免单个繁忙会话占满工作协程
+                if session_queue:
+                    self._ready.put_nowait(key)
+                else:
+                    self._sessions.pop(key, None)
+
+    @staticmethod
+    def _is_cancelling() -> bool:
+        """当前工作协程是否正在被取消（Python 3.11以下无法区分，按被取消处理）"""
+        cancelling = getattr(asyncio.current_task(), "cancelling", None)
+        return cancelling is None or cancelling() > 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列深度与各工作协程的繁忙时间"""
+        uptime = max(time.monotonic() - self._started_at, 1e-9) if self._started_at else 0.0
+        return {
+            "queue_depth": self.pending_count,
+            "active_sessions": len(self._sessions),
+            "ready_sessions": self._ready.qsize(),
+            "processed": self.processed_count,
+            "workers": [
+                {
+                    "busy_seconds": busy,
+                    "busy_ratio": busy / uptime if uptime else 0.0,
+                    "processed": processed,
+                }
+                for busy, processed in zip(self.worker_busy_time, self.worker_processed, strict=True)
+            ],
+        }
+
+
+message_dispatcher = MessageDispatcher()
@@ -0,0 +1,261 @@
+"""
+通知投递模块
+按优先级向MaiBot投递通知（消息回送、戳一戳、禁言等），失败后按指数退避加随机抖动重试，
+多次失败或关闭时仍未送达的通知写入磁盘死信文件
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from maim_message import MessageBase
+from .logger import logger
+from .recv_handler.message_sending import message_send_instance
+
+DEAD_LETTER_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "notice_dead_letter.jsonl")
+
+MAX_QUEUE_SIZE = 1000  # 待投递通知上限，超出后新通知直接写入死信（消息ID回送除外）
+BATCH_SIZE = 8  # 每批并发发送的通知数量
+MAX_ATTEMPTS = 8  # 单条通知最多尝试次数
+BACKOFF_BASE = 1.0  # 首次重试等待时间（秒）
+BACKOFF_MAX = 60.0  # 重试等待时间上限（秒）
+
+
+class NoticePriority:
+    """通知优先级，数值越小越先投递"""
+
+    ECHO = 0  # 消息ID回送，MaiBot依赖它关联已发送的消息
+    POKE = 1  # 戳一戳，时效性强
+    BAN = 2  # 禁言/解除禁言
+    DEFAULT = 3
+
+
+PRIORITY_NAMES = {
+    NoticePriority.ECHO: "echo",
+    NoticePriority.POKE: "poke",
+    NoticePriority.BAN: "ban",
+    NoticePriority.DEFAULT: "default",
+}
+
+
+@dataclass
+class PendingNotice:
+    message_base: MessageBase
+    priority: int
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+
+
+def _target_key(message_base: MessageBase) -> Tuple[Any, Any]:
+    """通知针对的(群号, 用户ID)，禁言类通知取被禁言/被解除禁言的用户"""
+    info = message_base.message_info
+    group_id = info.group_info.group_id if info.group_info else None
+    user_id = info.user_info.user_id if info.user_info else None
+    seg = message_base.message_segment
+    if seg is not None and isinstance(seg.data, dict):
+        target_user = seg.data.get("banned_user_info") or seg.data.get("lifted_user_info")
+        if isinstance(target_user, dict):
+            user_id = target_user.get("user_id")
+    return group_id, user_id
+
+
+class NoticeDeliveryEngine:
+    """按优先级批量投递通知，失败的通知在重试堆中等待退避时间"""
+
+    def __init__(self, dead_letter_file: str = DEAD_LETTER_FILE):
+        self.dead_letter_file = dead_letter_file
+        self._ready: List[Tuple[int, int, PendingNotice]] = []  # (priority, seq, notice)
+        self._retrying: List[Tuple[float, int, PendingNotice]] = []  # (next_attempt_at, seq, notice)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._sending: List[PendingNotice] = []  # 正在发送的批次
+        self._paused_until = 0.0  # 整批发送失败时认为MaiBot不可达，暂停到最早的重试时间
+        self.sent_count = 0
+        self.failed_attempts = 0
+        self.retry_count = 0
+        self.dead_letter_count = 0
+
+    def __len__(self) -> int:
+        return len(self._ready) + len(self._retrying) + len(self._sending)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def put(self, message_base: MessageBase, priority: int = NoticePriority.DEFAULT) -> None:
+        """
+        放入一条待投递的通知
+        Parameters:
+            message_base: MessageBase: 通知消息
+            priority: int: 优先级，见NoticePriority
+        """
+        notice = PendingNotice(message_base=message_base, priority=priority)
+        # 消息ID回送不受队列上限限制，写入死信后MaiBot将永远无法关联已发送的消息
+        if len(self) >= MAX_QUEUE_SIZE and priority != NoticePriority.ECHO:
+            logger.warning("通知队列已满，通知写入死信文件")
+            await self._dead_letter([notice], "queue_full")
+            return
+        heapq.heappush(self._ready, (priority, next(self._seq), notice))
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def _promote_due_retries(self, now: float) -> None:
+        """把退避时间已到的通知移回就绪堆"""
+        while self._retrying and self._retrying[0][0] <= now:
+            _, seq, notice = heapq.heappop(self._retrying)
+            heapq.heappush(self._ready, (notice.priority, seq, notice))
+
+    def _next_wakeup_delay(self, now: float) -> Optional[float]:
+        if self._ready:
+            return max(0.0, self._paused_until - now)
+        if self._retrying:
+            return max(0.0, self._retrying[0][0] - now)
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._promote_due_retries(now)
+            if not self._ready or now < self._paused_until:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_wakeup_delay(now))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._sending = [heapq.heappop(self._ready)[2] for _ in range(min(BATCH_SIZE, len(self._ready)))]
+            try:
+                await self._send_batch(self._sending)
+            finally:
+                self._sending = []
+
+    async def _send_batch(self, batch: List[PendingNotice]) -> None:
+        # 同一目标的通知按出队顺序逐条发送，避免禁言与解除禁言乱序到达，不同目标之间并发发送
+        by_target: Dict[Tuple[Any, Any], List[PendingNotice]] = {}
+        for notice in batch:
+            by_target.setdefault(_target_key(notice.message_base), []).append(notice)
+        groups = list(by_target.values())
+        group_results = await asyncio.gather(*(self._send_in_order(notices) for notices in groups))
+        now = time.monotonic()
+        failed: List[PendingNotice] = []
+        for notices, results in zip(groups, group_results, strict=True):
+            for notice, result in zip(notices, results, strict=True):
+                notice.attempts += 1
+                if result and not isinstance(result, BaseException):
+                    self.sent_count += 1
+                else:
+                    self.failed_attempts += 1
+                    failed.append(notice)
+        if not failed:
+            self._paused_until = 0.0
+            return
+
+        exhausted: List[PendingNotice] = []
+        for notice in failed:
+            if notice.attempts >= MAX_ATTEMPTS:
+                exhausted.append(notice)
+                continue
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (notice.attempts - 1))
+            notice.next_attempt_at = now + delay * random.uniform(0.5, 1.5)
+            heapq.heappush(self._retrying, (notice.next_attempt_at, next(self._seq), notice))
+            self.retry_count += 1
+        if len(failed) == len(batch) and self._retrying:
+            # 整批失败，大概率是与MaiBot的连接断开，等到最早的重试时间再发送其他通知
+            self._paused_until = self._retrying[0][0]
+            logger.warning(f"通知发送全部失败，{self._paused_until - now:.1f}秒后重试")
+        if exhausted:
+            logger.error(f"{len(exhausted)} 条通知重试 {MAX_ATTEMPTS} 次后仍发送失败，已写入死信文件")
+            await self._dead_letter(exhausted, "max_attempts")
+
+    async def _send_in_order(self, notices: List[PendingNotice]) -> List[Any]:
+        """逐条发送同一目标的通知，返回每条的发送结果或异常"""
+        results: List[Any] = []
+        for notice in notices:
+            try:
+                results.append(await message_send_instance.message_send(notice.message_base))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _dead_letter(self, notices: List[PendingNotice], reason: str) -> None:
+        """将无法投递的通知追加到死信文件"""
+        self.dead_letter_count += len(notices)
+        lines = []
+        for notice in notices:
+            try:
+                message = notice.message_base.to_dict()
+            except Exception as e:
+                message = {"error": f"无法序列化通知: {e}"}
+            lines.append(
+                json.dumps(
+                    {
+                        "time": time.time(),
+                        "reason": reason,
+                        "priority": PRIORITY_NAMES.get(notice.priority, notice.priority),
+                        "attempts": notice.attempts,
+                        "message": message,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        try:
+            await asyncio.to_thread(self._append_lines, lines)
+        except OSError as e:
+            logger.error(f"写入通知死信文件失败: {e}")
+
+    def _append_lines(self, lines: List[str]) -> None:
+        os.makedirs(os.path.dirname(self.dead_letter_file), exist_ok=True)
+        with open(self.dead_letter_file, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def stop(self) -> None:
+        """停止投递，剩余通知写入死信文件"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        remaining = (
+            self._sending + [item[2] for item in self._ready] + [item[2] for item in self._retrying]
+        )
+        self._sending = []
+        self._ready.clear()
+        self._retrying.clear()
+        if remaining:
+            logger.info(f"{len(remaining)} 条通知未能发送，已写入死信文件")
+            await self._dead_letter(remaining, "shutdown")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列深度、重试次数与最久通知的等待时间"""
+        now = time.monotonic()
+        depth_by_priority: Dict[str, int] = {}
+        oldest_enqueued_at: Optional[float] = None
+        for notice in itertools.chain(self._sending, (item[2] for item in self._ready), (item[2] for item in self._retrying)):
+            name = PRIORITY_NAMES.get(notice.priority, str(notice.priority))
+            depth_by_priority[name] = depth_by_priority.get(name, 0) + 1
+            if oldest_enqueued_at is None or notice.enqueued_at < oldest_enqueued_at:
+                oldest_enqueued_at = notice.enqueued_at
+        return {
+            "queue_depth": len(self),
+            "ready": len(self._ready),
+            "sending": len(self._sending),
+            "retrying": len(self._retrying),
+            "depth_by_priority": depth_by_priority,
+            "oldest_age_seconds": now - oldest_enqueued_at if oldest_enqueued_at is not None else 0.0,
+            "sent": self.sent_count,
+            "failed_attempts": self.failed_attempts,
+            "retries": self.retry_count,
+            "dead_lettered": self.dead_letter_count,
+            "paused_seconds": max(0.0, self._paused_until - now),
+        }
+
+
+notice_delivery = NoticeDeliveryEngine()
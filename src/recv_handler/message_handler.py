@@ -1,4 +1,4 @@
-from src.logger import logger
+from src.logger import logger, lazy_debug, debug_enabled
 from src.config import global_config
 from src.config.features_config import features_manager
 from src.message_buffer import SimpleMessageBuffer
@@ -13,13 +13,14 @@ from src.utils import (
 from .qq_emoji_list import qq_face
 from .message_sending import message_send_instance
 from . import RealMessageType, MessageType, ACCEPT_FORMAT
-from src.video_handler import get_video_downloader
+from src.video_handler import get_video_downloader, encode_file_base64_async, remove_spool_file
+from src.media_cache import make_media_key
 from src.websocket_manager import websocket_manager
 
 import time
 import json
+import asyncio
 import websockets as Server
-import base64
 from pathlib import Path
 from typing import List, Tuple, Optional, Dict, Any
 import uuid
@@ -35,7 +36,10 @@ from maim_message import (
 )
 
 
-from src.response_pool import get_response
+from src.response_pool import get_response, register_request
+
+# 转发消息内容获取失败时的标记，此时整条消息作废
+FORWARD_UNAVAILABLE = object()
 
 
 class MessageHandler:
@@ -79,26 +83,24 @@ class MessageHandler:
         Returns:
             bool: 是否允许聊天
         """
-        logger.debug(f"群聊id: {group_id}, 用户id: {user_id}")
-        logger.debug("开始检查聊天白名单/黑名单")
+        lazy_debug("群聊id: {}, 用户id: {}，开始检查聊天白名单/黑名单", group_id, user_id)
         
-        # 使用新的权限管理器检查权限
-        if group_id:
-            if not features_manager.is_group_allowed(group_id):
+        # 同一次检查只读取一次快照，配置重载不会影响检查中途的判断
+        snapshot = features_manager.snapshot
+        # 使用权限索引检查群聊/私聊名单与全局禁止名单
+        match snapshot.permissions.check(user_id, group_id, bool(ignore_global_list)):
+            case "group":
                 logger.warning("群聊不在聊天权限范围内，消息被丢弃")
                 return False
-        else:
-            if not features_manager.is_private_allowed(user_id):
+            case "private":
                 logger.warning("私聊不在聊天权限范围内，消息被丢弃")
                 return False
-        
-        # 检查全局禁止名单
-        if not ignore_global_list and features_manager.is_user_banned(user_id):
-            logger.warning("用户在全局黑名单中，消息被丢弃")
-            return False
+            case "banned":
+                logger.warning("用户在全局黑名单中，消息被丢弃")
+                return False
 
         # 检查QQ官方机器人
-        if features_manager.is_qq_bot_banned() and group_id and not ignore_bot:
+        if snapshot.ban_qq_bot and group_id and not ignore_bot:
             logger.debug("开始判断是否为机器人")
             member_info = await get_member_info(self.get_server_connection(), group_id, user_id)
             if member_info:
@@ -245,51 +247,42 @@ class MessageHandler:
             logger.warning("原始消息内容为空")
             return None
 
+        # 先尝试缓冲：消息段保持原样进入缓冲区，图片等媒体在合并时才下载解析
+        message_type = raw_message.get("message_type")
+        if features_manager.snapshot.is_message_buffer_enabled_for(message_type):
+            lazy_debug("尝试缓冲消息，消息类型: {}, 用户: {}", message_type, user_info.user_id)
+            
+            buffered = await self.message_buffer.add_message(
+                event_data={
+                    "message_type": message_type,
+                    "user_id": user_info.user_id,
+                    "group_id": group_info.group_id if group_info else None,
+                },
+                message=raw_message.get("message", []),
+                original_event={
+                    "message_info": message_info,
+                    "raw_message": raw_message
+                }
+            )
+            
+            if buffered:
+                logger.info(f"✅ 消息已成功缓冲: {user_info.user_id}")
+                return None  # 缓冲成功，不立即发送
+            # 如果缓冲失败（消息包含不可缓冲的消息段），走正常处理流程
+            logger.info(f"❌ 消息未缓冲，包含不可缓冲的消息段，走正常处理流程: {user_info.user_id}")
+
         # 获取Seg列表
         seg_message: List[Seg] = await self.handle_real_message(raw_message)
         if not seg_message:
             logger.warning("处理后消息内容为空")
             return None
 
-        # 检查是否需要使用消息缓冲
-        if features_manager.is_message_buffer_enabled():
-            # 检查消息类型是否启用缓冲
-            message_type = raw_message.get("message_type")
-            should_use_buffer = False
-            
-            if message_type == "group" and features_manager.is_message_buffer_group_enabled():
-                should_use_buffer = True
-            elif message_type == "private" and features_manager.is_message_buffer_private_enabled():
-                should_use_buffer = True
-            
-            if should_use_buffer:
-                logger.debug(f"尝试缓冲消息，消息类型: {message_type}, 用户: {user_info.user_id}")
-                logger.debug(f"原始消息段: {raw_message.get('message', [])}")
-                
-                # 尝试添加到缓冲器
-                buffered = await self.message_buffer.add_text_message(
-                    event_data={
-                        "message_type": message_type,
-                        "user_id": user_info.user_id,
-                        "group_id": group_info.group_id if group_info else None,
-                    },
-                    message=raw_message.get("message", []),
-                    original_event={
-                        "message_info": message_info,
-                        "raw_message": raw_message
-                    }
-                )
-                
-                if buffered:
-                    logger.info(f"✅ 文本消息已成功缓冲: {user_info.user_id}")
-                    return None  # 缓冲成功，不立即发送
-                # 如果缓冲失败（消息包含非文本元素），走正常处理流程
-                logger.info(f"❌ 消息缓冲失败，包含非文本元素，走正常处理流程: {user_info.user_id}")
-                # 缓冲失败时继续执行后面的正常处理流程，不要直接返回
-
-        logger.debug(f"准备发送消息到MaiBot，消息段数量: {len(seg_message)}")
-        for i, seg in enumerate(seg_message):
-            logger.debug(f"消息段 {i}: type={seg.type}, data={str(seg.data)[:100]}...")
+        if debug_enabled():
+            logger.debug(f"准备发送消息到MaiBot，消息段数量: {len(seg_message)}")
+            for i, seg in enumerate(seg_message):
+                # 只截取字符串开头，避免把整段Base64或嵌套的转发消息转为字符串
+                preview = seg.data[:100] if isinstance(seg.data, str) else f"<{type(seg.data).__name__}>"
+                logger.debug(f"消息段 {i}: type={seg.type}, data={preview}...")
 
         submit_seg: Seg = Seg(
             type="seglist",
@@ -306,9 +299,9 @@ class MessageHandler:
         await message_send_instance.message_send(message_base)
 
     async def handle_real_message(self, raw_message: dict, in_reply: bool = False) -> List[Seg] | None:
-        # sourcery skip: low-code-quality
         """
         处理实际消息
+        各消息段并发解析，结果按原顺序拼接；包含语音段时先解析语音，成功则只返回语音
         Parameters:
             real_message: dict: 实际消息
         Returns:
@@ -317,96 +310,142 @@ class MessageHandler:
         real_message: list = raw_message.get("message")
         if not real_message:
             return None
+        start_time = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(1, global_config.processing.segment_concurrency))
+
+        async def resolve(sub_message: dict) -> List[Seg] | object | None:
+            async with semaphore:
+                return await self._handle_segment(sub_message, raw_message, in_reply)
+
+        # 同一条（或缓冲合并后的）消息中重复的图片/表情包只解析一次
+        image_tasks: Dict[str, asyncio.Future] = {}
+
+        def schedule(sub_message: dict) -> asyncio.Future:
+            if sub_message.get("type") != RealMessageType.image:
+                return asyncio.ensure_future(resolve(sub_message))
+            message_data: dict = sub_message.get("data") or {}
+            key = make_media_key(message_data.get("url"), message_data.get("file"))
+            if key not in image_tasks:
+                image_tasks[key] = asyncio.ensure_future(resolve(sub_message))
+            return image_tasks[key]
+
+        # 语音解析成功时消息只保留语音段，因此先单独解析语音段，避免启动随后会被丢弃的图片、转发等下载
+        record_messages = [sub_message for sub_message in real_message if sub_message.get("type") == RealMessageType.record]
         seg_message: List[Seg] = []
-        for sub_message in real_message:
-            sub_message: dict
-            sub_message_type = sub_message.get("type")
-            match sub_message_type:
-                case RealMessageType.text:
-                    ret_seg = await self.handle_text_message(sub_message)
-                    if ret_seg:
-                        seg_message.append(ret_seg)
-                    else:
-                        logger.warning("text处理失败")
-                case RealMessageType.face:
-                    ret_seg = await self.handle_face_message(sub_message)
-                    if ret_seg:
-                        seg_message.append(ret_seg)
-                    else:
-                        logger.warning("face处理失败或不支持")
-                case RealMessageType.reply:
-                    if not in_reply:
-                        ret_seg = await self.handle_reply_message(sub_message)
-                        if ret_seg:
-                            seg_message += ret_seg
-                        else:
-                            logger.warning("reply处理失败")
-                case RealMessageType.image:
-                    logger.debug("开始处理图片消息段")
-                    ret_seg = await self.handle_image_message(sub_message)
-                    if ret_seg:
-                        seg_message.append(ret_seg)
-                        logger.debug("图片处理成功，添加到消息段")
-                    else:
-                        logger.warning("image处理失败")
-                    logger.debug("图片消息段处理完成")
-                case RealMessageType.record:
-                    ret_seg = await self.handle_record_message(sub_message)
-                    if ret_seg:
-                        seg_message.clear()
-                        seg_message.append(ret_seg)
-                        break  # 使得消息只有record消息
-                    else:
-                        logger.warning("record处理失败或不支持")
-                case RealMessageType.video:
-                    ret_seg = await self.handle_video_message(sub_message)
-                    if ret_seg:
-                        seg_message.append(ret_seg)
-                    else:
-                        logger.warning("video处理失败")
-                case RealMessageType.at:
-                    ret_seg = await self.handle_at_message(
-                        sub_message,
-                        raw_message.get("self_id"),
-                        raw_message.get("group_id"),
-                    )
-                    if ret_seg:
-                        seg_message.append(ret_seg)
-                    else:
-                        logger.warning("at处理失败")
-                case RealMessageType.rps:
-                    logger.warning("暂时不支持猜拳魔法表情解析")
-                case RealMessageType.dice:
-                    logger.warning("暂时不支持骰子表情解析")
-                case RealMessageType.shake:
-                    # 预计等价于戳一戳
-                    logger.warning("暂时不支持窗口抖动解析")
-                case RealMessageType.share:
-                    logger.warning("暂时不支持链接解析")
-                case RealMessageType.forward:
-                    messages = await self._get_forward_message(sub_message)
-                    if not messages:
-                        logger.warning("转发消息内容为空或获取失败")
-                        return None
-                    ret_seg = await self.handle_forward_message(messages)
-                    if ret_seg:
-                        seg_message.append(ret_seg)
-                    else:
-                        logger.warning("转发消息处理失败")
-                case RealMessageType.node:
-                    logger.warning("不支持转发消息节点解析")
-                case RealMessageType.json:
-                    added_seg = await self.handle_json_message(sub_message)
-                    if added_seg:
-                        seg_message.append(added_seg)
-                    else:
-                        logger.warning("json处理失败")
-                case _:
-                    logger.warning(f"未知消息类型: {sub_message_type}")
-        
-        logger.debug(f"handle_real_message完成，处理了{len(real_message)}个消息段，生成了{len(seg_message)}个seg")
+        for sub_message in record_messages:
+            ret_segs = await resolve(sub_message)
+            if ret_segs:
+                seg_message = ret_segs  # 使得消息只有record消息
+                break
+        else:
+            other_messages = (
+                [sub_message for sub_message in real_message if sub_message.get("type") != RealMessageType.record]
+                if record_messages
+                else real_message
+            )
+            tasks = [schedule(sub_message) for sub_message in other_messages]
+            try:
+                results = await asyncio.gather(*tasks)
+            except BaseException:
+                # 某个消息段解析出错时取消并等待其余消息段，避免它们在无人等待的情况下继续下载
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            for ret_segs in results:
+                if ret_segs is FORWARD_UNAVAILABLE:
+                    return None
+                if ret_segs:
+                    seg_message += ret_segs
+
+        lazy_debug(
+            "handle_real_message完成，处理了{}个消息段，生成了{}个seg，并发解析耗时 {:.1f}ms",
+            len(real_message),
+            len(seg_message),
+            lambda: (time.perf_counter() - start_time) * 1000,
+        )
         return seg_message
 
+    async def _handle_segment(self, sub_message: dict, raw_message: dict, in_reply: bool) -> List[Seg] | object | None:
+        # sourcery skip: low-code-quality
+        """
+        解析单个消息段
+        Returns:
+            list[Seg]: 解析结果
+            None: 解析失败或不支持
+            FORWARD_UNAVAILABLE: 转发消息获取失败，整条消息作废
+        """
+        sub_message_type = sub_message.get("type")
+        match sub_message_type:
+            case RealMessageType.text:
+                ret_seg = await self.handle_text_message(sub_message)
+                if ret_seg:
+                    return [ret_seg]
+                logger.warning("text处理失败")
+            case RealMessageType.face:
+                ret_seg = await self.handle_face_message(sub_message)
+                if ret_seg:
+                    return [ret_seg]
+                logger.warning("face处理失败或不支持")
+            case RealMessageType.reply:
+                if not in_reply:
+                    ret_seg = await self.handle_reply_message(sub_message)
+                    if ret_seg:
+                        return ret_seg
+                    logger.warning("reply处理失败")
+            case RealMessageType.image:
+                ret_seg = await self.handle_image_message(sub_message)
+                if ret_seg:
+                    return [ret_seg]
+                logger.warning("image处理失败")
+            case RealMessageType.record:
+                ret_seg = await self.handle_record_message(sub_message)
+                if ret_seg:
+                    return [ret_seg]
+                logger.warning("record处理失败或不支持")
+            case RealMessageType.video:
+                ret_seg = await self.handle_video_message(sub_message)
+                if ret_seg:
+                    return [ret_seg]
+                logger.warning("video处理失败")
+            case RealMessageType.at:
+                ret_seg = await self.handle_at_message(
+                    sub_message,
+                    raw_message.get("self_id"),
+                    raw_message.get("group_id"),
+                )
+                if ret_seg:
+                    return [ret_seg]
+                logger.warning("at处理失败")
+            case RealMessageType.rps:
+                logger.warning("暂时不支持猜拳魔法表情解析")
+            case RealMessageType.dice:
+                logger.warning("暂时不支持骰子表情解析")
+            case RealMessageType.shake:
+                # 预计等价于戳一戳
+                logger.warning("暂时不支持窗口抖动解析")
+            case RealMessageType.share:
+                logger.warning("暂时不支持链接解析")
+            case RealMessageType.forward:
+                messages = await self._get_forward_message(sub_message)
+                if not messages:
+                    logger.warning("转发消息内容为空或获取失败")
+                    return FORWARD_UNAVAILABLE
+                ret_seg = await self.handle_forward_message(messages)
+                if ret_seg:
+                    return [ret_seg]
+                logger.warning("转发消息处理失败")
+            case RealMessageType.node:
+                logger.warning("不支持转发消息节点解析")
+            case RealMessageType.json:
+                added_seg = await self.handle_json_message(sub_message)
+                if added_seg:
+                    return [added_seg]
+                logger.warning("json处理失败")
+            case _:
+                logger.warning(f"未知消息类型: {sub_message_type}")
+        return None
+
     async def handle_text_message(self, raw_message: dict) -> Seg:
         """
         处理纯文本信息
@@ -528,9 +567,11 @@ class MessageHandler:
         message_data: dict = raw_message.get("data")
         image_sub_type = message_data.get("sub_type")
         try:
-            logger.debug(f"开始下载图片: {message_data.get('url')}")
-            image_base64 = await get_image_base64(message_data.get("url"))
-            logger.debug(f"图片下载成功，大小: {len(image_base64)} 字符")
+            lazy_debug("开始下载图片: {}", lambda: message_data.get("url"))
+            image_base64 = await get_image_base64(
+                message_data.get("url"), make_media_key(message_data.get("url"), message_data.get("file"))
+            )
+            lazy_debug("图片下载成功，大小: {} 字符", lambda: len(image_base64))
         except Exception as e:
             logger.error(f"图片消息处理失败: {str(e)}")
             return None
@@ -610,8 +651,7 @@ class MessageHandler:
         message_data: dict = raw_message.get("data")
         
         # 添加详细的调试信息
-        logger.debug(f"视频消息原始数据: {raw_message}")
-        logger.debug(f"视频消息数据: {message_data}")
+        lazy_debug("视频消息原始数据: {}", lambda: raw_message)
         
         # QQ视频消息可能包含url或filePath字段
         video_url = message_data.get("url")
@@ -628,29 +668,45 @@ class MessageHandler:
             logger.warning(f"完整消息数据: {message_data}")
             return None
         
+        features_config = features_manager.snapshot
+        video_downloader = get_video_downloader()
+        video_downloader.max_size_mb = features_config.max_video_size_mb
+        video_downloader.download_timeout = features_config.download_timeout
+        max_bytes = features_config.max_video_size_mb * 1024 * 1024
+        
         try:
             # 检查是否为本地文件路径
             if file_path and Path(file_path).exists():
                 logger.info(f"使用本地视频文件: {file_path}")
-                # 直接读取本地文件
-                with open(file_path, "rb") as f:
-                    video_data = f.read()
+                file_size = Path(file_path).stat().st_size
+                size_mb = file_size / (1024 * 1024)
+                if file_size > max_bytes:
+                    logger.warning(f"视频文件过大: {size_mb:.2f}MB，超过{features_config.max_video_size_mb}MB限制")
+                    return None
+                
+                # 共享文件系统时直接传递路径
+                if features_config.video_share_file_path:
+                    logger.info(f"视频文件大小: {size_mb:.2f} MB，按路径传递")
+                    return Seg(type="video", data={
+                        "path": str(Path(file_path).resolve()),
+                        "filename": Path(file_path).name,
+                        "size_mb": size_mb
+                    })
                 
-                # 将视频数据编码为base64用于传输
-                video_base64 = base64.b64encode(video_data).decode('utf-8')
-                logger.info(f"视频文件大小: {len(video_data) / (1024 * 1024):.2f} MB")
+                # 分块编码为base64用于传输
+                video_base64 = await encode_file_base64_async(file_path)
+                logger.info(f"视频文件大小: {size_mb:.2f} MB")
                 
                 # 返回包含详细信息的字典格式
                 return Seg(type="video", data={
                     "base64": video_base64,
                     "filename": Path(file_path).name,
-                    "size_mb": len(video_data) / (1024 * 1024)
+                    "size_mb": size_mb
                 })
             
             elif video_url:
                 logger.info(f"使用视频URL下载: {video_url}")
                 # 使用video_handler下载视频
-                video_downloader = get_video_downloader()
                 download_result = await video_downloader.download_video(video_url)
                 
                 if not download_result["success"]:
@@ -658,15 +714,18 @@ class MessageHandler:
                     logger.warning(f"失败的URL: {video_url}")
                     return None
                 
-                # 将视频数据编码为base64用于传输
-                video_base64 = base64.b64encode(download_result["data"]).decode('utf-8')
-                logger.info(f"视频下载成功，大小: {len(download_result['data']) / (1024 * 1024):.2f} MB")
+                # 下载结果保存在临时文件中，分块编码后删除
+                try:
+                    video_base64 = await encode_file_base64_async(download_result["path"])
+                finally:
+                    remove_spool_file(download_result["path"])
+                logger.info(f"视频下载成功，大小: {download_result['size_mb']:.2f} MB")
                 
                 # 返回包含详细信息的字典格式
                 return Seg(type="video", data={
                     "base64": video_base64,
                     "filename": download_result.get("filename", "video.mp4"),
-                    "size_mb": len(download_result["data"]) / (1024 * 1024),
+                    "size_mb": download_result["size_mb"],
                     "url": video_url
                 })
             
@@ -713,7 +772,7 @@ class MessageHandler:
 
     async def handle_forward_message(self, message_list: list) -> Seg | None:
         """
-        递归处理转发消息，并按照动态方式确定图片处理方式
+        递归处理转发消息，并按下载开销（字节/时间预算）确定图片处理方式
         Parameters:
             message_list: list: 转发消息列表
         """
@@ -726,18 +785,11 @@ class MessageHandler:
             return None
 
         processed_message: Seg
-        if image_count < 5 and image_count > 0:
-            # 处理图片数量小于5的情况，此时解析图片为base64
-            logger.trace("图片数量小于5，开始解析图片为base64")
-            processed_message = await self._recursive_parse_image_seg(
-                handled_message, True
-            )
-        elif image_count > 0:
-            logger.trace("图片数量大于等于5，开始解析图片为占位符")
-            # 处理图片数量大于等于5的情况，此时解析图片为占位符
-            processed_message = await self._recursive_parse_image_seg(
-                handled_message, False
-            )
+        if image_count > 0:
+            # 并发下载所有图片，超出预算的图片解析为占位符
+            logger.trace(f"转发消息包含 {image_count} 张图片，开始并发下载")
+            encoded_images = await self._fetch_forward_images(handled_message)
+            processed_message = self._recursive_parse_image_seg(handled_message, encoded_images)
         else:
             # 处理没有图片的情况，此时直接返回
             logger.trace("没有图片，直接返回")
@@ -747,48 +799,72 @@ class MessageHandler:
         forward_hint = Seg(type="text", data="这是一条转发消息：\n")
         return Seg(type="seglist", data=[forward_hint, processed_message])
 
-    async def _recursive_parse_image_seg(self, seg_data: Seg, to_image: bool) -> Seg:
-        # sourcery skip: merge-else-if-into-elif
-        if to_image:
-            if seg_data.type == "seglist":
-                new_seg_list = []
-                for i_seg in seg_data.data:
-                    parsed_seg = await self._recursive_parse_image_seg(i_seg, to_image)
-                    new_seg_list.append(parsed_seg)
-                return Seg(type="seglist", data=new_seg_list)
-            elif seg_data.type == "image":
-                image_url = seg_data.data
-                try:
-                    encoded_image = await get_image_base64(image_url)
-                except Exception as e:
-                    logger.error(f"图片处理失败: {str(e)}")
-                    return Seg(type="text", data="[图片]")
-                return Seg(type="image", data=encoded_image)
-            elif seg_data.type == "emoji":
-                image_url = seg_data.data
-                try:
-                    encoded_image = await get_image_base64(image_url)
-                except Exception as e:
-                    logger.error(f"图片处理失败: {str(e)}")
-                    return Seg(type="text", data="[表情包]")
-                return Seg(type="emoji", data=encoded_image)
-            else:
-                logger.trace(f"不处理类型: {seg_data.type}")
-                return seg_data
+    def _collect_image_urls(self, seg_data: Seg, urls: List[str]) -> None:
+        """按出现顺序收集转发消息树中的图片/表情包URL"""
+        if seg_data.type == "seglist":
+            for i_seg in seg_data.data:
+                self._collect_image_urls(i_seg, urls)
+        elif seg_data.type in ("image", "emoji") and seg_data.data not in urls:
+            urls.append(seg_data.data)
+
+    async def _fetch_forward_images(self, seg_data: Seg) -> Dict[str, str]:
+        """
+        并发下载转发消息中的图片
+        在时间预算内未完成的图片、以及按出现顺序累计超出字节预算的图片都不会被采用
+        Returns:
+            dict: 图片URL -> Base64
+        """
+        urls: List[str] = []
+        self._collect_image_urls(seg_data, urls)
+        semaphore = asyncio.Semaphore(max(1, global_config.processing.segment_concurrency))
+
+        async def fetch(url: str) -> str:
+            async with semaphore:
+                return await get_image_base64(url)
+
+        tasks = {url: asyncio.create_task(fetch(url)) for url in urls}
+        _, pending = await asyncio.wait(tasks.values(), timeout=global_config.processing.forward_image_time_budget)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.info(f"转发消息中有 {len(pending)} 张图片超出时间预算，使用占位符")
+
+        byte_budget = global_config.processing.forward_image_max_kb * 1024
+        used_bytes = 0
+        encoded_images: Dict[str, str] = {}
+        for url, task in tasks.items():
+            if task.cancelled():
+                continue
+            if task.exception() is not None:
+                logger.error(f"图片处理失败: {str(task.exception())}")
+                continue
+            encoded_image = task.result()
+            if used_bytes + len(encoded_image) > byte_budget:
+                logger.trace("图片超出字节预算，使用占位符")
+                continue
+            used_bytes += len(encoded_image)
+            encoded_images[url] = encoded_image
+        return encoded_images
+
+    def _recursive_parse_image_seg(self, seg_data: Seg, encoded_images: Dict[str, str]) -> Seg:
+        """将转发消息树中的图片URL替换为已下载的Base64，未下载的替换为占位符"""
+        if seg_data.type == "seglist":
+            return Seg(
+                type="seglist",
+                data=[self._recursive_parse_image_seg(i_seg, encoded_images) for i_seg in seg_data.data],
+            )
+        elif seg_data.type == "image":
+            if seg_data.data in encoded_images:
+                return Seg(type="image", data=encoded_images[seg_data.data])
+            return Seg(type="text", data="[图片]")
+        elif seg_data.type == "emoji":
+            if seg_data.data in encoded_images:
+                return Seg(type="emoji", data=encoded_images[seg_data.data])
+            return Seg(type="text", data="[动画表情]")
         else:
-            if seg_data.type == "seglist":
-                new_seg_list = []
-                for i_seg in seg_data.data:
-                    parsed_seg = await self._recursive_parse_image_seg(i_seg, to_image)
-                    new_seg_list.append(parsed_seg)
-                return Seg(type="seglist", data=new_seg_list)
-            elif seg_data.type == "image":
-                return Seg(type="text", data="[图片]")
-            elif seg_data.type == "emoji":
-                return Seg(type="text", data="[动画表情]")
-            else:
-                logger.trace(f"不处理类型: {seg_data.type}")
-                return seg_data
+            logger.trace(f"不处理类型: {seg_data.type}")
+            return seg_data
 
     async def _handle_forward_message(self, message_list: list, layer: int) -> Tuple[Seg, int] | Tuple[None, int]:
         # sourcery skip: low-code-quality
@@ -900,6 +976,7 @@ class MessageHandler:
             if not connection:
                 logger.error("没有可用的 WebSocket 连接")
                 return None
+            register_request(request_uuid, "get_forward_msg")
             await connection.send(payload)
             response: dict = await get_response(request_uuid)
         except TimeoutError:
@@ -908,19 +985,19 @@ class MessageHandler:
         except Exception as e:
             logger.error(f"获取转发消息失败: {str(e)}")
             return None
-        logger.debug(
-            f"转发消息原始格式：{json.dumps(response)[:80]}..."
-            if len(json.dumps(response)) > 80
-            else json.dumps(response)
-        )
+        if debug_enabled():
+            response_json = json.dumps(response, ensure_ascii=False)
+            logger.debug(f"转发消息原始格式：{response_json[:80]}..." if len(response_json) > 80 else response_json)
         response_data: Dict = response.get("data")
         if not response_data:
             logger.warning("转发消息内容为空或获取失败")
             return None
         return response_data.get("messages")
 
-    async def _send_buffered_message(self, session_id: str, merged_text: str, original_event: Dict[str, Any]):
-        """发送缓冲的合并消息"""
+    async def _send_buffered_message(
+        self, session_id: str, merged_segments: List[Dict[str, Any]], original_event: Dict[str, Any]
+    ):
+        """解析并发送缓冲合并后的消息"""
         try:
             # 从原始事件数据中提取信息
             message_info = original_event.get("message_info")
@@ -930,17 +1007,19 @@ class MessageHandler:
                 logger.error("缓冲消息缺少必要信息")
                 return
             
-            # 创建合并后的消息段 - 将合并的文本转换为Seg格式
-            from maim_message import Seg
-            merged_seg = Seg(type="text", data=merged_text)
-            submit_seg = Seg(type="seglist", data=[merged_seg])
+            # 合并后的消息段在这里才解析，突发消息中重复的表情包只下载一次
+            merged_raw_message = dict(raw_message)
+            merged_raw_message["message"] = merged_segments
+            seg_message = await self.handle_real_message(merged_raw_message)
+            if not seg_message:
+                logger.warning(f"缓冲合并消息 {session_id} 处理后内容为空")
+                return
+            submit_seg = Seg(type="seglist", data=seg_message)
             
             # 创建新的消息ID
-            import time
             new_message_id = f"buffered-{message_info.message_id}-{int(time.time() * 1000)}"
             
             # 更新消息信息
-            from maim_message import BaseMessageInfo, MessageBase
             buffered_message_info = BaseMessageInfo(
                 platform=message_info.platform,
                 message_id=new_message_id,
@@ -1,8 +1,37 @@
-from src.logger import logger
+from src.logger import logger, sampled_debug
 from src.message_chunker import chunker
 from src.config import global_config
 from maim_message import MessageBase, Router
+from typing import Any, Dict, List
 import asyncio
+import time
+
+
+def _chunk_size(chunk: Dict[str, Any]) -> int:
+    """切片的有效载荷字节数"""
+    return chunk.get("__mmc_chunk_info__", {}).get("chunk_size", 0)
+
+
+class ChunkSendState:
+    """
+    单个平台的切片发送状态：限制同时切片发送的大消息数量，并统计吞吐量与限流等待时间
+    """
+
+    def __init__(self, max_concurrent_sends: int):
+        self.send_semaphore = asyncio.Semaphore(max(1, max_concurrent_sends))
+        self.bytes_sent = 0
+        self.chunks_sent = 0
+        self.send_seconds = 0.0
+        self.throttled_seconds = 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "chunks_sent": self.chunks_sent,
+            "bytes_sent": self.bytes_sent,
+            "send_seconds": self.send_seconds,
+            "throughput_mbps": self.bytes_sent / self.send_seconds / (1024 * 1024) if self.send_seconds else 0.0,
+            "throttled_seconds": self.throttled_seconds,
+        }
 
 
 class MessageSending:
@@ -13,7 +42,17 @@ class MessageSending:
     maibot_router: Router = None
 
     def __init__(self):
-        pass
+        self.send_states: Dict[str, ChunkSendState] = {}
+
+    def _get_send_state(self, platform: str) -> ChunkSendState:
+        state = self.send_states.get(platform)
+        if state is None:
+            state = self.send_states[platform] = ChunkSendState(global_config.slicing.max_concurrent_sends)
+        return state
+
+    def get_send_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各平台的切片发送统计"""
+        return {platform: state.get_stats() for platform, state in self.send_states.items()}
 
     async def message_send(self, message_base: MessageBase) -> bool:
         """
@@ -22,51 +61,88 @@ class MessageSending:
             message_base: MessageBase: 消息基类，包含发送目标和消息内容等信息
         """
         try:
-            # 检查是否需要切片发送
             message_dict = message_base.to_dict()
-            
-            if chunker.should_chunk_message(message_dict):
-                logger.info("消息过大，进行切片发送到 MaiBot")
-                
-                # 切片消息
-                chunks = chunker.chunk_message(message_dict)
-                
-                # 逐个发送切片
-                for i, chunk in enumerate(chunks):
-                    logger.debug(f"发送切片 {i+1}/{len(chunks)} 到 MaiBot")
-                    
-                    # 获取对应的客户端并发送切片
+            # 绝大多数消息不编码就能确定无需切片，由maim_message完成唯一一次序列化
+            if not chunker.fits_in_one_frame(message_dict):
+                # 可能需要切片时只序列化一次，大小判断与切片共用同一份bytes
+                message_bytes = chunker.serialize(message_dict)
+                if chunker.should_chunk_message(message_bytes):
+                    logger.info(f"消息过大（{len(message_bytes)} bytes），进行切片发送到 MaiBot")
+
+                    # 切片消息
+                    chunks = chunker.chunk_message(message_bytes)
+                    del message_bytes, message_dict
+
+                    # 获取对应的客户端
                     platform = message_base.message_info.platform
                     if platform not in self.maibot_router.clients:
                         logger.error(f"平台 {platform} 未连接")
                         return False
-                    
+
                     client = self.maibot_router.clients[platform]
-                    send_status = await client.send_message(chunk)
-                    
-                    if not send_status:
-                        logger.error(f"发送切片 {i+1}/{len(chunks)} 失败")
-                        return False
-                    
-                    # 使用配置中的延迟时间
-                    if i < len(chunks) - 1:
-                        delay_seconds = global_config.slicing.delay_ms / 1000.0
-                        logger.debug(f"切片发送延迟: {global_config.slicing.delay_ms}毫秒")
-                        await asyncio.sleep(delay_seconds)
-                
-                logger.debug("所有切片发送完成")
-                return True
-            else:
-                # 直接发送小消息
-                send_status = await self.maibot_router.send_message(message_base)
-                if not send_status:
-                    raise RuntimeError("可能是路由未正确配置或连接异常")
-                return send_status
-                
+                    state = self._get_send_state(platform)
+                    async with state.send_semaphore:
+                        return await self._send_chunks(client, chunks, state)
+                del message_bytes
+
+            # 直接发送小消息
+            client = self.maibot_router.clients.get(message_base.message_info.platform)
+            send_status = (
+                await client.send_message(message_dict)
+                if client
+                else await self.maibot_router.send_message(message_base)
+            )
+            if not send_status:
+                raise RuntimeError("可能是路由未正确配置或连接异常")
+            return send_status
+
         except Exception as e:
             logger.error(f"发送消息失败: {str(e)}")
             logger.error("请检查与MaiBot之间的连接")
             return False
 
+    async def _send_chunks(self, client, chunks: List[Dict[str, Any]], state: ChunkSendState) -> bool:
+        """
+        逐片发送切片，切片之间间隔 delay_ms
+        Parameters:
+            client: 平台客户端
+            chunks: List[Dict[str, Any]]: 切片列表
+            state: ChunkSendState: 该平台的发送状态
+        Returns:
+            bool: 是否全部发送成功
+        """
+        start_time = time.monotonic()
+        throttled = 0.0
+        total_bytes = 0
+        delay_seconds = global_config.slicing.delay_ms / 1000.0
+        try:
+            for i, chunk in enumerate(chunks):
+                sampled_debug("chunk_send", "发送切片 {}/{} 到 MaiBot", i + 1, len(chunks))
+                try:
+                    send_status = await client.send_message(chunk)
+                except Exception as e:
+                    logger.error(f"发送切片时出错: {e}")
+                    send_status = False
+                if not send_status:
+                    logger.error(f"发送切片失败，已发送 {i}/{len(chunks)}")
+                    return False
+                state.chunks_sent += 1
+                total_bytes += _chunk_size(chunk)
+                # 切片之间保持固定间隔，避免接收端来不及处理
+                if i < len(chunks) - 1 and delay_seconds > 0:
+                    throttled += delay_seconds
+                    await asyncio.sleep(delay_seconds)
+        finally:
+            elapsed = time.monotonic() - start_time
+            state.bytes_sent += total_bytes
+            state.send_seconds += elapsed
+            state.throttled_seconds += throttled
+
+        logger.info(
+            f"所有切片发送完成: {len(chunks)} 片, {total_bytes / (1024 * 1024):.2f}MB, "
+            f"{total_bytes / max(elapsed, 1e-9) / (1024 * 1024):.2f}MB/s, 限流等待 {throttled * 1000:.0f}ms"
+        )
+        return True
+
 
 message_send_instance = MessageSending()
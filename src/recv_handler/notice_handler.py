@@ -7,12 +7,13 @@ from typing import Tuple, Optional
 from src.logger import logger
 from src.config import global_config
 from src.config.features_config import features_manager
-from src.database import BanUser, db_manager, is_identical
+from src.database import BanUser, ban_record_writer
+from src.ban_table import BanTable
 from . import NoticeType, ACCEPT_FORMAT
-from .message_sending import message_send_instance
 from .message_handler import message_handler
 from maim_message import FormatInfo, UserInfo, GroupInfo, Seg, BaseMessageInfo, MessageBase
 from src.websocket_manager import websocket_manager
+from src.notice_delivery import notice_delivery, NoticePriority
 
 from src.utils import (
     get_group_info,
@@ -20,31 +21,83 @@ from src.utils import (
     get_self_info,
     get_stranger_info,
     read_ban_list,
+    invalidate_group_info,
+    invalidate_member_info,
 )
 
-notice_queue: asyncio.Queue[MessageBase] = asyncio.Queue(maxsize=100)
-unsuccessful_notice_queue: asyncio.Queue[MessageBase] = asyncio.Queue(maxsize=3)
+NATURAL_LIFT_BATCH_SIZE = 16  # 每批并发查询信息并构建的自然解除禁言通知数量
 
 
 class NoticeHandler:
-    banned_list: list[BanUser] = []  # 当前仍在禁言中的用户列表
-    lifted_list: list[BanUser] = []  # 已经自然解除禁言
-
     def __init__(self):
+        self.ban_table: BanTable = BanTable()  # 当前仍在禁言中的记录，按 (group_id, user_id) 索引
+        self.lifted_list: list[BanUser] = []  # 已经自然解除禁言
+        self._ban_changed: asyncio.Event = asyncio.Event()  # 新增或更新了带解除时间的禁言
+        self._lift_ready: asyncio.Event = asyncio.Event()  # lifted_list中有待发送的解除通知
+        self._reconcile_task: asyncio.Task | None = None
+        self._reconcile_touched: set | None = None  # 核对期间被通知修改过的 (group_id, user_id)
+        self._background_tasks: list[asyncio.Task] = []
         self.server_connection: Server.ServerConnection | None = None
         self.last_poke_time: float = 0.0  # 记录最后一次针对机器人的戳一戳时间
 
     async def set_server_connection(self, server_connection: Server.ServerConnection) -> None:
-        """设置Napcat连接"""
+        """设置Napcat连接，禁言列表在后台核对，不阻塞通知处理"""
         self.server_connection = server_connection
 
         while self.server_connection.state != Server.State.OPEN:
             await asyncio.sleep(0.5)
-        self.banned_list, self.lifted_list = await read_ban_list(self.server_connection)
 
-        asyncio.create_task(self.auto_lift_detect())
-        asyncio.create_task(self.send_notice())
-        asyncio.create_task(self.handle_natural_lift())
+        if self._reconcile_task and not self._reconcile_task.done():
+            self._reconcile_task.cancel()
+        # 在任务创建前开始记录，避免遗漏任务启动前到达的通知
+        touched: set = set()
+        self._reconcile_touched = touched
+        self._reconcile_task = asyncio.create_task(self._reconcile_ban_list(touched))
+
+        # 重连时不重复启动后台任务
+        if not self._background_tasks or any(task.done() for task in self._background_tasks):
+            for task in self._background_tasks:
+                task.cancel()
+            self._background_tasks = [
+                asyncio.create_task(self.auto_lift_detect()),
+                asyncio.create_task(self.handle_natural_lift()),
+            ]
+
+    async def _reconcile_ban_list(self, touched: set) -> None:
+        """
+        向Napcat核对数据库中的禁言记录，核对期间收到的禁言通知优先
+        Parameters:
+            touched: set: 核对期间被通知修改过的 (group_id, user_id)
+        """
+        try:
+            banned_list, lifted_list, updated_list = await read_ban_list(self.server_connection)
+        finally:
+            if self._reconcile_touched is touched:
+                self._reconcile_touched = None
+
+        lifted_count = 0
+        for ban_record in banned_list:
+            if (ban_record.group_id, ban_record.user_id) in touched:
+                continue
+            self.ban_table.set(ban_record)
+        # 只写回解除时间发生变化的记录
+        for ban_record in updated_list:
+            if (ban_record.group_id, ban_record.user_id) not in touched:
+                ban_record_writer.upsert(ban_record)
+        for lift_record in lifted_list:
+            if (lift_record.group_id, lift_record.user_id) in touched:
+                continue
+            self.ban_table.remove(lift_record.group_id, lift_record.user_id)
+            self.lifted_list.append(lift_record)  # 由handle_natural_lift发送通知并删除数据库记录
+            lifted_count += 1
+        self._ban_changed.set()
+        if lifted_count:
+            self._lift_ready.set()
+        logger.info(f"禁言列表核对完成: {len(self.ban_table)} 条仍在禁言，{lifted_count} 条已解除")
+
+    def _mark_touched(self, group_id: int, user_id: int) -> None:
+        if self._reconcile_touched is not None:
+            self._reconcile_touched.add((group_id, user_id))
 
     def get_server_connection(self) -> Server.ServerConnection:
         """获取当前的服务器连接"""
@@ -55,31 +108,27 @@ class NoticeHandler:
 
     def _ban_operation(self, group_id: int, user_id: Optional[int] = None, lift_time: Optional[int] = None) -> None:
         """
-        将用户禁言记录添加到self.banned_list中
+        将用户禁言记录添加到禁言表中，已存在时更新解除时间
         如果是全体禁言，则user_id为0
         """
         if user_id is None:
             user_id = 0  # 使用0表示全体禁言
             lift_time = -1
         ban_record = BanUser(user_id=user_id, group_id=group_id, lift_time=lift_time)
-        for record in self.banned_list:
-            if is_identical(record, ban_record):
-                self.banned_list.remove(record)
-                self.banned_list.append(ban_record)
-                db_manager.create_ban_record(ban_record)  # 作为更新
-                return
-        self.banned_list.append(ban_record)
-        db_manager.create_ban_record(ban_record)  # 添加到数据库
+        self._mark_touched(group_id, user_id)
+        self.ban_table.set(ban_record)
+        ban_record_writer.upsert(ban_record)  # 延迟批量写入数据库
+        self._ban_changed.set()  # 唤醒解除调度，重新计算最近的解除时间
 
     def _lift_operation(self, group_id: int, user_id: Optional[int] = None) -> None:
         """
-        从self.lifted_group_list中移除已经解除全体禁言的群
+        从禁言表中移除已经被解除禁言的记录
         """
         if user_id is None:
             user_id = 0  # 使用0表示全体禁言
-        ban_record = BanUser(user_id=user_id, group_id=group_id, lift_time=-1)
-        self.lifted_list.append(ban_record)
-        db_manager.delete_ban_record(ban_record)  # 删除数据库中的记录
+        self._mark_touched(group_id, user_id)
+        self.ban_table.remove(group_id, user_id)
+        ban_record_writer.delete(group_id, user_id)  # 删除数据库中的记录
 
     async def handle_notice(self, raw_message: dict) -> None:
         notice_type = raw_message.get("notice_type")
@@ -94,6 +143,8 @@ class NoticeHandler:
         user_info: UserInfo = None
         system_notice: bool = False
 
+        self._invalidate_cached_info(notice_type, raw_message)
+
         match notice_type:
             case NoticeType.friend_recall:
                 logger.info("好友撤回一条消息")
@@ -106,8 +157,11 @@ class NoticeHandler:
             case NoticeType.notify:
                 sub_type = raw_message.get("sub_type")
                 match sub_type:
+                    case NoticeType.Notify.group_name | NoticeType.Notify.title:
+                        logger.debug(f"群信息变更通知: {notice_type}.{sub_type}，已刷新缓存")
+                        return None
                     case NoticeType.Notify.poke:
-                        if features_manager.is_poke_enabled() and await message_handler.check_allow_to_chat(
+                        if features_manager.snapshot.poke_enabled and await message_handler.check_allow_to_chat(
                             user_id, group_id, False, False
                         ):
                             logger.info("处理戳一戳消息")
@@ -133,6 +187,14 @@ class NoticeHandler:
                         system_notice = True
                     case _:
                         logger.warning(f"不支持的group_ban类型: {notice_type}.{sub_type}")
+            case (
+                NoticeType.group_card
+                | NoticeType.group_increase
+                | NoticeType.group_decrease
+                | NoticeType.group_admin
+            ):
+                logger.debug(f"群成员变更通知: {notice_type}，已刷新缓存")
+                return None
             case _:
                 logger.warning(f"不支持的notice类型: {notice_type}")
                 return None
@@ -178,7 +240,36 @@ class NoticeHandler:
             await self.put_notice(message_base)
         else:
             logger.info("发送到Maibot处理通知信息")
-            await message_send_instance.message_send(message_base)
+            await self.put_notice(message_base, NoticePriority.POKE)
+
+    def _invalidate_cached_info(self, notice_type: str, raw_message: dict) -> None:
+        """根据通知使群信息/群成员信息缓存失效"""
+        group_id = raw_message.get("group_id")
+        user_id = raw_message.get("user_id")
+        if not group_id:
+            return
+        match notice_type:
+            case NoticeType.group_card | NoticeType.group_admin | NoticeType.group_increase:
+                invalidate_member_info(group_id, user_id)
+            case NoticeType.group_decrease:
+                if user_id == raw_message.get("self_id"):
+                    # 机器人自身离开群聊，整个群的缓存都不再可信
+                    invalidate_group_info(group_id)
+                    invalidate_member_info(group_id)
+                else:
+                    invalidate_member_info(group_id, user_id)
+                    invalidate_group_info(group_id)  # 成员数变化
+            case NoticeType.group_ban:
+                if user_id == 0:
+                    invalidate_group_info(group_id)  # 全体禁言状态变化
+                else:
+                    invalidate_member_info(group_id, user_id)
+            case NoticeType.notify:
+                sub_type = raw_message.get("sub_type")
+                if sub_type == NoticeType.Notify.group_name:
+                    invalidate_group_info(group_id)
+                elif sub_type == NoticeType.Notify.title:
+                    invalidate_member_info(group_id, user_id)
 
     async def handle_poke_notify(
         self, raw_message: dict, group_id: int, user_id: int
@@ -196,7 +287,7 @@ class NoticeHandler:
         # 防抖检查：如果是针对机器人的戳一戳，检查防抖时间
         if self_id == target_id:
             current_time = time.time()
-            debounce_seconds = features_manager.get_config().poke_debounce_seconds
+            debounce_seconds = features_manager.snapshot.poke_debounce_seconds
 
             if self.last_poke_time > 0:
                 time_diff = current_time - self.last_poke_time
@@ -233,7 +324,7 @@ class NoticeHandler:
 
         else:
             # 如果配置为忽略不是针对自己的戳一戳，则直接返回None
-            if features_manager.is_non_self_poke_ignored():
+            if features_manager.snapshot.non_self_poke_ignored:
                 logger.info("忽略不是针对自己的戳一戳消息")
                 return None, None
                 
@@ -399,67 +490,80 @@ class NoticeHandler:
         )
         return seg_data, operator_info
 
-    async def put_notice(self, message_base: MessageBase) -> None:
+    async def put_notice(self, message_base: MessageBase, priority: int = NoticePriority.BAN) -> None:
         """
-        将处理后的通知消息放入通知队列
+        将处理后的通知消息交给通知投递队列
         """
-        if notice_queue.full() or unsuccessful_notice_queue.full():
-            logger.warning("通知队列已满，可能是多次发送失败，消息丢弃")
-        else:
-            await notice_queue.put(message_base)
+        await notice_delivery.put(message_base, priority)
 
     async def handle_natural_lift(self) -> None:
+        """等待auto_lift_detect放入的到期记录，分批发送自然解除禁言通知"""
         while True:
-            if len(self.lifted_list) != 0:
-                lift_record = self.lifted_list.pop()
-                group_id = lift_record.group_id
-                user_id = lift_record.user_id
-
-                db_manager.delete_ban_record(lift_record)  # 从数据库中删除禁言记录
-
-                seg_message: Seg = await self.natural_lift(group_id, user_id)
-
-                fetched_group_info = await get_group_info(self.get_server_connection(), group_id)
-                group_name: str = None
-                if fetched_group_info:
-                    group_name = fetched_group_info.get("group_name")
-                else:
-                    logger.warning("无法获取notice消息所在群的名称")
-                group_info = GroupInfo(
-                    platform=global_config.maibot_server.platform_name,
-                    group_id=group_id,
-                    group_name=group_name,
-                )
-
-                message_info: BaseMessageInfo = BaseMessageInfo(
-                    platform=global_config.maibot_server.platform_name,
-                    message_id="notice",
-                    time=time.time(),
-                    user_info=None,  # 自然解除禁言没有操作者
-                    group_info=group_info,
-                    template_info=None,
-                    format_info=None,
+            await self._lift_ready.wait()
+            self._lift_ready.clear()
+            while self.lifted_list:
+                batch = self.lifted_list[:NATURAL_LIFT_BATCH_SIZE]
+                del self.lifted_list[:NATURAL_LIFT_BATCH_SIZE]
+                for lift_record in batch:
+                    # 到期后又被重新禁言时，禁言表中已是新的记录，删除会覆盖同一刷新周期内新记录的写入
+                    if (lift_record.group_id, lift_record.user_id) not in self.ban_table:
+                        ban_record_writer.delete(lift_record.group_id, lift_record.user_id)  # 从数据库中删除禁言记录
+                message_bases = await asyncio.gather(
+                    *(self._build_natural_lift_notice(lift_record) for lift_record in batch),
+                    return_exceptions=True,
                 )
+                for lift_record, message_base in zip(batch, message_bases, strict=True):
+                    if isinstance(message_base, BaseException):
+                        logger.error(
+                            f"构建自然解除禁言通知失败，群号: {lift_record.group_id}，用户ID: {lift_record.user_id}: {message_base}"
+                        )
+                        continue
+                    await self.put_notice(message_base)
+
+    async def _build_natural_lift_notice(self, lift_record: BanUser) -> MessageBase:
+        """构建一条自然解除禁言通知"""
+        group_id = lift_record.group_id
+        user_id = lift_record.user_id
+
+        seg_message, fetched_group_info = await asyncio.gather(
+            self.natural_lift(group_id, user_id),
+            get_group_info(self.get_server_connection(), group_id),
+        )
+        group_name: str = None
+        if fetched_group_info:
+            group_name = fetched_group_info.get("group_name")
+        else:
+            logger.warning("无法获取notice消息所在群的名称")
+        group_info = GroupInfo(
+            platform=global_config.maibot_server.platform_name,
+            group_id=group_id,
+            group_name=group_name,
+        )
 
-                message_base: MessageBase = MessageBase(
-                    message_info=message_info,
-                    message_segment=seg_message,
-                    raw_message=json.dumps(
-                        {
-                            "post_type": "notice",
-                            "notice_type": "group_ban",
-                            "sub_type": "lift_ban",
-                            "group_id": group_id,
-                            "user_id": user_id,
-                            "operator_id": None,  # 自然解除禁言没有操作者
-                        }
-                    ),
-                )
+        message_info: BaseMessageInfo = BaseMessageInfo(
+            platform=global_config.maibot_server.platform_name,
+            message_id="notice",
+            time=time.time(),
+            user_info=None,  # 自然解除禁言没有操作者
+            group_info=group_info,
+            template_info=None,
+            format_info=None,
+        )
 
-                await self.put_notice(message_base)
-                await asyncio.sleep(0.5)  # 确保队列处理间隔
-            else:
-                await asyncio.sleep(5)  # 每5秒检查一次
+        return MessageBase(
+            message_info=message_info,
+            message_segment=seg_message,
+            raw_message=json.dumps(
+                {
+                    "post_type": "notice",
+                    "notice_type": "group_ban",
+                    "sub_type": "lift_ban",
+                    "group_id": group_id,
+                    "user_id": user_id,
+                    "operator_id": None,  # 自然解除禁言没有操作者
+                }
+            ),
+        )
 
     async def natural_lift(self, group_id: int, user_id: int) -> Seg | None:
         if not group_id:
@@ -498,51 +602,22 @@ class NoticeHandler:
         )
 
     async def auto_lift_detect(self) -> None:
+        """按最近的解除时间精确休眠，到期后批量取出，新的禁言会提前唤醒重新计算"""
         while True:
-            if len(self.banned_list) == 0:
-                await asyncio.sleep(5)
-                continue
-            for ban_record in self.banned_list:
-                if ban_record.user_id == 0 or ban_record.lift_time == -1:
-                    continue
-                if ban_record.lift_time <= int(time.time()):
+            self._ban_changed.clear()
+            due_records = self.ban_table.pop_due(time.time())
+            if due_records:
+                for ban_record in due_records:
                     # 触发自然解除禁言
                     logger.info(f"检测到用户 {ban_record.user_id} 在群 {ban_record.group_id} 的禁言已解除")
-                    self.lifted_list.append(ban_record)
-                    self.banned_list.remove(ban_record)
-            await asyncio.sleep(5)
-
-    async def send_notice(self) -> None:
-        """
-        发送通知消息到Napcat
-        """
-        while True:
-            if not unsuccessful_notice_queue.empty():
-                to_be_send: MessageBase = await unsuccessful_notice_queue.get()
-                try:
-                    send_status = await message_send_instance.message_send(to_be_send)
-                    if send_status:
-                        unsuccessful_notice_queue.task_done()
-                    else:
-                        await unsuccessful_notice_queue.put(to_be_send)
-                except Exception as e:
-                    logger.error(f"发送通知消息失败: {str(e)}")
-                    await unsuccessful_notice_queue.put(to_be_send)
-                await asyncio.sleep(1)
-                continue
-            to_be_send: MessageBase = await notice_queue.get()
+                self.lifted_list.extend(due_records)
+                self._lift_ready.set()
+            next_lift_time = self.ban_table.next_lift_time()
+            timeout = None if next_lift_time is None else max(0.0, next_lift_time - time.time())
             try:
-                send_status = await message_send_instance.message_send(to_be_send)
-                if send_status:
-                    notice_queue.task_done()
-                else:
-                    await unsuccessful_notice_queue.put(to_be_send)
-            except Exception as e:
-                logger.error(f"发送通知消息失败: {str(e)}")
-                await unsuccessful_notice_queue.put(to_be_send)
-            await asyncio.sleep(1)
-
-
+                await asyncio.wait_for(self._ban_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
 
 notice_handler = NoticeHandler()
@@ -1,44 +1,142 @@
 import asyncio
+import bisect
 import time
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 from .config import global_config
 from .logger import logger
 
-response_dict: Dict = {}
-response_time_dict: Dict = {}
+# 延迟直方图的桶上界（毫秒），最后一个桶收纳所有更大的值
+LATENCY_BUCKETS_MS: List[float] = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+BUCKET_LABELS: List[str] = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
 
 
-async def get_response(request_id: str, timeout: int = 10) -> dict:
-    response = await asyncio.wait_for(_get_response(request_id), timeout)
-    _ = response_time_dict.pop(request_id)
-    logger.trace(f"响应信息id: {request_id} 已从响应字典中取出")
-    return response
+@dataclass
+class PendingRequest:
+    """等待Napcat响应的请求"""
+
+    future: asyncio.Future
+    action: str
+    sent_at: float = field(default_factory=time.monotonic)
+    waiting: bool = False
+
+
+class LatencyHistogram:
+    """按动作统计的响应延迟直方图"""
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total: int = 0
+        self.sum_ms: float = 0.0
+        self.max_ms: float = 0.0
+
+    def record(self, latency_ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, p: float) -> float:
+        """按桶上界估算分位数（毫秒）"""
+        if self.total == 0:
+            return 0.0
+        threshold = self.total * p
+        accumulated = 0
+        for index, count in enumerate(self.counts):
+            accumulated += count
+            if accumulated >= threshold:
+                return min(LATENCY_BUCKETS_MS[index], self.max_ms) if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.total,
+            "avg_ms": self.sum_ms / self.total if self.total else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": dict(zip(BUCKET_LABELS, self.counts, strict=True)),
+        }
+
+
+pending_requests: Dict[str, PendingRequest] = {}
+latency_histograms: Dict[str, LatencyHistogram] = {}
+dropped_response_count: int = 0
 
-async def _get_response(request_id: str) -> dict:
+
+def register_request(request_id: str, action: str = "unknown") -> None:
     """
-    内部使用的获取响应函数，主要用于在需要时获取响应
+    在向Napcat发送请求之前登记echo，保证响应先于等待方到达时也不会丢失
+    Parameters:
+        request_id: str: 请求的echo
+        action: str: 请求的动作名称，用于延迟统计
     """
-    while request_id not in response_dict:
-        await asyncio.sleep(0.2)
-    return response_dict.pop(request_id)
+    if request_id in pending_requests:
+        return
+    loop = asyncio.get_running_loop()
+    pending_requests[request_id] = PendingRequest(future=loop.create_future(), action=action)
+
+
+async def get_response(request_id: str, timeout: int = 10) -> dict:
+    if request_id not in pending_requests:
+        register_request(request_id)
+    pending = pending_requests[request_id]
+    pending.waiting = True
+    try:
+        response = await asyncio.wait_for(pending.future, timeout)
+    finally:
+        pending_requests.pop(request_id, None)
+    logger.trace(f"响应信息id: {request_id} 已取出")
+    return response
+
 
 async def put_response(response: dict):
+    global dropped_response_count
     echo_id = response.get("echo")
-    now_time = time.time()
-    response_dict[echo_id] = response
-    response_time_dict[echo_id] = now_time
-    logger.trace(f"响应信息id: {echo_id} 已存入响应字典")
+    pending = pending_requests.get(echo_id)
+    if pending is None or pending.future.done():
+        dropped_response_count += 1
+        logger.trace(f"响应信息id: {echo_id} 无等待方，已丢弃")
+        return
+    latency_ms = (time.monotonic() - pending.sent_at) * 1000
+    histogram = latency_histograms.get(pending.action)
+    if histogram is None:
+        histogram = latency_histograms[pending.action] = LatencyHistogram()
+    histogram.record(latency_ms)
+    pending.future.set_result(response)
+    logger.trace(f"响应信息id: {echo_id} 已交付，耗时 {latency_ms:.1f}ms")
+
+
+def get_latency_stats(action: Optional[str] = None) -> dict:
+    """
+    获取响应延迟统计
+    Parameters:
+        action: str: 指定动作名称，为空时返回全部动作
+    Returns:
+        dict: 动作名称 -> 延迟直方图信息
+    """
+    if action is not None:
+        histogram = latency_histograms.get(action)
+        return {action: histogram.to_dict()} if histogram else {}
+    return {name: histogram.to_dict() for name, histogram in latency_histograms.items()}
 
 
 async def check_timeout_response() -> None:
+    """清理登记后从未被等待的请求（例如发送失败），并定期输出延迟统计"""
     while True:
         cleaned_message_count: int = 0
-        now_time = time.time()
-        for echo_id, response_time in list(response_time_dict.items()):
-            if now_time - response_time > global_config.napcat_server.heartbeat_interval:
+        now_time = time.monotonic()
+        for echo_id, pending in list(pending_requests.items()):
+            if not pending.waiting and now_time - pending.sent_at > global_config.napcat_server.heartbeat_interval:
                 cleaned_message_count += 1
-                response_dict.pop(echo_id)
-                response_time_dict.pop(echo_id)
-                logger.warning(f"响应消息 {echo_id} 超时，已删除")
-        logger.info(f"已删除 {cleaned_message_count} 条超时响应消息")
+                pending_requests.pop(echo_id, None)
+                pending.future.cancel()
+                logger.warning(f"请求 {echo_id} 未被等待，已删除")
+        if cleaned_message_count:
+            logger.info(f"已删除 {cleaned_message_count} 条未被等待的请求")
+        for action, histogram in latency_histograms.items():
+            logger.debug(
+                f"响应延迟 {action}: count={histogram.total}, "
+                f"p50={histogram.percentile(0.5):.0f}ms, p99={histogram.percentile(0.99):.0f}ms"
+            )
         await asyncio.sleep(global_config.napcat_server.heartbeat_interval)
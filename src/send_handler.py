@@ -15,10 +15,11 @@ from typing import Dict, Any, Tuple, Optional
 
 from . import CommandType
 from .config import global_config
-from .response_pool import get_response
+from .response_pool import get_response, register_request
 from .logger import logger
 from .utils import get_image_format, convert_image_to_gif
 from .recv_handler.message_sending import message_send_instance
+from .notice_delivery import notice_delivery, NoticePriority
 from .websocket_manager import websocket_manager
 from .config.features_config import features_manager
 
@@ -314,10 +315,10 @@ class SendHandler:
         reply_seg = {"type": "reply", "data": {"id": id}}
 
         # 获取功能配置
-        ft_config = features_manager.get_config()
+        ft_config = features_manager.snapshot
 
         # 检查是否启用引用艾特功能
-        if not ft_config.enable_reply_at:
+        if not ft_config.reply_at_enabled:
             return reply_seg
 
         try:
@@ -613,6 +614,7 @@ class SendHandler:
             return {"status": "error", "message": "no connection"}
         
         try:
+            register_request(request_uuid, action)
             await connection.send(payload)
             
             response = await get_response(request_uuid)
@@ -638,7 +640,7 @@ class SendHandler:
         message_base.message_segment = Seg(
             type="notify", data={"sub_type": "echo", "echo": mmc_message_id, "actual_id": qq_message_id}
         )
-        await message_send_instance.message_send(message_base)
+        await notice_delivery.put(message_base, NoticePriority.ECHO)
         logger.debug("已回送消息ID")
         return
 
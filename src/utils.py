@@ -1,38 +1,50 @@
+import asyncio
 import websockets as Server
 import json
 import base64
 import uuid
-import urllib3
-import ssl
 import io
 
 from src.database import BanUser, db_manager
-from .logger import logger
-from .response_pool import get_response
+from .config import global_config
+from .logger import logger, lazy_debug
+from .response_pool import get_response, register_request
+from .info_cache import AsyncTTLCache
+from .http_client import http_client
+from .media_cache import media_cache, make_media_key
 
 from PIL import Image
-from typing import Union, List, Tuple, Optional
+from typing import Union, List, Tuple, Optional, Dict, Any
 
 
-class SSLAdapter(urllib3.PoolManager):
-    def __init__(self, *args, **kwargs):
-        context = ssl.create_default_context()
-        context.set_ciphers("DEFAULT@SECLEVEL=1")
-        context.minimum_version = ssl.TLSVersion.TLSv1_2
-        kwargs["ssl_context"] = context
-        super().__init__(*args, **kwargs)
+# 缓存键统一使用字符串形式的ID，避免上报中int/str混用导致无法失效
+info_cache = AsyncTTLCache(
+    "napcat_info",
+    ttl=global_config.cache.info_ttl,
+    negative_ttl=global_config.cache.info_negative_ttl,
+    max_entries=global_config.cache.info_max_entries,
+)
 
 
-async def get_group_info(websocket: Server.ServerConnection, group_id: int) -> dict | None:
+async def get_group_info(websocket: Server.ServerConnection, group_id: int, use_cache: bool = True) -> dict | None:
     """
     获取群相关信息
 
     返回值需要处理可能为空的情况
+    Parameters:
+        use_cache: bool: 是否使用缓存，需要实时数据时传入False
     """
+    if not use_cache:
+        return await _fetch_group_info(websocket, group_id)
+    return await info_cache.get_or_load(("group", str(group_id)), lambda: _fetch_group_info(websocket, group_id))
+
+
+async def _fetch_group_info(websocket: Server.ServerConnection, group_id: int) -> dict | None:
     logger.debug("获取群聊信息中")
     request_uuid = str(uuid.uuid4())
     payload = json.dumps({"action": "get_group_info", "params": {"group_id": group_id}, "echo": request_uuid})
     try:
+        register_request(request_uuid, "get_group_info")
         await websocket.send(payload)
         socket_response: dict = await get_response(request_uuid)
     except TimeoutError:
@@ -55,6 +67,7 @@ async def get_group_detail_info(websocket: Server.ServerConnection, group_id: in
     request_uuid = str(uuid.uuid4())
     payload = json.dumps({"action": "get_group_detail_info", "params": {"group_id": group_id}, "echo": request_uuid})
     try:
+        register_request(request_uuid, "get_group_detail_info")
         await websocket.send(payload)
         socket_response: dict = await get_response(request_uuid)
     except TimeoutError:
@@ -67,12 +80,24 @@ async def get_group_detail_info(websocket: Server.ServerConnection, group_id: in
     return socket_response.get("data")
 
 
-async def get_member_info(websocket: Server.ServerConnection, group_id: int, user_id: int) -> dict | None:
+async def get_member_info(
+    websocket: Server.ServerConnection, group_id: int, user_id: int, use_cache: bool = True
+) -> dict | None:
     """
     获取群成员信息
 
     返回值需要处理可能为空的情况
+    Parameters:
+        use_cache: bool: 是否使用缓存，需要实时数据（如禁言时间）时传入False
     """
+    if not use_cache:
+        return await _fetch_member_info(websocket, group_id, user_id)
+    return await info_cache.get_or_load(
+        ("member", str(group_id), str(user_id)), lambda: _fetch_member_info(websocket, group_id, user_id)
+    )
+
+
+async def _fetch_member_info(websocket: Server.ServerConnection, group_id: int, user_id: int) -> dict | None:
     logger.debug("获取群成员信息中")
     request_uuid = str(uuid.uuid4())
     payload = json.dumps(
@@ -83,6 +108,7 @@ async def get_member_info(websocket: Server.ServerConnection, group_id: int, use
         }
     )
     try:
+        register_request(request_uuid, "get_group_member_info")
         await websocket.send(payload)
         socket_response: dict = await get_response(request_uuid)
     except TimeoutError:
@@ -95,22 +121,28 @@ async def get_member_info(websocket: Server.ServerConnection, group_id: int, use
     return socket_response.get("data")
 
 
-async def get_image_base64(url: str) -> str:
+async def get_image_base64(url: str, cache_key: Optional[str] = None) -> str:
     # sourcery skip: raise-specific-error
-    """获取图片/表情包的Base64"""
-    logger.debug(f"下载图片: {url}")
-    http = SSLAdapter()
+    """
+    获取图片/表情包的Base64
+    Parameters:
+        url: str: 图片URL
+        cache_key: str: 媒体缓存键，为空时根据URL计算
+    """
+    if cache_key is None:
+        cache_key = make_media_key(url)
     try:
-        response = http.request("GET", url, timeout=10)
-        if response.status != 200:
-            raise Exception(f"HTTP Error: {response.status}")
-        image_bytes = response.data
-        return base64.b64encode(image_bytes).decode("utf-8")
+        return await media_cache.get_or_fetch(cache_key, lambda: _download_image(url))
     except Exception as e:
         logger.error(f"图片下载失败: {str(e)}")
         raise
 
 
+async def _download_image(url: str) -> bytes:
+    logger.debug(f"下载图片: {url}")
+    return await http_client.fetch_bytes(url, timeout=10)
+
+
 def convert_image_to_gif(image_base64: str) -> str:
     # sourcery skip: extract-method
     """
@@ -141,10 +173,15 @@ async def get_self_info(websocket: Server.ServerConnection) -> dict | None:
     Returns:
         data: dict: 返回的自身信息
     """
+    return await info_cache.get_or_load(("self",), lambda: _fetch_self_info(websocket))
+
+
+async def _fetch_self_info(websocket: Server.ServerConnection) -> dict | None:
     logger.debug("获取自身信息中")
     request_uuid = str(uuid.uuid4())
     payload = json.dumps({"action": "get_login_info", "params": {}, "echo": request_uuid})
     try:
+        register_request(request_uuid, "get_login_info")
         await websocket.send(payload)
         response: dict = await get_response(request_uuid)
     except TimeoutError:
@@ -157,6 +194,29 @@ async def get_self_info(websocket: Server.ServerConnection) -> dict | None:
     return response.get("data")
 
 
+def invalidate_group_info(group_id: int) -> None:
+    """使群信息缓存失效（群名变更、全体禁言等）"""
+    info_cache.invalidate(("group", str(group_id)))
+
+
+def invalidate_member_info(group_id: int, user_id: Optional[int] = None) -> None:
+    """
+    使群成员信息缓存失效
+    Parameters:
+        group_id: int: 群号
+        user_id: int: 用户ID，为空时使该群所有成员的缓存失效
+    """
+    if user_id is None:
+        info_cache.invalidate_where(lambda key: key[0] == "member" and key[1] == str(group_id))
+    else:
+        info_cache.invalidate(("member", str(group_id), str(user_id)))
+
+
+def get_info_cache_stats() -> Dict[str, Any]:
+    """获取信息缓存的命中统计"""
+    return info_cache.get_stats()
+
+
 def get_image_format(raw_data: str) -> str:
     """
     从Base64编码的数据中确定图片的格式。
@@ -178,10 +238,15 @@ async def get_stranger_info(websocket: Server.ServerConnection, user_id: int) ->
     Returns:
         dict: 返回的陌生人信息
     """
+    return await info_cache.get_or_load(("stranger", str(user_id)), lambda: _fetch_stranger_info(websocket, user_id))
+
+
+async def _fetch_stranger_info(websocket: Server.ServerConnection, user_id: int) -> dict | None:
     logger.debug("获取陌生人信息中")
     request_uuid = str(uuid.uuid4())
     payload = json.dumps({"action": "get_stranger_info", "params": {"user_id": user_id}, "echo": request_uuid})
     try:
+        register_request(request_uuid, "get_stranger_info")
         await websocket.send(payload)
         response: dict = await get_response(request_uuid)
     except TimeoutError:
@@ -207,6 +272,7 @@ async def get_message_detail(websocket: Server.ServerConnection, message_id: Uni
     request_uuid = str(uuid.uuid4())
     payload = json.dumps({"action": "get_msg", "params": {"message_id": message_id}, "echo": request_uuid})
     try:
+        register_request(request_uuid, "get_msg")
         await websocket.send(payload)
         response: dict = await get_response(request_uuid, 30)  # 增加超时时间到30秒
     except TimeoutError:
@@ -241,6 +307,7 @@ async def get_record_detail(
         }
     )
     try:
+        register_request(request_uuid, "get_record")
         await websocket.send(payload)
         response: dict = await get_response(request_uuid, 30)  # 增加超时时间到30秒
     except TimeoutError:
@@ -249,62 +316,162 @@ async def get_record_detail(
     except Exception as e:
         logger.error(f"获取语音消息详情失败: {e}")
         return None
-    logger.debug(f"{str(response)[:200]}...")  # 防止语音的超长base64编码导致日志过长
+    lazy_debug("{}...", lambda: str(response)[:200])  # 防止语音的超长base64编码导致日志过长
     return response.get("data")
 
 
+async def get_group_member_list(websocket: Server.ServerConnection, group_id: int) -> list | None:
+    """
+    获取群成员列表
+
+    返回值需要处理可能为空的情况
+    """
+    logger.debug("获取群成员列表中")
+    request_uuid = str(uuid.uuid4())
+    payload = json.dumps(
+        {
+            "action": "get_group_member_list",
+            "params": {"group_id": group_id, "no_cache": True},
+            "echo": request_uuid,
+        }
+    )
+    try:
+        register_request(request_uuid, "get_group_member_list")
+        await websocket.send(payload)
+        socket_response: dict = await get_response(request_uuid)
+    except TimeoutError:
+        logger.error(f"获取群成员列表超时，群号: {group_id}")
+        return None
+    except Exception as e:
+        logger.error(f"获取群成员列表失败: {e}")
+        return None
+    logger.debug(f"群 {group_id} 成员列表: {len(socket_response.get('data') or [])} 人")
+    return socket_response.get("data")
+
+
+async def _reconcile_group_bans(
+    websocket: Server.ServerConnection, group_id: int, records: List[BanUser]
+) -> Tuple[List[BanUser], List[BanUser], List[BanUser]]:
+    """
+    核对同一个群中的禁言记录
+    有多条单人禁言时只获取一次群成员列表，获取失败时逐个查询成员信息
+    Returns:
+        Tuple[仍在禁言中的记录列表, 已经解除禁言的记录列表, 解除时间发生变化的记录列表（仍在禁言中的子集）]
+    """
+    banned: List[BanUser] = []
+    lifted: List[BanUser] = []
+    updated: List[BanUser] = []
+    member_records: List[BanUser] = []
+    for ban_record in records:
+        if ban_record.user_id != 0:
+            member_records.append(ban_record)
+            continue
+        fetched_group_info = await get_group_info(websocket, group_id, use_cache=False)
+        if fetched_group_info is None:
+            logger.warning(f"无法获取群信息，群号: {group_id}，默认禁言解除")
+            lifted.append(ban_record)
+        elif fetched_group_info.get("group_all_shut") == 0:
+            lifted.append(ban_record)
+        else:
+            banned.append(ban_record)
+    if not member_records:
+        return banned, lifted, updated
+
+    shut_up_timestamps: Dict[int, int] | None = None
+    if len(member_records) > 1:
+        member_list = await get_group_member_list(websocket, group_id)
+        if member_list is not None:
+            shut_up_timestamps = {
+                int(member.get("user_id")): member.get("shut_up_timestamp", 0) for member in member_list
+            }
+    if shut_up_timestamps is None:
+        member_infos = await asyncio.gather(
+            *(get_member_info(websocket, group_id, record.user_id, use_cache=False) for record in member_records)
+        )
+        shut_up_timestamps = {
+            record.user_id: info.get("shut_up_timestamp")
+            for record, info in zip(member_records, member_infos, strict=True)
+            if info is not None
+        }
+
+    for ban_record in member_records:
+        if ban_record.user_id not in shut_up_timestamps:
+            logger.warning(
+                f"无法获取群成员信息，用户ID: {ban_record.user_id}, 群号: {group_id}，默认禁言解除"
+            )
+            lifted.append(ban_record)
+            continue
+        lift_ban_time: int = shut_up_timestamps[ban_record.user_id]
+        if lift_ban_time == 0:
+            lifted.append(ban_record)
+        else:
+            if ban_record.lift_time != lift_ban_time:
+                ban_record.lift_time = lift_ban_time
+                updated.append(ban_record)
+            banned.append(ban_record)
+    return banned, lifted, updated
+
+
 async def read_ban_list(
-    websocket: Server.ServerConnection,
-) -> Tuple[List[BanUser], List[BanUser]]:
+    websocket: Server.ServerConnection, concurrency: int = 8
+) -> Tuple[List[BanUser], List[BanUser], List[BanUser]]:
     """
-    从根目录下的data文件夹中的文件读取禁言列表。
-    同时自动更新已经失效禁言
+    从根目录下的data文件夹中的数据库读取禁言列表，并向Napcat核对禁言是否仍然有效。
+    按群并发核对，每个群只获取一次成员列表。
+    本函数不写入数据库，由调用方根据结果更新。
+    Parameters:
+        concurrency: int: 同时核对的群数量
     Returns:
         Tuple[
-            一个仍在禁言中的用户的BanUser列表,
-            一个已经自然解除禁言的用户的BanUser列表,
-            一个仍在全体禁言中的群的BanUser列表,
-            一个已经自然解除全体禁言的群的BanUser列表,
+            一个仍在禁言中的BanUser列表（含全体禁言，lift_time已更新为最新值）,
+            一个已经解除禁言的BanUser列表,
+            一个解除时间发生变化、需要写回数据库的BanUser列表（第一个列表的子集）,
         ]
     """
     try:
-        ban_list = db_manager.get_ban_records()
-        lifted_list: List[BanUser] = []
-        logger.info("已经读取禁言列表")
-        for ban_record in ban_list:
-            if ban_record.user_id == 0:
-                fetched_group_info = await get_group_info(websocket, ban_record.group_id)
-                if fetched_group_info is None:
-                    logger.warning(f"无法获取群信息，群号: {ban_record.group_id}，默认禁言解除")
-                    lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
-                    continue
-                group_all_shut: int = fetched_group_info.get("group_all_shut")
-                if group_all_shut == 0:
-                    lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
-                    continue
-            else:
-                fetched_member_info = await get_member_info(websocket, ban_record.group_id, ban_record.user_id)
-                if fetched_member_info is None:
-                    logger.warning(
-                        f"无法获取群成员信息，用户ID: {ban_record.user_id}, 群号: {ban_record.group_id}，默认禁言解除"
-                    )
-                    lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
-                    continue
-                lift_ban_time: int = fetched_member_info.get("shut_up_timestamp")
-                if lift_ban_time == 0:
-                    lifted_list.append(ban_record)
-                    ban_list.remove(ban_record)
-                else:
-                    ban_record.lift_time = lift_ban_time
-        db_manager.update_ban_record(ban_list)
-        return ban_list, lifted_list
+        ban_list = await asyncio.to_thread(db_manager.get_ban_records)
     except Exception as e:
         logger.error(f"读取禁言列表失败: {e}")
-        return [], []
+        return [], [], []
+    logger.info(f"已经读取禁言列表，共 {len(ban_list)} 条记录")
 
+    records_by_group: Dict[int, List[BanUser]] = {}
+    for ban_record in ban_list:
+        records_by_group.setdefault(ban_record.group_id, []).append(ban_record)
 
-def save_ban_record(list: List[BanUser]):
-    return db_manager.update_ban_record(list)
+    total_groups = len(records_by_group)
+    report_every = max(1, total_groups // 10)
+    finished_groups = 0
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    banned_list: List[BanUser] = []
+    lifted_list: List[BanUser] = []
+    updated_list: List[BanUser] = []
+    failed_groups: List[int] = []
+
+    async def reconcile(group_id: int, records: List[BanUser]) -> None:
+        nonlocal finished_groups
+        async with semaphore:
+            try:
+                banned, lifted, updated = await _reconcile_group_bans(websocket, group_id, records)
+            except Exception as e:
+                logger.error(f"核对群 {group_id} 的禁言记录失败，保留原记录: {e}")
+                failed_groups.append(group_id)
+                banned, lifted, updated = records, [], []
+        banned_list.extend(banned)
+        lifted_list.extend(lifted)
+        updated_list.extend(updated)
+        finished_groups += 1
+        if finished_groups % report_every == 0 or finished_groups == total_groups:
+            logger.info(f"禁言列表核对进度: {finished_groups}/{total_groups} 个群")
+
+    group_ids = list(records_by_group)
+    results = await asyncio.gather(
+        *(reconcile(group_id, records_by_group[group_id]) for group_id in group_ids), return_exceptions=True
+    )
+    for group_id, result in zip(group_ids, results, strict=True):
+        if isinstance(result, BaseException):
+            logger.error(f"核对群 {group_id} 的禁言记录时出现未处理的异常: {result!r}")
+            failed_groups.append(group_id)
+    if failed_groups:
+        logger.warning(f"{len(failed_groups)} 个群的禁言记录核对失败，已保留原记录: {sorted(failed_groups)}")
+    return banned_list, lifted_list, updated_list
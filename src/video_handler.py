@@ -7,12 +7,58 @@
 
 import aiohttp
 import asyncio
+import base64
+import os
+import tempfile
 from pathlib import Path
 from typing import Optional, Dict, Any
 import logging
 
+from .http_client import http_client
+
 logger = logging.getLogger("VideoHandler")
 
+# 每次从网络读取的块大小
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# 累积到该大小后再写入临时文件，减少线程切换
+SPOOL_FLUSH_SIZE = 1024 * 1024
+# Base64编码的块大小，必须是3的倍数，保证分块编码结果可以直接拼接
+ENCODE_CHUNK_SIZE = 3 * 1024 * 1024
+
+
+def encode_file_base64(file_path: str, chunk_size: int = ENCODE_CHUNK_SIZE) -> str:
+    """
+    分块读取文件并编码为Base64，内存中不会同时保留完整的原始数据
+    最终需要一个完整的str放入消息，拼接时分块结果与最终结果同时存在，
+    峰值内存约为Base64大小的2倍（约为文件大小的2.7倍），即 max_video_size_mb=100 时约270MB
+    Parameters:
+        file_path: str: 文件路径
+        chunk_size: int: 每次读取的字节数（3的倍数）
+    Returns:
+        str: Base64字符串
+    """
+    parts = []
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            parts.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(parts)
+
+
+async def encode_file_base64_async(file_path: str) -> str:
+    """在线程中分块编码文件，避免阻塞事件循环"""
+    return await asyncio.to_thread(encode_file_base64, file_path)
+
+
+def remove_spool_file(file_path: Optional[str]) -> None:
+    """删除下载产生的临时文件"""
+    if not file_path:
+        return
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
 class VideoDownloader:
     def __init__(self, max_size_mb: int = 100, download_timeout: int = 60):
         self.max_size_mb = max_size_mb
@@ -70,7 +116,7 @@ class VideoDownloader:
             filename: 可选的文件名
             
         Returns:
-            dict: 下载结果，包含success、data、filename、error等字段
+            dict: 下载结果，包含success、path（临时文件路径，使用后需调用remove_spool_file删除）、filename、error等字段
         """
         try:
             logger.info(f"开始下载视频: {url}")
@@ -84,89 +130,109 @@ class VideoDownloader:
                     "url": url
                 }
             
-            async with aiohttp.ClientSession() as session:
-                # 先发送HEAD请求检查文件大小
+            session = http_client.get_session()
+            # 先发送HEAD请求检查文件大小
+            try:
+                async with session.head(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    if response.status != 200:
+                        logger.warning(f"HEAD请求失败，状态码: {response.status}")
+                    else:
+                        content_length = response.headers.get('Content-Length')
+                        if not self.check_file_size(content_length):
+                            return {
+                                "success": False,
+                                "error": f"视频文件过大，超过{self.max_size_mb}MB限制",
+                                "url": url
+                            }
+            except Exception as e:
+                logger.warning(f"HEAD请求失败: {e}，继续尝试下载")
+            
+            # 下载文件
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=self.download_timeout)) as response:
+                if response.status != 200:
+                    return {
+                        "success": False,
+                        "error": f"下载失败，HTTP状态码: {response.status}",
+                        "url": url
+                    }
+                
+                # 检查Content-Type是否为视频
+                content_type = response.headers.get('Content-Type', '').lower()
+                if content_type:
+                    # 检查是否为视频类型
+                    video_mime_types = [
+                        'video/', 'application/octet-stream', 
+                        'application/x-msvideo', 'video/x-msvideo'
+                    ]
+                    is_video_content = any(mime in content_type for mime in video_mime_types)
+                    
+                    if not is_video_content:
+                        logger.warning(f"Content-Type不是视频格式: {content_type}")
+                        # 如果不是明确的视频类型，但可能是QQ的特殊格式，继续尝试
+                        if 'text/' in content_type or 'application/json' in content_type:
+                            return {
+                                "success": False,
+                                "error": f"URL返回的不是视频内容，Content-Type: {content_type}",
+                                "url": url
+                            }
+                
+                # 再次检查Content-Length
+                content_length = response.headers.get('Content-Length')
+                if not self.check_file_size(content_length):
+                    return {
+                        "success": False,
+                        "error": f"视频文件过大，超过{self.max_size_mb}MB限制",
+                        "url": url
+                    }
+                
+                # 流式写入临时文件，超过大小限制立即中止
+                max_bytes = self.max_size_mb * 1024 * 1024
+                fd, spool_path = tempfile.mkstemp(prefix="napcat_video_", suffix=".part")
+                total_bytes = 0
+                completed = False
                 try:
-                    async with session.head(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                        if response.status != 200:
-                            logger.warning(f"HEAD请求失败，状态码: {response.status}")
+                    with os.fdopen(fd, "wb") as spool_file:
+                        buffer = bytearray()
+                        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                            total_bytes += len(chunk)
+                            if total_bytes > max_bytes:
+                                break
+                            buffer += chunk
+                            if len(buffer) >= SPOOL_FLUSH_SIZE:
+                                await asyncio.to_thread(spool_file.write, bytes(buffer))
+                                buffer.clear()
                         else:
-                            content_length = response.headers.get('Content-Length')
-                            if not self.check_file_size(content_length):
-                                return {
-                                    "success": False,
-                                    "error": f"视频文件过大，超过{self.max_size_mb}MB限制",
-                                    "url": url
-                                }
-                except Exception as e:
-                    logger.warning(f"HEAD请求失败: {e}，继续尝试下载")
+                            if buffer:
+                                await asyncio.to_thread(spool_file.write, bytes(buffer))
+                            completed = True
+                finally:
+                    if not completed:
+                        remove_spool_file(spool_path)
                 
-                # 下载文件
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=self.download_timeout)) as response:
-                    if response.status != 200:
-                        return {
-                            "success": False,
-                            "error": f"下载失败，HTTP状态码: {response.status}",
-                            "url": url
-                        }
-                    
-                    # 检查Content-Type是否为视频
-                    content_type = response.headers.get('Content-Type', '').lower()
-                    if content_type:
-                        # 检查是否为视频类型
-                        video_mime_types = [
-                            'video/', 'application/octet-stream', 
-                            'application/x-msvideo', 'video/x-msvideo'
-                        ]
-                        is_video_content = any(mime in content_type for mime in video_mime_types)
-                        
-                        if not is_video_content:
-                            logger.warning(f"Content-Type不是视频格式: {content_type}")
-                            # 如果不是明确的视频类型，但可能是QQ的特殊格式，继续尝试
-                            if 'text/' in content_type or 'application/json' in content_type:
-                                return {
-                                    "success": False,
-                                    "error": f"URL返回的不是视频内容，Content-Type: {content_type}",
-                                    "url": url
-                                }
-                    
-                    # 再次检查Content-Length
-                    content_length = response.headers.get('Content-Length')
-                    if not self.check_file_size(content_length):
-                        return {
-                            "success": False,
-                            "error": f"视频文件过大，超过{self.max_size_mb}MB限制",
-                            "url": url
-                        }
-                    
-                    # 读取文件内容
-                    video_data = await response.read()
-                    
-                    # 检查实际文件大小
-                    actual_size_mb = len(video_data) / (1024 * 1024)
-                    if actual_size_mb > self.max_size_mb:
-                        return {
-                            "success": False,
-                            "error": f"视频文件过大，实际大小: {actual_size_mb:.2f}MB",
-                            "url": url
-                        }
-                    
-                    # 确定文件名
-                    if filename is None:
-                        filename = Path(url.split('?')[0]).name
-                        if not filename or '.' not in filename:
-                            filename = "video.mp4"
-                    
-                    logger.info(f"视频下载成功: {filename}, 大小: {actual_size_mb:.2f}MB")
-                    
+                if not completed:
                     return {
-                        "success": True,
-                        "data": video_data,
-                        "filename": filename,
-                        "size_mb": actual_size_mb,
+                        "success": False,
+                        "error": f"视频文件过大，超过{self.max_size_mb}MB限制",
                         "url": url
                     }
-                    
+                actual_size_mb = total_bytes / (1024 * 1024)
+                
+                # 确定文件名
+                if filename is None:
+                    filename = Path(url.split('?')[0]).name
+                    if not filename or '.' not in filename:
+                        filename = "video.mp4"
+                
+                logger.info(f"视频下载成功: {filename}, 大小: {actual_size_mb:.2f}MB")
+                
+                return {
+                    "success": True,
+                    "path": spool_path,
+                    "filename": filename,
+                    "size_mb": actual_size_mb,
+                    "url": url
+                }
+                
         except asyncio.TimeoutError:
             return {
                 "success": False,
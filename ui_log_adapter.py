@@ -1,12 +1,15 @@
 """
 Adapter服务UI日志适配器
 在最小侵入的情况下捕获Adapter的日志并发送到UI
+日志先放入有界内存队列，由后台线程批量发送，发送缓慢时丢弃最旧的日志而不阻塞消息处理
 """
 import sys
 import os
 import logging
 import threading
 import time
+from collections import deque
+from typing import Deque, Optional, Tuple
 
 # 添加MoFox-UI路径以导入ui_logger
 ui_path = os.path.join(os.path.dirname(__file__), '..', 'MoFox-UI')
@@ -21,91 +24,142 @@ if os.path.exists(ui_path):
 else:
     UI_LOGGER_AVAILABLE = False
 
+QUEUE_MAX_SIZE = 10000  # 待发送日志上限，超出后丢弃最旧的日志
+BATCH_SIZE = 200  # 后台线程每批发送的日志数量
+FLUSH_INTERVAL = 0.2  # 后台线程的最长等待时间（秒）
+
+LEVEL_MAPPING = {
+    'TRACE': 'debug',
+    'DEBUG': 'debug',
+    'INFO': 'info',
+    'SUCCESS': 'info',
+    'WARNING': 'warning',
+    'ERROR': 'error',
+    'CRITICAL': 'error',
+}
+
+
+class UILogSink:
+    """
+    loguru sink：记录只入队，由后台线程批量发送到UI
+    """
+
+    def __init__(self, ui_logger, max_size: int = QUEUE_MAX_SIZE, batch_size: int = BATCH_SIZE):
+        self.ui_logger = ui_logger
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self._queue: Deque[Tuple[str, str]] = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.sent_count = 0
+        self.dropped_count = 0
+        self._dropped_unreported = 0
+        self._thread = threading.Thread(target=self._drain_loop, name="ui-log-sink", daemon=True)
+        self._thread.start()
+
+    def put(self, level_name: str, text: str) -> None:
+        """放入一条日志，队列已满时丢弃最旧的一条"""
+        ui_level = LEVEL_MAPPING.get(level_name, 'info')
+        # 过滤掉过于频繁的调试信息
+        if ui_level == 'debug':
+            return
+        with self._lock:
+            if len(self._queue) >= self.max_size:
+                self._queue.popleft()
+                self.dropped_count += 1
+                self._dropped_unreported += 1
+            self._queue.append((ui_level, text))
+            should_wake = len(self._queue) >= self.batch_size
+        if should_wake:
+            self._wakeup.set()
+
+    def write(self, message) -> None:
+        """loguru调用的写入接口，message为格式化后的字符串并带有record属性"""
+        self.put(message.record["level"].name, str(message).rstrip("\n"))
+
+    def _take_batch(self) -> Tuple[list, int]:
+        with self._lock:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            dropped, self._dropped_unreported = self._dropped_unreported, 0
+        return batch, dropped
+
+    def _drain_loop(self) -> None:
+        while True:
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            stopping = self._stopped.is_set()
+            while True:
+                batch, dropped = self._take_batch()
+                if dropped:
+                    self._send('warning', f"UI日志发送过慢，已丢弃 {dropped} 条日志")
+                if not batch:
+                    break
+                for ui_level, text in batch:
+                    self._send(ui_level, text)
+                self.sent_count += len(batch)
+            if stopping:
+                return
+
+    def _send(self, ui_level: str, text: str) -> None:
+        try:
+            getattr(self.ui_logger, ui_level)(text)
+        except Exception:
+            # 静默失败，不影响主程序
+            pass
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """发送剩余日志并停止后台线程，loguru移除sink时会调用"""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+
 class UILogHandler(logging.Handler):
-    """自定义日志处理器，将日志发送到UI"""
-    
-    def __init__(self):
+    """标准库logging处理器，第三方库的日志同样只入队，不阻塞调用方"""
+
+    def __init__(self, sink: UILogSink):
         super().__init__()
-        self.ui_logger = ui_logger if UI_LOGGER_AVAILABLE else None
-        
+        self.sink = sink
+
     def emit(self, record):
-        if not self.ui_logger:
-            return
-            
         try:
-            msg = self.format(record)
-            level_mapping = {
-                'DEBUG': 'debug',
-                'INFO': 'info', 
-                'WARNING': 'warning',
-                'ERROR': 'error',
-                'CRITICAL': 'error'
-            }
-            ui_level = level_mapping.get(record.levelname, 'info')
-            
-            # 过滤掉过于频繁的调试信息
-            if record.levelname == 'DEBUG':
-                return
-                
-            # 添加emoji前缀让日志更清晰
-            # emoji_map = {
-            #     'info': '📝',
-            #     'warning': '⚠️',
-            #     'error': '❌',
-            #     'debug': '🔍'
-            # }
-
-            # formatted_msg = f"{emoji_map.get(ui_level, '📝')} {msg}"
-            formatted_msg = f"{msg}"
-
-            print(f"[UI日志适配器] 正在发送日志: {ui_level} - {formatted_msg[:50]}...")
-            
-            if ui_level == 'info':
-                self.ui_logger.info(formatted_msg)
-            elif ui_level == 'warning':
-                self.ui_logger.warning(formatted_msg)
-            elif ui_level == 'error':
-                self.ui_logger.error(formatted_msg)
-            elif ui_level == 'debug':
-                self.ui_logger.debug(formatted_msg)
-                
-        except Exception as e:
-            print(f"[UI日志适配器] emit失败: {e}")
+            self.sink.put(record.levelname, self.format(record))
+        except Exception:
             # 静默失败，不影响主程序
             pass
 
+
+ui_log_sink: Optional[UILogSink] = None
+
+
 def setup_ui_logging():
-    """设置UI日志处理器"""
+    """设置UI日志sink"""
+    global ui_log_sink
     if not UI_LOGGER_AVAILABLE:
         print("[UI日志适配器] UI Logger不可用，跳过设置")
         return
-        
+
     try:
-        print("[UI日志适配器] 开始设置UI日志处理器...")
-        
-        # 获取Adapter的根日志器
-        root_logger = logging.getLogger()
-        
-        # 检查是否已经添加过UI处理器
-        for handler in root_logger.handlers:
-            if isinstance(handler, UILogHandler):
-                print("[UI日志适配器] UI日志处理器已存在，跳过重复添加")
-                return
-        
-        # 创建UI日志处理器
-        ui_handler = UILogHandler()
-        ui_handler.setLevel(logging.INFO)  # 只捕获INFO及以上级别
-        
-        # 添加到根日志器
-        root_logger.addHandler(ui_handler)
-        
-        print(f"[UI日志适配器] UI日志处理器已添加到根日志器，当前处理器数量: {len(root_logger.handlers)}")
-        
+        if ui_log_sink is not None:
+            print("[UI日志适配器] UI日志sink已存在，跳过重复添加")
+            return
+
+        from src.logger import logger
+
+        ui_log_sink = UILogSink(ui_logger)
+        # Adapter通过loguru记录日志，只捕获INFO及以上级别
+        logger.add(ui_log_sink, level="INFO", format="{message}")
+        # 第三方库通过标准库logging记录的日志
+        ui_handler = UILogHandler(ui_log_sink)
+        ui_handler.setLevel(logging.INFO)
+        logging.getLogger().addHandler(ui_handler)
+
+        print("[UI日志适配器] UI日志sink已添加")
+
         # 发送启动信息
-        if UI_LOGGER_AVAILABLE:
-            ui_logger.info("Adapter服务日志适配器已启动")
-            print("[UI日志适配器] 启动信息已发送到UI")
-            
+        ui_log_sink.put("INFO", "Adapter服务日志适配器已启动")
+
     except Exception as e:
         print(f"[UI日志适配器] 设置失败: {e}")
         # 静默失败
@@ -113,18 +167,16 @@ def setup_ui_logging():
 
 # 自动设置
 if __name__ != "__main__":
-    print("[UI日志适配器] 模块被导入，准备设置UI日志...")
-    
     # 立即尝试设置，如果日志系统还未初始化则延迟执行
     try:
         setup_ui_logging()
     except Exception as e:
         print(f"[UI日志适配器] 立即设置失败，将延迟执行: {e}")
-        
+
         # 延迟执行，确保主程序日志系统已初始化
         def delayed_setup():
             time.sleep(1.0)  # 延迟1秒
             print("[UI日志适配器] 执行延迟设置...")
             setup_ui_logging()
-        
+
         threading.Thread(target=delayed_setup, daemon=True).start()